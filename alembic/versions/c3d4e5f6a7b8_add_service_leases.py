@@ -0,0 +1,28 @@
+"""Add service_leases table for price updater leader election
+
+Revision ID: c3d4e5f6a7b8
+Revises: b1a2c3d4e5f6
+Create Date: 2026-10-19 09:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d4e5f6a7b8'
+down_revision = 'b1a2c3d4e5f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'service_leases',
+        sa.Column('name', sa.String(length=64), primary_key=True),
+        sa.Column('holder', sa.String(length=128), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('service_leases')
@@ -0,0 +1,45 @@
+"""Add indexes for hot transaction and portfolio queries
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-19 10:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e5f6a7b8c9'
+down_revision = 'c3d4e5f6a7b8'
+branch_labels = None
+depends_on = None
+
+
+def _has_index(table: str, name: str) -> bool:
+    # ix_user_portfolios_user_id only exists in databases built with create_all
+    return any(ix['name'] == name for ix in sa.inspect(op.get_bind()).get_indexes(table))
+
+
+def upgrade() -> None:
+    # get_transactions_for_user: WHERE user_id = ? ORDER BY created_at, id
+    op.create_index('ix_transactions_user_id_created_at', 'transactions', ['user_id', 'created_at', 'id'])
+    # recompute_portfolios_for_symbol: WHERE symbol = ? GROUP BY user_id
+    op.create_index('ix_transactions_symbol_user_id', 'transactions', ['symbol', 'user_id'])
+
+    # Keep the newest row of any duplicated (user_id, symbol) position before adding the unique index
+    op.execute(
+        "DELETE FROM user_portfolios WHERE id NOT IN ("
+        "SELECT MAX(id) FROM user_portfolios GROUP BY user_id, symbol)"
+    )
+    op.create_index('uq_user_portfolios_user_id_symbol', 'user_portfolios', ['user_id', 'symbol'], unique=True)
+    # user_id lookups are served by the leftmost column of the unique index
+    if _has_index('user_portfolios', 'ix_user_portfolios_user_id'):
+        op.drop_index('ix_user_portfolios_user_id', table_name='user_portfolios')
+
+
+def downgrade() -> None:
+    if not _has_index('user_portfolios', 'ix_user_portfolios_user_id'):
+        op.create_index('ix_user_portfolios_user_id', 'user_portfolios', ['user_id'])
+    op.drop_index('uq_user_portfolios_user_id_symbol', table_name='user_portfolios')
+    op.drop_index('ix_transactions_symbol_user_id', table_name='transactions')
+    op.drop_index('ix_transactions_user_id_created_at', table_name='transactions')
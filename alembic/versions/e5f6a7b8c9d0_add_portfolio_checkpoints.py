@@ -0,0 +1,49 @@
+"""Add portfolio_checkpoints and maintenance_markers tables
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-19 11:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'portfolio_checkpoints',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('symbol', sa.String(length=16), nullable=False),
+        sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Float(), nullable=False),
+        sa.Column('cost_basis', sa.Float(), nullable=False),
+        sa.Column('open_cost', sa.Float(), nullable=False),
+        sa.Column('realized_pnl', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('uq_portfolio_checkpoints_symbol_user_last', 'portfolio_checkpoints',
+                    ['symbol', 'user_id', 'last_transaction_id'], unique=True)
+    op.create_table(
+        'maintenance_markers',
+        sa.Column('name', sa.String(length=64), primary_key=True),
+        sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    # rebuilds filter on id > checkpoint within (symbol, user_id)
+    op.drop_index('ix_transactions_symbol_user_id', table_name='transactions')
+    op.create_index('ix_transactions_symbol_user_id', 'transactions', ['symbol', 'user_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transactions_symbol_user_id', table_name='transactions')
+    op.create_index('ix_transactions_symbol_user_id', 'transactions', ['symbol', 'user_id'])
+    op.drop_table('maintenance_markers')
+    op.drop_index('uq_portfolio_checkpoints_symbol_user_last', table_name='portfolio_checkpoints')
+    op.drop_table('portfolio_checkpoints')
@@ -0,0 +1,52 @@
+"""Add recompute_jobs and recompute_job_chunks tables
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-19 14:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a7b8c9d0e1'
+down_revision = 'e5f6a7b8c9d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'recompute_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('holder', sa.String(length=128), nullable=True),
+        sa.Column('chunks_total', sa.Integer(), nullable=False),
+        sa.Column('chunks_done', sa.Integer(), nullable=False),
+        sa.Column('chunks_failed', sa.Integer(), nullable=False),
+        sa.Column('symbols_total', sa.Integer(), nullable=False),
+        sa.Column('symbols_done', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_recompute_jobs_status', 'recompute_jobs', ['status'])
+    op.create_table(
+        'recompute_job_chunks',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('job_id', sa.Integer(), sa.ForeignKey('recompute_jobs.id'), nullable=False),
+        sa.Column('symbols', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+    )
+    op.create_index('ix_recompute_job_chunks_job_status', 'recompute_job_chunks', ['job_id', 'status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recompute_job_chunks_job_status', table_name='recompute_job_chunks')
+    op.drop_table('recompute_job_chunks')
+    op.drop_index('ix_recompute_jobs_status', table_name='recompute_jobs')
+    op.drop_table('recompute_jobs')
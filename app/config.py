@@ -1,10 +1,108 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./stock_portfolio.db"
 
+    # Engine profile: "tuned" applies the settings below, "default" is plain SQLAlchemy
+    DB_PROFILE: str = "tuned"
+    # SQLite pragmas (applied on every new connection)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 32000
+    SQLITE_MMAP_SIZE: int = 268435456
+    # Connection pool (PostgreSQL and file-based SQLite)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Create missing tables with metadata.create_all on startup (development);
+    # set to false where the schema is managed with Alembic
+    AUTO_CREATE_SCHEMA: bool = True
+
+    # Signed session tokens: "kid:secret[,kid:secret...]"; the first key signs,
+    # all verify. AUTH_ENFORCE rejects user requests without a bearer token.
+    AUTH_SECRET_KEYS: Optional[str] = None
+    ACCESS_TOKEN_TTL_SECONDS: int = 900
+    REFRESH_TOKEN_TTL_SECONDS: int = 1209600
+    AUTH_ENFORCE: bool = False
+
+    # bcrypt runs in a process pool of PASSWORD_HASH_WORKERS (0 = default threadpool);
+    # beyond PASSWORD_HASH_MAX_PENDING queued calls logins/signups get a 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    PASSWORD_HASH_RETRY_AFTER: int = 2
+
+    # Symbol search index: full reload from the database after this many seconds (0 = never)
+    SYMBOL_INDEX_TTL_SECONDS: int = 300
+
+    # ETags of /stock_prices/ and /portfolio/{user_id} roll over at least this often (0 = never)
+    ETAG_MAX_AGE_SECONDS: int = 300
+
+    # Serve /portfolio/{user_id} and /stock_prices/ through the row-tuple + orjson fast path
+    FAST_JSON: bool = True
+
+    # Per-client token buckets, "path-prefix=rate/s:burst" ("*" = every other route);
+    # RATE_LIMIT_BACKEND "memory" (per worker), "redis" (REDIS_URL) or "fakeredis"
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: str = "*=20:40,/symbols/search=5:15,/stock_prices/=2:10,/auth/=1:5,/transactions/import=0.2:2"
+    RATE_LIMIT_BACKEND: str = "memory"
+    # Load shedding: 503 + Retry-After while more than SHED_MAX_THREADPOOL_WAITING tasks wait
+    # for a threadpool thread or the event loop lags more than SHED_MAX_LOOP_LAG_MS (0 = off)
+    SHED_MAX_THREADPOOL_WAITING: int = 64
+    SHED_MAX_LOOP_LAG_MS: int = 500
+    SHED_RETRY_AFTER: int = 1
+
+    # Request/DB metrics for GET /admin/metrics (Prometheus text format)
+    METRICS_ENABLED: bool = True
+
+    # On-demand sampling profiles (X-Profile header + admin token, POST /admin/updater/profile)
+    PROFILING_ENABLED: bool = True
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_SAMPLE_INTERVAL_MS: int = 5
+
+    # gzip API responses of at least GZIP_MINIMUM_SIZE bytes (0 = off)
+    GZIP_MINIMUM_SIZE: int = 1024
+    GZIP_LEVEL: int = 5
+
+    # Maximum rows accepted by POST /transactions/import
+    IMPORT_MAX_ROWS: int = 50000
+
+    # Websocket broadcast bus: "memory" (single worker), "redis" or "fakeredis"
+    WS_BUS_BACKEND: str = "memory"
+    WS_BUS_CHANNEL: str = "prices"
+    REDIS_URL: Optional[str] = None
+
+    # Quote source: "yfinance", or "offline" for synthetic random-walk prices (load tests, no network)
+    PRICE_SOURCE: str = "yfinance"
+
+    # Price updater: seconds between cycles, and leader election across workers
+    PRICE_UPDATE_INTERVAL: int = 60
+    LEADER_ELECTION: str = "db"  # "db", "file" or "none"
+    LEADER_LEASE_SECONDS: int = 30
+    LEADER_LOCK_PATH: str = "./price_updater.lock"
+
+    # Ledger checkpoints: written by the price updater leader every
+    # CHECKPOINT_INTERVAL_SECONDS for positions with at least
+    # CHECKPOINT_MIN_TRANSACTIONS transactions since their last checkpoint (0 disables)
+    CHECKPOINT_INTERVAL_SECONDS: int = 3600
+    CHECKPOINT_MIN_TRANSACTIONS: int = 50
+
+    # Background recompute jobs (POST /admin/recompute without a symbol): symbols per
+    # chunk, worker processes (0 = one per CPU; 1 runs chunks in the runner thread),
+    # seconds between polls for new jobs (0 disables the runner in this process) and
+    # heartbeat age after which another process takes over a running job
+    RECOMPUTE_CHUNK_SIZE: int = 50
+    RECOMPUTE_WORKERS: int = 0
+    RECOMPUTE_JOB_POLL_SECONDS: int = 2
+    RECOMPUTE_JOB_STALE_SECONDS: int = 120
+    RECOMPUTE_CHUNK_ATTEMPTS: int = 3
+
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -6,10 +7,70 @@ from app.config import settings
 # Database URL hentes fra config
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-# Opret SQLAlchemy engine (SQLite til udvikling)
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    """Apply the tuned SQLite pragmas to every new connection."""
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        # negative cache_size is in KiB rather than pages
+        cur.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cur.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cur.close()
+
+
+def engine_options(url: str, profile: str | None = None) -> dict:
+    """Keyword arguments for create_engine for the given URL and profile.
+
+    Profiles: "tuned" (default) applies the pool and SQLite settings from
+    Settings; "default" is plain SQLAlchemy, kept for benchmarking.
+    """
+    profile = (profile or settings.DB_PROFILE).lower()
+    u = make_url(url)
+    is_sqlite = u.get_backend_name() == "sqlite"
+    in_memory = is_sqlite and (u.database in (None, "", ":memory:"))
+    opts: dict = {}
+    if is_sqlite:
+        opts["connect_args"] = {"check_same_thread": False}
+    if profile == "default":
+        return opts
+    if is_sqlite:
+        # sqlite3's own lock wait, in seconds (busy_timeout pragma sets the same)
+        opts["connect_args"]["timeout"] = settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+    if not in_memory:
+        opts.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING and not is_sqlite,
+        )
+    return opts
+
+
+def _wants_sqlite_pragmas(url: str, profile: str | None = None) -> bool:
+    u = make_url(url)
+    return (
+        (profile or settings.DB_PROFILE).lower() != "default"
+        and u.get_backend_name() == "sqlite"
+        and u.database not in (None, "", ":memory:")
+    )
+
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, profile: str | None = None):
+    """Create an engine for `url` using the configured (or given) profile."""
+    eng = create_engine(url, **engine_options(url, profile))
+    if _wants_sqlite_pragmas(url, profile):
+        event.listen(eng, "connect", _set_sqlite_pragmas)
+    return eng
+
+
+# Opret SQLAlchemy engine (profil styres af DB_PROFILE i Settings)
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 
 # SessionLocal bruges i endpoints til at få DB-sessioner
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -24,4 +85,51 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- Async path (aiosqlite / asyncpg) ---
+# Hot read endpoints use AsyncSession so they wait on the DB in the event loop
+# instead of holding one of Starlette's threadpool slots.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def async_database_url(url: str) -> str:
+    """Map a sync database URL to its async driver (sqlite -> aiosqlite, postgresql -> asyncpg)."""
+    u = make_url(url)
+    driver = _ASYNC_DRIVERS.get(u.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {u.get_backend_name()}")
+    return u.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def get_async_engine():
+    """Create the async engine on first use (so the async driver is only imported when needed)."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        opts = engine_options(SQLALCHEMY_DATABASE_URL)
+        _async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL), **opts)
+        if _wants_sqlite_pragmas(SQLALCHEMY_DATABASE_URL):
+            event.listen(_async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def new_async_session():
+    """Open a standalone AsyncSession, e.g. for a streaming response that outlives the request dependency."""
+    get_async_engine()
+    return _AsyncSessionLocal()
+
+
+# Async dependency som bruges i de mest belastede læse-endpoints:
+async def get_async_db():
+    async with new_async_session() as db:
+        yield db
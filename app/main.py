@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 import asyncio
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
+from app.config import settings
 from app.database import engine
 from app import models
 from app.routers import user as user_router
@@ -8,36 +9,61 @@ from app.routers import transaction as transaction_router
 from app.routers import portfolio as portfolio_router
 from app.routers import auth as auth_router
 from app.routers import stocks as stocks_router
-from app.services.price_updater import start_price_updater
+from app.services.leader import start_price_updater_with_election
 from app.routers import symbols as symbols_router
-from app.services import ws_manager
+from app.services import metrics, profiling, rate_limit, recompute_jobs, symbol_index, ws_manager
+from app.utils import auth as auth_utils
 from app.routers import ws as ws_router
 from app.routers import admin as admin_router
-
-# Opret tabeller
-models.Base.metadata.create_all(bind=engine)
+from app.utils.static_files import PrecompressedStaticFiles, has_manifest
 
 app = FastAPI(title="Stock Portfolio API")
 
+# gzip large API responses (static files are served precompressed and skipped)
+if settings.GZIP_MINIMUM_SIZE:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE, compresslevel=settings.GZIP_LEVEL)
+# per-request sampling profiles on demand (admin only)
+profiling.install(app)
+# per-client token buckets and load shedding (before any handler work)
+rate_limit.install(app)
+# per-route latency and DB query metrics (outermost, so it times everything)
+metrics.install(app)
+
 # Start price updater thread on startup and stop it on shutdown
 @app.on_event("startup")
 async def _startup_event():
-    # initialize websocket manager (queue + broadcaster task)
     loop = asyncio.get_event_loop()
+    # Opret tabeller (dev convenience; disable with AUTO_CREATE_SCHEMA=false and use Alembic)
+    if settings.AUTO_CREATE_SCHEMA:
+        await loop.run_in_executor(None, lambda: models.Base.metadata.create_all(bind=engine))
+    # build the symbol search index in the background; searches load it on demand meanwhile
+    app.state._symbol_index_task = loop.create_task(symbol_index.warm())
+    # start the bcrypt worker processes in the background so the first login doesn't pay for it
+    loop.run_in_executor(None, auth_utils.warm_hash_pool)
+    # event loop lag feeds load shedding and /admin/metrics
+    app.state._loop_lag_task = rate_limit.start_lag_monitor(loop)
+    # initialize websocket manager (queue + broadcaster task)
     await ws_manager.init(loop)
-    # start price updater thread
-    # For local testing it's convenient to run the updater frequently.
-    # Use 10s here; increase in production to a larger value (e.g. 300s).
-    thread, stop_event = start_price_updater(interval_seconds=60)
+    # start the price updater; with several workers only the elected leader runs it
+    # and the others receive its updates over the websocket bus.
+    thread, stop_event = start_price_updater_with_election(interval_seconds=settings.PRICE_UPDATE_INTERVAL)
     app.state._price_updater_thread = thread
     app.state._price_updater_stop_event = stop_event
+    # background recompute jobs queued through /admin/recompute (claimed by one process each)
+    _thread, app.state._recompute_jobs_stop_event = recompute_jobs.start_job_runner()
 
 
 @app.on_event("shutdown")
-def _shutdown_event():
+async def _shutdown_event():
     stop_event = getattr(app.state, "_price_updater_stop_event", None)
     if stop_event is not None:
         stop_event.set()
+    recompute_jobs.stop_job_runner(getattr(app.state, "_recompute_jobs_stop_event", None))
+    lag_task = getattr(app.state, "_loop_lag_task", None)
+    if lag_task is not None:
+        lag_task.cancel()
+    await ws_manager.close()
+    auth_utils.shutdown_hash_pool()
 
 # Routers
 app.include_router(user_router.router)
@@ -49,8 +75,10 @@ app.include_router(ws_router.router)
 app.include_router(symbols_router.router)
 app.include_router(admin_router.router)
 
-# Serve the static frontend at /app
-app.mount("/app", StaticFiles(directory="frontend", html=True), name="frontend")
+# Serve the static frontend at /app: the build from scripts/build_frontend.py when
+# present (hashed, precompressed, immutable), otherwise the raw sources
+_frontend_dir = "frontend/dist" if has_manifest("frontend/dist") else "frontend"
+app.mount("/app", PrecompressedStaticFiles(directory=_frontend_dir, html=True), name="frontend")
 
 @app.get("/")
 def root():
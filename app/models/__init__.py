@@ -3,5 +3,9 @@ from app.models.user import User
 from app.models.transaction import Transaction
 from app.models.stockprice import StockPrice
 from app.models.portfolio import UserPortfolio
+from app.models.lease import ServiceLease
+from app.models.checkpoint import PortfolioCheckpoint, MaintenanceMarker, LedgerChange
+from app.models.job import RecomputeJob, RecomputeJobChunk
 
-__all__ = ["Base", "User", "Transaction", "StockPrice", "UserPortfolio"]
\ No newline at end of file
+__all__ = ["Base", "User", "Transaction", "StockPrice", "UserPortfolio", "ServiceLease", "PortfolioCheckpoint", "MaintenanceMarker",
+           "LedgerChange", "RecomputeJob", "RecomputeJobChunk"]
\ No newline at end of file
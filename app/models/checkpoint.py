@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, func
+from app.database import Base
+
+
+class PortfolioCheckpoint(Base):
+    """Folded ledger state of one (user, symbol) position up to a transaction id.
+
+    Rebuilds start from the latest checkpoint and only aggregate transactions
+    with a higher id (see app.services.ledger).
+    """
+    __tablename__ = "portfolio_checkpoints"
+    __table_args__ = (
+        Index("uq_portfolio_checkpoints_symbol_user_last", "symbol", "user_id", "last_transaction_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    symbol = Column(String(16), nullable=False)
+    last_transaction_id = Column(Integer, nullable=False)  # transactions with id <= this are folded in
+    quantity = Column(Float, nullable=False, default=0.0)  # bought - sold
+    cost_basis = Column(Float, nullable=False, default=0.0)  # spent on buys - received from sells
+    open_cost = Column(Float, nullable=False, default=0.0)  # average-cost basis of the open quantity
+    realized_pnl = Column(Float, nullable=False, default=0.0)  # average-cost realized profit/loss
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<PortfolioCheckpoint user={self.user_id} symbol={self.symbol} upto={self.last_transaction_id} qty={self.quantity}>"
+
+
+class MaintenanceMarker(Base):
+    """High-water mark (a transaction or ledger change id) for incremental maintenance jobs."""
+    __tablename__ = "maintenance_markers"
+
+    name = Column(String(64), primary_key=True)
+    last_transaction_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class LedgerChange(Base):
+    """A position whose existing transactions were edited or deleted.
+
+    New transactions are found by id; edits and deletes leave no such trace,
+    so incremental checks (app.services.consistency) read them from here.
+    """
+    __tablename__ = "ledger_changes"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    symbol = Column(String(16), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
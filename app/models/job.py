@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
+from app.database import Base
+
+
+class RecomputeJob(Base):
+    """A background portfolio recompute (see app.services.recompute_jobs).
+
+    status: "queued", "running", "done" or "failed". A running job whose
+    heartbeat is older than RECOMPUTE_JOB_STALE_SECONDS is taken over (its
+    runner died) and continues with the chunks that are not done yet.
+    """
+    __tablename__ = "recompute_jobs"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String(16), nullable=False, default="queued", index=True)
+    holder = Column(String(128), nullable=True)  # process running the job
+    chunks_total = Column(Integer, nullable=False, default=0)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    chunks_failed = Column(Integer, nullable=False, default=0)
+    symbols_total = Column(Integer, nullable=False, default=0)
+    symbols_done = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    # naive UTC, like ServiceLease.expires_at
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<RecomputeJob {self.id} {self.status} {self.chunks_done}/{self.chunks_total}>"
+
+
+class RecomputeJobChunk(Base):
+    """A slice of a job's symbols; marked done in the transaction that writes its portfolios."""
+    __tablename__ = "recompute_job_chunks"
+    __table_args__ = (
+        Index("ix_recompute_job_chunks_job_status", "job_id", "status"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("recompute_jobs.id"), nullable=False)
+    symbols = Column(Text, nullable=False)  # comma-separated
+    status = Column(String(16), nullable=False, default="pending")  # "pending", "done" or "failed"
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+
+    def __repr__(self):
+        return f"<RecomputeJobChunk {self.id} job={self.job_id} {self.status}>"
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+
+
+class ServiceLease(Base):
+    """A named lease held by one process at a time (used for leader election)."""
+    __tablename__ = "service_leases"
+
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(128), nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # naive UTC
+
+    def __repr__(self):
+        return f"<ServiceLease {self.name} holder={self.holder} expires={self.expires_at}>"
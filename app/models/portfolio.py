@@ -1,13 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 
 class UserPortfolio(Base):
     __tablename__ = "user_portfolios"
+    __table_args__ = (
+        # one row per position; also serves lookups by user_id alone
+        Index("uq_user_portfolios_user_id_symbol", "user_id", "symbol", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     symbol = Column(String(16), nullable=False, index=True)
     quantity = Column(Float, nullable=False, default=0.0)
     total_amount = Column(Float, nullable=False, default=0.0)  # sum of total_amount from buys
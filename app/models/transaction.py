@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # a user's history, newest first (also the keyset for pagination)
+        Index("ix_transactions_user_id_created_at", "user_id", "created_at", "id"),
+        # per-symbol recompute grouped by user; id lets rebuilds start after a checkpoint
+        Index("ix_transactions_symbol_user_id", "symbol", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
+from fastapi.responses import FileResponse, PlainTextResponse
 import os
 from typing import Optional
+from app.config import settings
 from app.database import SessionLocal
+from app.models import RecomputeJob
+from app.services import leader, metrics, profiling, recompute_jobs, updater_stats
 from app.services.price_updater import recompute_portfolios_for_symbol
 
 router = APIRouter(prefix="/admin")
@@ -18,8 +22,13 @@ def _check_token(x_admin_token: Optional[str] = Header(None)):
 
 
 @router.post('/recompute')
-def recompute(symbol: Optional[str] = None, ok: bool = Depends(_check_token)):
-    """Trigger recompute for a single symbol or for all symbols if none provided.
+def recompute(response: Response, symbol: Optional[str] = None, ok: bool = Depends(_check_token)):
+    """Recompute portfolios for a single symbol, or queue a background job for all symbols.
+
+    A single symbol is recomputed inline. Without a symbol a recompute job is
+    queued (202) and processed in chunks by worker processes; follow it with
+    GET /admin/jobs/{id}. If a full recompute is already queued or running,
+    that job is returned instead.
 
     Protected by ADMIN_TOKEN environment variable; pass header 'x-admin-token: <token>'.
     """
@@ -29,12 +38,71 @@ def recompute(symbol: Optional[str] = None, ok: bool = Depends(_check_token)):
             recompute_portfolios_for_symbol(db, symbol)
             db.commit()
             return { 'ok': True, 'symbol': symbol }
-        # recompute for all tracked symbols
-        from app.models import StockPrice
-        syms = [s.symbol for s in db.query(StockPrice).all()]
-        for s in syms:
-            recompute_portfolios_for_symbol(db, s)
-        db.commit()
-        return { 'ok': True, 'symbols': syms }
+        job, created = recompute_jobs.enqueue(db)
+        response.status_code = 202 if created else 200
+        return { 'ok': True, 'created': created, 'job': recompute_jobs.job_status(job) }
+    finally:
+        db.close()
+
+
+@router.get('/jobs')
+def list_jobs(limit: int = 20, ok: bool = Depends(_check_token)):
+    """Recent recompute jobs, newest first."""
+    db = SessionLocal()
+    try:
+        jobs = db.query(RecomputeJob).order_by(RecomputeJob.id.desc()).limit(max(1, min(limit, 200))).all()
+        return [recompute_jobs.job_status(j) for j in jobs]
+    finally:
+        db.close()
+
+
+@router.get('/jobs/{job_id}')
+def get_job(job_id: int, ok: bool = Depends(_check_token)):
+    """Status and progress of a recompute job."""
+    db = SessionLocal()
+    try:
+        job = db.get(RecomputeJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail='Job not found')
+        return recompute_jobs.job_status(job)
     finally:
         db.close()
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def metrics_endpoint(ok: bool = Depends(_check_token)):
+    """Prometheus text format metrics of this worker (see app/services/metrics.py)."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get('/updater/stats')
+def updater_stats_endpoint(ok: bool = Depends(_check_token)):
+    """Price updater cycle, fetch-latency, error and cache statistics of this worker.
+
+    Cycle and fetch numbers only exist on the worker running the updater
+    (`runs_updater` is true there).
+    """
+    runs_updater = leader.is_leader() or (settings.LEADER_ELECTION or "").lower() == "none"
+    return {'runs_updater': runs_updater, 'interval_s': settings.PRICE_UPDATE_INTERVAL, **updater_stats.snapshot()}
+
+
+@router.post('/updater/profile')
+def profile_next_cycle(ok: bool = Depends(_check_token)):
+    """Profile the next price updater cycle (on whichever worker runs the updater)."""
+    return {'armed': True, 'flag': profiling.request_cycle_profile()}
+
+
+@router.get('/profiles')
+def list_profiles(ok: bool = Depends(_check_token)):
+    """Stored request and updater cycle profiles, newest first."""
+    return profiling.list_profiles()
+
+
+@router.get('/profiles/{profile_id}')
+def get_profile(profile_id: str, format: str = 'json', ok: bool = Depends(_check_token)):
+    """A stored profile: `format=json` (summary) or `format=collapsed` (flamegraph input)."""
+    path = profiling.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail='Profile not found')
+    media_type = 'application/json' if format == 'json' else 'text/plain'
+    return FileResponse(path, media_type=media_type)
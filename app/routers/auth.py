@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.schemas.user import UserRead
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.schemas.user import LoginResponse, RefreshIn, TokenPair, UserRead
 from pydantic import BaseModel
 from app import models
-from app.utils.auth import verify_password
+from app.services import ws_manager
+from app.utils import tokens
+from app.utils.auth import HashingBusy, verify_password_async
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -14,11 +19,60 @@ class LoginIn(BaseModel):
     password: str
 
 
-@router.post("/login", response_model=UserRead)
-def login(payload: LoginIn, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == payload.username).first()
+class LogoutIn(BaseModel):
+    refresh_token: Optional[str] = None
+
+
+def hashing_busy(e: HashingBusy) -> HTTPException:
+    return HTTPException(status_code=503, detail="Server busy, try again shortly",
+                         headers={"Retry-After": str(e.retry_after)})
+
+
+@router.post("/login", response_model=LoginResponse)
+async def login(payload: LoginIn, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(
+        select(models.User).where(models.User.username == payload.username)
+    )).scalars().first()
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(payload.password, user.hashed_password):
+    try:
+        ok = await verify_password_async(payload.password, user.hashed_password)
+    except HashingBusy as e:
+        raise hashing_busy(e)
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    return user
+    return {**UserRead.model_validate(user).model_dump(), **tokens.issue_pair(user.id)}
+
+
+async def _revoke(claims: dict) -> None:
+    tokens.revoke_local(claims["jti"], claims["exp"])
+    # tell the other workers as well
+    await ws_manager.publish(tokens.revocation_message(claims))
+
+
+@router.post("/refresh", response_model=TokenPair)
+async def refresh(payload: RefreshIn):
+    """Exchange a refresh token for a new token pair; the old refresh token is revoked."""
+    try:
+        claims = tokens.verify(payload.refresh_token, tokens.REFRESH)
+    except tokens.TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    await _revoke(claims)
+    return tokens.issue_pair(claims["sub"])
+
+
+@router.post("/logout")
+async def logout(payload: Optional[LogoutIn] = None, authorization: Optional[str] = Header(None)):
+    """Revoke the bearer access token and, if given, the refresh token."""
+    revoked = 0
+    access = tokens.bearer_token(authorization)
+    for token, typ in ((access, tokens.ACCESS), (payload.refresh_token if payload else None, tokens.REFRESH)):
+        if not token:
+            continue
+        try:
+            claims = tokens.verify(token, typ)
+        except tokens.TokenError:
+            continue  # already invalid
+        await _revoke(claims)
+        revoked += 1
+    return {"detail": "logged out", "revoked": revoked}
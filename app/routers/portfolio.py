@@ -1,29 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_async_db
 from app.models import UserPortfolio, StockPrice
 from app.schemas.portfolio import PortfolioItem
+from app.services import versions
+from app.utils.fastjson import FastJSONResponse
+from app.utils import tokens
 
-router = APIRouter(prefix="/portfolio", tags=["Portfolio"])
+router = APIRouter(prefix="/portfolio", tags=["Portfolio"], dependencies=[Depends(tokens.authorize_user)])
 
 
 @router.get("/{user_id}", response_model=List[PortfolioItem])
-def get_portfolio(user_id: int, db: Session = Depends(get_db)):
-    rows = db.query(UserPortfolio).filter(UserPortfolio.user_id == user_id).all()
+async def get_portfolio(user_id: int, response: Response, if_none_match: Optional[str] = Header(None),
+                        db: AsyncSession = Depends(get_async_db)):
+    # unchanged since the client's copy: answer from the version counters, no DB
+    etag = versions.portfolio_etag(user_id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if versions.matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if settings.FAST_JSON:
+        # one joined query, row tuples straight into PortfolioItem-shaped dicts
+        rows = (await db.execute(
+            select(
+                UserPortfolio.symbol, StockPrice.name, UserPortfolio.quantity, UserPortfolio.total_amount,
+                UserPortfolio.avg_cost, UserPortfolio.current_amount, UserPortfolio.profit,
+                StockPrice.currency, UserPortfolio.last_updated,
+            )
+            .outerjoin(StockPrice, StockPrice.symbol == UserPortfolio.symbol)
+            .where(UserPortfolio.user_id == user_id)
+        )).all()
+        if not rows:
+            raise HTTPException(status_code=404, detail="Portefølje ikke fundet")
+        return FastJSONResponse([
+            {
+                "symbol": symbol,
+                "name": name,
+                "quantity": float(quantity),
+                "total_amount": float(total_amount),
+                "avg_cost": float(avg_cost),
+                "current_amount": float(current_amount),
+                "profit": float(profit),
+                "currency": currency,
+                "last_updated": last_updated,
+            }
+            for symbol, name, quantity, total_amount, avg_cost, current_amount, profit, currency, last_updated in rows
+        ], headers=headers)
+
+    response.headers.update(headers)
+
+    rows = (await db.execute(select(UserPortfolio).where(UserPortfolio.user_id == user_id))).scalars().all()
     if not rows:
         raise HTTPException(status_code=404, detail="Portefølje ikke fundet")
 
+    # augment with StockPrice metadata if available (one query for all symbols)
+    symbols = {r.symbol for r in rows}
+    meta = {
+        sym: (name, currency)
+        for sym, name, currency in (
+            await db.execute(
+                select(StockPrice.symbol, StockPrice.name, StockPrice.currency).where(StockPrice.symbol.in_(symbols))
+            )
+        ).all()
+    }
+
     items = []
     for r in rows:
-        # augment with StockPrice metadata if available
-        sp = db.query(StockPrice).filter(StockPrice.symbol == r.symbol).first()
+        name, currency = meta.get(r.symbol, (None, None))
         item = PortfolioItem.model_validate(r)
         # model_validate returns a pydantic model; convert to dict then set extra fields
         d = item.model_dump()
-        d['name'] = sp.name if sp and sp.name else d.get('name')
-        d['currency'] = sp.currency if sp and sp.currency else d.get('currency')
+        d['name'] = name if name else d.get('name')
+        d['currency'] = currency if currency else d.get('currency')
         items.append(d)
 
     return items
@@ -1,23 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import get_async_db
 from app.models import StockPrice
+from app.services import symbol_index, versions
+from app.utils.fastjson import FastJSONResponse
 
 router = APIRouter(prefix="/stock_prices", tags=["Stocks"])
 
 
 @router.get("/")
-def get_stock_prices(symbols: Optional[str] = Query(None, description="Comma-separated symbols"), db: Session = Depends(get_db)):
-    """Return current stock prices. If `symbols` is provided, filter by them."""
-    query = db.query(StockPrice)
+async def get_stock_prices(response: Response, symbols: Optional[str] = Query(None, description="Comma-separated symbols"),
+                           if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    """Return current stock prices. If `symbols` is provided, filter by them.
+
+    Sends an ETag; a matching If-None-Match gets 304 without a DB query.
+    """
+    query = select(StockPrice)
+    syms = None
     if symbols:
         syms = [s.strip().upper() for s in symbols.split(",") if s.strip()]
         if not syms:
             raise HTTPException(status_code=400, detail="No valid symbols provided")
-        query = query.filter(StockPrice.symbol.in_(syms))
-    rows = query.all()
+        query = query.where(StockPrice.symbol.in_(syms))
+    etag = versions.prices_etag(syms)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if versions.matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if settings.FAST_JSON:
+        # rows -> dicts -> orjson, without ORM objects or jsonable_encoder
+        rows = (await db.execute(query.with_only_columns(
+            StockPrice.symbol, StockPrice.name, StockPrice.currency, StockPrice.current_price, StockPrice.last_updated,
+        ))).all()
+        return FastJSONResponse([
+            {
+                "symbol": symbol,
+                "name": name,
+                "currency": currency,
+                "price": price,
+                "last_updated": last_updated.isoformat() if last_updated else None,
+            }
+            for symbol, name, currency, price, last_updated in rows
+        ], headers=headers)
+
+    response.headers.update(headers)
+    rows = (await db.execute(query)).scalars().all()
     result = []
     for r in rows:
         result.append({
@@ -31,24 +61,11 @@ def get_stock_prices(symbols: Optional[str] = Query(None, description="Comma-sep
 
 
 @router.get("/search")
-def search_stocks(q: str = Query(..., min_length=1, description="Search term for symbol or name"), limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db)):
+async def search_stocks(q: str = Query(..., min_length=1, description="Search term for symbol or name"), limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_async_db)):
     """Search known stocks by symbol or name for frontend autocomplete.
 
-    Returns up to `limit` matches with fields: symbol, name, price.
+    Returns up to `limit` matches with fields: symbol, name, price, ranked
+    exact symbol > symbol prefix > name word prefix > substring.
     """
-    term = f"%{q.strip()}%"
-    rows = (
-        db.query(StockPrice)
-        .filter(or_(StockPrice.symbol.ilike(term), StockPrice.name.ilike(term)))
-        .order_by(StockPrice.symbol)
-        .limit(limit)
-        .all()
-    )
-    result = []
-    for r in rows:
-        result.append({
-            "symbol": r.symbol,
-            "name": r.name,
-            "price": r.current_price,
-        })
-    return result
+    await symbol_index.ensure_loaded(db)
+    return symbol_index.search(q, limit, db_only=True)
@@ -1,17 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, String, and_, func, literal, or_, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, get_async_db, new_async_session
 from app.models import Transaction, User
 from app.models import StockPrice
 from app.schemas import transaction as transaction_schema
 from app.services.price_updater import recompute_portfolios_for_symbol
+from app.services import importer, ledger, portfolio_stream
+from app.utils import tokens
 from app.schemas.transaction import TransactionUpdate
 
+_logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/transactions",
-    tags=["Transactions"]
+    tags=["Transactions"],
+    dependencies=[Depends(tokens.authorize_user)],
 )
 
+
+def _recompute_position(db: Session, symbol: str, user_id: int) -> None:
+    """Rebuild one user's portfolio row for `symbol` after a committed trade change.
+
+    On failure the partial recompute is rolled back and logged; the trade
+    stays committed and the row catches up on the next recompute of the
+    symbol (price updater, /admin/recompute or scripts/verify_portfolios.py --repair).
+    """
+    try:
+        recompute_portfolios_for_symbol(db, symbol, user_ids=[user_id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        _logger.exception("Failed to recompute portfolio of user %s for %s", user_id, symbol)
+
+
 @router.post("/", response_model=transaction_schema.TransactionRead)
 def create_transaction(transaction_in: transaction_schema.TransactionCreate, db: Session = Depends(get_db)):
     # Tjek om user findes
@@ -60,20 +92,162 @@ def create_transaction(transaction_in: transaction_schema.TransactionCreate, db:
         db.refresh(sp)
 
     # Recompute portfolios for the symbol so user's portfolio reflects the new transaction
-    try:
-        recompute_portfolios_for_symbol(db, new_transaction.symbol)
-        db.commit()
-    except Exception:
-        pass
+    before = portfolio_stream.snapshot_positions(db, [new_transaction.symbol], user_id=new_transaction.user_id)
+    _recompute_position(db, new_transaction.symbol, new_transaction.user_id)
+    portfolio_stream.publish_updates(db, [new_transaction.symbol], before, user_ids=[new_transaction.user_id])
     # Return a validated Pydantic model instance to avoid response validation issues
     return transaction_schema.TransactionRead.model_validate(new_transaction)
 
+@router.post("/import")
+async def import_transactions(
+    request: Request,
+    user_id: int,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson)$",
+                               description="Defaults to csv for text/csv bodies, otherwise ndjson"),
+    db: Session = Depends(get_db),
+):
+    """Bulk-import a user's trades from a CSV or NDJSON body.
+
+    All rows are validated first; any invalid row rejects the whole import
+    with 422 and the offending line numbers. See app.services.importer.
+    """
+    if fmt is None:
+        fmt = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    body = (await request.body()).decode("utf-8-sig", errors="replace")
+    try:
+        rows = importer.parse_rows(body, fmt, settings.IMPORT_MAX_ROWS)
+    except importer.ImportValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+
+    def _run():
+        if not db.query(User.id).filter(User.id == user_id).first():
+            raise HTTPException(status_code=404, detail="User not found")
+        return importer.import_rows(db, user_id, rows)
+
+    return await run_in_threadpool(_run)
+
+
 @router.get("/{user_id}", response_model=list[transaction_schema.TransactionRead])
-def get_transactions_for_user(user_id: int, db: Session = Depends(get_db)):
-    transactions = db.query(Transaction).filter(Transaction.user_id == user_id).all()
+async def get_transactions_for_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    transactions = (await db.execute(select(Transaction).where(Transaction.user_id == user_id))).scalars().all()
     return transactions
 
 
+# created_at as stored in the database, used as the keyset cursor. SQLite keeps
+# datetimes as text and rows written by CURRENT_TIMESTAMP have no microseconds,
+# so the cursor must compare against the stored text, not a re-bound datetime.
+_CREATED_AT_KEY = type_coerce(Transaction.created_at, String).label("created_at_key")
+
+
+def _encode_cursor(created_key, tx_id: int) -> str:
+    if isinstance(created_key, datetime):
+        key = {"t": created_key.isoformat()}
+    else:
+        key = {"s": str(created_key)}
+    raw = json.dumps([key, tx_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, tx_id = json.loads(raw)
+        if "t" in key:
+            created = literal(datetime.fromisoformat(key["t"]), DateTime)
+        else:
+            created = literal(key["s"], String)
+        return created, int(tx_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _history_filters(user_id: int, symbol: Optional[str], tx_type: Optional[str],
+                     since: Optional[datetime], until: Optional[datetime]) -> list:
+    conds = [Transaction.user_id == user_id]
+    if symbol:
+        conds.append(Transaction.symbol == symbol.strip().upper())
+    if tx_type:
+        conds.append(func.upper(Transaction.type) == tx_type.strip().upper())
+    if since:
+        conds.append(Transaction.created_at >= since)
+    if until:
+        conds.append(Transaction.created_at < until)
+    return conds
+
+
+@router.get("/{user_id}/page", response_model=transaction_schema.TransactionPage)
+async def get_transactions_page(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    symbol: Optional[str] = None,
+    tx_type: Optional[str] = Query(None, alias="type", description="BUY or SELL"),
+    since: Optional[datetime] = Query(None, description="Only transactions at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only transactions before this time"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Newest-first page of a user's transactions, paginated on (created_at, id)."""
+    stmt = select(Transaction, _CREATED_AT_KEY).where(*_history_filters(user_id, symbol, tx_type, since, until))
+    if cursor:
+        created, tx_id = _decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            Transaction.created_at < created,
+            and_(Transaction.created_at == created, Transaction.id < tx_id),
+        ))
+    stmt = stmt.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_tx, last_key = rows[limit - 1]
+        next_cursor = _encode_cursor(last_key, last_tx.id)
+    return {"items": [tx for tx, _key in rows[:limit]], "next_cursor": next_cursor}
+
+
+_EXPORT_COLUMNS = (
+    Transaction.id, Transaction.user_id, Transaction.symbol, Transaction.name, Transaction.type,
+    Transaction.quantity, Transaction.price, Transaction.total_amount, Transaction.currency,
+    Transaction.created_at,
+)
+
+
+@router.get("/{user_id}/export")
+async def export_transactions(
+    user_id: int,
+    symbol: Optional[str] = None,
+    tx_type: Optional[str] = Query(None, alias="type"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Stream a user's full history (oldest first) as NDJSON, one transaction per line.
+
+    Rows are streamed from the database in batches, so memory stays flat no
+    matter how many transactions the user has.
+    """
+    stmt = (
+        select(*_EXPORT_COLUMNS)
+        .where(*_history_filters(user_id, symbol, tx_type, since, until))
+        .order_by(Transaction.created_at, Transaction.id)
+        .execution_options(yield_per=500)
+    )
+
+    async def lines():
+        # own session: the response body is produced after the request dependencies have finished
+        async with new_async_session() as db:
+            result = await db.stream(stmt)
+            async for row in result:
+                d = dict(row._mapping)
+                if d["created_at"] is not None:
+                    d["created_at"] = d["created_at"].isoformat()
+                yield json.dumps(d) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="transactions-{user_id}.ndjson"'},
+    )
+
+
 
 @router.put("/{transaction_id}", response_model=transaction_schema.TransactionRead)
 def update_transaction(transaction_id: int, update: TransactionUpdate, db: Session = Depends(get_db)):
@@ -83,20 +257,21 @@ def update_transaction(transaction_id: int, update: TransactionUpdate, db: Sessi
     if t.user_id != update.user_id:
         raise HTTPException(status_code=403, detail="Not allowed to modify this transaction")
 
+    before = portfolio_stream.snapshot_positions(db, [t.symbol], user_id=t.user_id)
     # apply changes
     t.quantity = update.quantity
     t.price = update.price
     t.total_amount = update.quantity * update.price
     db.add(t)
+    # checkpoints that already folded this transaction are now stale
+    ledger.invalidate(db, t.user_id, t.symbol, t.id)
+    ledger.note_change(db, t.user_id, t.symbol)
     db.commit()
     db.refresh(t)
 
     # recompute portfolios for this symbol
-    try:
-        recompute_portfolios_for_symbol(db, t.symbol)
-        db.commit()
-    except Exception:
-        pass
+    _recompute_position(db, t.symbol, t.user_id)
+    portfolio_stream.publish_updates(db, [t.symbol], before, user_ids=[t.user_id])
 
     return transaction_schema.TransactionRead.model_validate(t)
 
@@ -110,14 +285,14 @@ def delete_transaction(transaction_id: int, user_id: int, db: Session = Depends(
         raise HTTPException(status_code=403, detail="Not allowed to delete this transaction")
 
     symbol = t.symbol
+    before = portfolio_stream.snapshot_positions(db, [symbol], user_id=user_id)
+    ledger.invalidate(db, user_id, symbol, t.id)
+    ledger.note_change(db, user_id, symbol)
     db.delete(t)
     db.commit()
 
     # recompute portfolios for this symbol
-    try:
-        recompute_portfolios_for_symbol(db, symbol)
-        db.commit()
-    except Exception:
-        pass
+    _recompute_position(db, symbol, user_id)
+    portfolio_stream.publish_updates(db, [symbol], before, user_ids=[user_id])
 
     return {"detail": "deleted"}
\ No newline at end of file
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import models
 from app.schemas import user as user_schema
-from app.database import get_db
+from app.database import get_async_db
+from app.routers.auth import hashing_busy
 from app.utils import auth
 
 router = APIRouter(
@@ -11,14 +14,25 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=user_schema.UserRead)
-def create_user(user_in: user_schema.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.username == user_in.username).first()
+async def create_user(user_in: user_schema.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_user = (await db.execute(
+        select(models.User.id).where(models.User.username == user_in.username)
+    )).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Brugernavn allerede taget")
 
-    hashed_pw = auth.get_password_hash(user_in.password)
+    # bcrypt kører i process-poolen, ikke i request-threadpoolen
+    try:
+        hashed_pw = await auth.get_password_hash_async(user_in.password)
+    except auth.HashingBusy as e:
+        raise hashing_busy(e)
     new_user = models.User(username=user_in.username, hashed_password=hashed_pw)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # same username registered concurrently
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Brugernavn allerede taget")
+    await db.refresh(new_user)
     return new_user
\ No newline at end of file
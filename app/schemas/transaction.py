@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import List, Optional
 
 
 class TransactionCreate(BaseModel):
@@ -45,4 +46,10 @@ class TransactionUpdate(BaseModel):
     model_config = {
         "populate_by_name": True,
         "from_attributes": True,
-    }
\ No newline at end of file
+    }
+
+
+class TransactionPage(BaseModel):
+    items: List[TransactionRead]
+    # pass as `cursor` to fetch the next page; None when there are no more rows
+    next_cursor: Optional[str] = None
@@ -14,4 +14,20 @@ class UserRead(BaseModel):
 
     model_config = {
         "from_attributes": True  # erstatter orm_mode
-    }
\ No newline at end of file
+    }
+
+# Tokens udstedt ved login / refresh (se app/utils/tokens.py)
+class TokenPair(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+
+# Login svar: brugeren plus tokens
+class LoginResponse(UserRead, TokenPair):
+    pass
+
+
+class RefreshIn(BaseModel):
+    refresh_token: str
@@ -0,0 +1,325 @@
+"""Ledger/portfolio consistency verification (scripts/verify_portfolios.py).
+
+For every symbol, the symbol's transactions are streamed in the ledger's
+trade order per user, (user_id, created_at, id), with a server-side cursor
+(`yield_per`) and folded into each position's expected state. That state
+is merged against the symbol's `user_portfolios` rows, which are streamed
+in user_id order too. Memory stays bounded by one symbol's holders, never
+by the size of the ledger.
+
+Per position it checks:
+
+  missing     transactions leave a positive quantity but there is no portfolio row
+  unexpected  a portfolio row exists although the net quantity is <= 0
+  mismatch    quantity, total_amount or avg_cost differ from the ledger, or
+              profit != current_amount - total_amount
+  checkpoint  the latest ledger checkpoint disagrees with the transactions it covers
+
+Valuations (current_amount against today's price) are not compared, since
+the price updater rewrites them every cycle.
+
+Only transactions up to the highest id seen at the start are considered.
+A position that trades while it is being checked is skipped and will be
+checked again on the next run.
+
+Repair drops bad checkpoints and recomputes the affected positions with
+recompute_portfolios_for_symbol. Incremental runs only check positions with
+transactions newer than the last clean run, whose high-water mark is kept
+in the MaintenanceMarker VERIFY_MARKER, and positions whose transactions
+were edited or deleted since (`ledger_changes`, VERIFY_CHANGES_MARKER).
+Clean runs prune the change log up to that mark.
+"""
+import concurrent.futures
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models import LedgerChange, MaintenanceMarker, Transaction, UserPortfolio
+from app.services import ledger
+
+_logger = logging.getLogger(__name__)
+
+VERIFY_MARKER = "portfolio_verifier"
+# same table, but the value is a ledger_changes id
+VERIFY_CHANGES_MARKER = "portfolio_verifier_changes"
+# detailed findings kept per chunk; anything beyond is only counted
+MAX_FINDINGS_PER_CHUNK = 1000
+_STREAM_BATCH = 2000
+
+
+def _close(a: float, b: float) -> bool:
+    return math.isclose(a or 0.0, b or 0.0, rel_tol=1e-9, abs_tol=1e-6)
+
+
+@dataclass
+class Report:
+    positions: int = 0
+    transactions: int = 0
+    skipped_changed: int = 0
+    counts: dict = field(default_factory=dict)
+    findings: list = field(default_factory=list)
+    repaired: int = 0
+
+    @property
+    def problems(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, kind: str, finding: dict) -> None:
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if len(self.findings) < MAX_FINDINGS_PER_CHUNK:
+            self.findings.append({"kind": kind, **finding})
+
+    def merge(self, other: "Report") -> None:
+        self.positions += other.positions
+        self.transactions += other.transactions
+        self.skipped_changed += other.skipped_changed
+        self.repaired += other.repaired
+        for k, v in other.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+        self.findings.extend(other.findings)
+
+    def as_dict(self) -> dict:
+        return {
+            "positions": self.positions,
+            "transactions": self.transactions,
+            "skipped_changed": self.skipped_changed,
+            "problems": self.problems,
+            "counts": self.counts,
+            "repaired": self.repaired,
+            "findings": self.findings,
+        }
+
+
+# -- streams -----------------------------------------------------------------
+
+def _checkpoint_matches(cp, state) -> bool:
+    return (state.last_transaction_id == cp.last_transaction_id
+            and _close(state.quantity, cp.quantity) and _close(state.cost_basis, cp.cost_basis))
+
+
+def _positions(db, symbol: str, high: int, user_ids: Optional[list], report: Report) -> Iterator[tuple]:
+    """Yield (user_id, PositionState, checkpoint ok) for `symbol` in user_id order."""
+    checkpoints = ledger.latest_checkpoints(db, symbol, user_ids)
+    # positions that still have a checkpoint but no transactions up to `high`
+    orphans = sorted(checkpoints)
+    q = (
+        db.query(Transaction.user_id, Transaction.id, Transaction.type, Transaction.quantity, Transaction.total_amount)
+        .filter(Transaction.symbol == symbol, Transaction.id <= high)
+    )
+    if user_ids is not None:
+        q = q.filter(Transaction.user_id.in_(user_ids))
+    rows = q.order_by(Transaction.user_id, Transaction.created_at, Transaction.id).execution_options(stream_results=True).yield_per(_STREAM_BATCH)
+
+    for user_id, txs in itertools.groupby(rows, key=lambda r: r[0]):
+        while orphans and orphans[0] < user_id:
+            uid = orphans.pop(0)
+            yield uid, ledger.PositionState(), _checkpoint_matches(checkpoints[uid], ledger.PositionState())
+        if orphans and orphans[0] == user_id:
+            orphans.pop(0)
+        cp = checkpoints.get(user_id)
+        state = ledger.PositionState()
+        cp_ok, checked = True, cp is None
+        for _uid, tx_id, tx_type, quantity, total_amount in txs:
+            if not checked and tx_id > cp.last_transaction_id:
+                cp_ok, checked = _checkpoint_matches(cp, state), True
+            state.apply(tx_id, tx_type, quantity, total_amount)
+            report.transactions += 1
+        if not checked:
+            cp_ok = _checkpoint_matches(cp, state)
+        yield user_id, state, cp_ok
+    for uid in orphans:
+        yield uid, ledger.PositionState(), _checkpoint_matches(checkpoints[uid], ledger.PositionState())
+
+
+def _merged(expected: Iterator[tuple], stored: Iterable) -> Iterator[tuple]:
+    """Full outer join of two user_id-ordered streams: (expected or None, row or None)."""
+    stored = iter(stored)
+    e, s = next(expected, None), next(stored, None)
+    while e is not None or s is not None:
+        if s is None or (e is not None and e[0] < s.user_id):
+            yield e, None
+            e = next(expected, None)
+        elif e is None or s.user_id < e[0]:
+            yield None, s
+            s = next(stored, None)
+        else:
+            yield e, s
+            e, s = next(expected, None), next(stored, None)
+
+
+# -- checking ----------------------------------------------------------------
+
+def _check_row(state, row) -> Optional[dict]:
+    """Differences between the ledger state and a stored row (None when consistent)."""
+    diffs = {}
+    avg_cost = state.cost_basis / state.quantity if state.quantity > 0 else 0.0
+    for name, expected, actual in (
+        ("quantity", state.quantity, row.quantity),
+        ("total_amount", state.cost_basis, row.total_amount),
+        ("avg_cost", avg_cost, row.avg_cost),
+    ):
+        if not _close(expected, actual):
+            diffs[name] = {"expected": expected, "actual": actual}
+    if not _close(row.profit, (row.current_amount or 0.0) - (row.total_amount or 0.0)):
+        diffs["profit"] = {"expected": (row.current_amount or 0.0) - (row.total_amount or 0.0), "actual": row.profit}
+    return diffs or None
+
+
+def _changed_since(db, symbol: str, user_id: int, high: int, changes_high: int) -> bool:
+    if db.query(Transaction.id).filter(
+        Transaction.symbol == symbol, Transaction.user_id == user_id, Transaction.id > high
+    ).first() is not None:
+        return True
+    return db.query(LedgerChange.id).filter(
+        LedgerChange.id > changes_high, LedgerChange.symbol == symbol, LedgerChange.user_id == user_id
+    ).first() is not None
+
+
+def verify_symbol(db, symbol: str, high: int, changes_high: int, user_ids: Optional[list],
+                  report: Report) -> dict[int, bool]:
+    """Check one symbol; returns {user_id: drop checkpoints} for the positions needing repair."""
+    stored = db.query(UserPortfolio).filter(UserPortfolio.symbol == symbol)
+    if user_ids is not None:
+        stored = stored.filter(UserPortfolio.user_id.in_(user_ids))
+    stored = stored.order_by(UserPortfolio.user_id).execution_options(stream_results=True).yield_per(_STREAM_BATCH)
+
+    bad: dict[int, bool] = {}
+    for e, row in _merged(_positions(db, symbol, high, user_ids, report), stored):
+        report.positions += 1
+        user_id = e[0] if e is not None else row.user_id
+        state, cp_ok = (e[1], e[2]) if e is not None else (ledger.PositionState(), True)
+        findings = []
+        if not cp_ok:
+            findings.append(("checkpoint", {}))
+        if state.quantity > 0 and row is None:
+            findings.append(("missing", {"expected_quantity": state.quantity}))
+        elif state.quantity <= 0 and row is not None:
+            findings.append(("unexpected", {"quantity": row.quantity}))
+        elif row is not None:
+            diffs = _check_row(state, row)
+            if diffs:
+                findings.append(("mismatch", {"fields": diffs}))
+        if not findings:
+            continue
+        if _changed_since(db, symbol, user_id, high, changes_high):
+            report.skipped_changed += 1
+            continue
+        for kind, detail in findings:
+            report.add(kind, {"user_id": user_id, "symbol": symbol, **detail})
+        bad[user_id] = not cp_ok
+    return bad
+
+
+def repair_symbol(db, symbol: str, bad: dict[int, bool]) -> int:
+    """Drop inconsistent checkpoints and rebuild the given positions. Commits."""
+    from app.services.price_updater import recompute_portfolios_for_symbol
+
+    for user_id, drop_checkpoints in bad.items():
+        if drop_checkpoints:
+            ledger.invalidate(db, user_id, symbol, 0)
+    recompute_portfolios_for_symbol(db, symbol, user_ids=list(bad))
+    db.commit()
+    return len(bad)
+
+
+def verify_chunk(scope: dict, high: int, changes_high: int, repair: bool = False) -> Report:
+    """Verify {symbol: user ids or None} on a session of its own (worker process entry point)."""
+    report = Report()
+    db = SessionLocal()
+    try:
+        for symbol, user_ids in scope.items():
+            bad = verify_symbol(db, symbol, high, changes_high, user_ids, report)
+            db.rollback()  # end the read transaction before writing
+            if repair and bad:
+                report.repaired += repair_symbol(db, symbol, bad)
+        return report
+    finally:
+        db.close()
+
+
+# -- runs --------------------------------------------------------------------
+
+def _scope(db, since: int, high: int, changes_since: int, changes_high: int) -> dict:
+    """{symbol: user ids or None (all)}: everything, or positions traded or edited after the marks."""
+    if since <= 0:
+        return {sym: None for (sym,) in db.query(Transaction.symbol).distinct()} | {
+            sym: None for (sym,) in db.query(UserPortfolio.symbol).distinct()}
+    scope: dict = {}
+    traded = (
+        db.query(Transaction.symbol, Transaction.user_id)
+        .filter(Transaction.id > since, Transaction.id <= high)
+        .distinct()
+        .execution_options(stream_results=True)
+        .yield_per(_STREAM_BATCH)
+    )
+    edited = (
+        db.query(LedgerChange.symbol, LedgerChange.user_id)
+        .filter(LedgerChange.id > changes_since, LedgerChange.id <= changes_high)
+        .distinct()
+    )
+    for symbol, user_id in itertools.chain(traded, edited):
+        scope.setdefault(symbol, set()).add(user_id)
+    return {symbol: sorted(users) for symbol, users in scope.items()}
+
+
+def verify(incremental: bool = False, repair: bool = False, workers: Optional[int] = None,
+           chunk_size: int = 20, symbols: Optional[list] = None) -> Report:
+    """Verify the whole ledger (or the incremental scope) in parallel symbol chunks.
+
+    Advances the incremental marker when the run ends without unrepaired problems.
+    """
+    workers = workers or os.cpu_count() or 1
+    db = SessionLocal()
+    try:
+        high = db.query(func.max(Transaction.id)).scalar() or 0
+        changes_high = db.query(func.max(LedgerChange.id)).scalar() or 0
+        marker = db.get(MaintenanceMarker, VERIFY_MARKER)
+        changes_marker = db.get(MaintenanceMarker, VERIFY_CHANGES_MARKER)
+        since = marker.last_transaction_id if (incremental and marker) else 0
+        changes_since = changes_marker.last_transaction_id if changes_marker else 0
+        scope = _scope(db, since, high, changes_since, changes_high)
+        if symbols:
+            scope = {s: scope.get(s) for s in symbols if s in scope or since <= 0}
+        db.rollback()
+    finally:
+        db.close()
+
+    items = sorted(scope.items())
+    chunks = [dict(items[i:i + chunk_size]) for i in range(0, len(items), max(1, chunk_size))]
+    report = Report()
+    _logger.info("Verifying %d symbols in %d chunks (transactions %d..%d, changes %d..%d)",
+                 len(items), len(chunks), since, high, changes_since, changes_high)
+    if workers > 1 and len(chunks) > 1:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)), mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            for part in pool.map(verify_chunk, chunks, itertools.repeat(high), itertools.repeat(changes_high),
+                                 itertools.repeat(repair)):
+                report.merge(part)
+    else:
+        for chunk in chunks:
+            report.merge(verify_chunk(chunk, high, changes_high, repair))
+
+    if not symbols and (report.problems == 0 or repair):
+        db = SessionLocal()
+        try:
+            for name, value in ((VERIFY_MARKER, high), (VERIFY_CHANGES_MARKER, changes_high)):
+                marker = db.get(MaintenanceMarker, name)
+                if marker is None:
+                    db.add(MaintenanceMarker(name=name, last_transaction_id=value))
+                else:
+                    marker.last_transaction_id = max(marker.last_transaction_id, value)
+            # the verifier is the only reader of the change log
+            db.query(LedgerChange).filter(LedgerChange.id <= changes_high).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+    return report
@@ -0,0 +1,168 @@
+"""Bulk transaction import (CSV or NDJSON) for users moving over from a broker.
+
+Rows are parsed and validated up front; if any row is invalid nothing is
+imported. Valid rows are inserted with batched executemany statements in one
+database transaction, missing StockPrice rows are created in bulk, and each
+affected symbol is recomputed once for the importing user at the end. A
+failed recompute rolls the whole import back. Rows dated before trades a
+ledger checkpoint already covers drop that position's checkpoints, since
+the ledger folds trades in date order.
+
+Accepted columns / keys (case-insensitive):
+  symbol, type (BUY/SELL), quantity (or amount), price,
+  currency (default USD), name (or full_name, default symbol),
+  created_at (optional ISO-8601 timestamp; with an offset it is converted to UTC)
+"""
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy import insert
+
+from app.models import Transaction
+from app.services import ledger, portfolio_stream
+from app.services.price_updater import recompute_portfolios_for_symbol
+from app.services.stocks import ensure_stocks_in_db_bulk
+
+_logger = logging.getLogger(__name__)
+
+# Rows per executemany statement
+BATCH_SIZE = 1000
+# Report at most this many row errors back to the client
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportRow(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=10)
+    type: str
+    quantity: float = Field(..., gt=0, alias="amount")
+    price: float = Field(..., ge=0)
+    currency: str = Field("USD", min_length=1, max_length=10)
+    name: Optional[str] = Field(None, max_length=100, alias="full_name")
+    created_at: Optional[datetime] = None
+
+    model_config = {"populate_by_name": True}
+
+    @field_validator("symbol")
+    @classmethod
+    def _upper_symbol(cls, v: str) -> str:
+        return v.strip().upper()
+
+    @field_validator("created_at")
+    @classmethod
+    def _naive_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        # stored naive UTC like datetime.utcnow(), so rows compare and sort by time
+        if v is not None and v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+    @field_validator("type")
+    @classmethod
+    def _check_type(cls, v: str) -> str:
+        v = v.strip().upper()
+        if v not in ("BUY", "SELL"):
+            raise ValueError("type must be BUY or SELL")
+        return v
+
+
+class ImportValidationError(Exception):
+    """Raised when the payload cannot be imported; `errors` lists the bad rows."""
+
+    def __init__(self, errors: list):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+def _records(text: str, fmt: str):
+    """Yield (line_number, dict) from a CSV or NDJSON payload."""
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        for i, rec in enumerate(reader, start=2):  # line 1 is the header
+            yield i, {(k or "").strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in rec.items()}
+    else:
+        for i, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError as e:
+                yield i, e
+                continue
+            if not isinstance(rec, dict):
+                yield i, ValueError("expected a JSON object")
+                continue
+            yield i, {str(k).lower(): v for k, v in rec.items()}
+
+
+def parse_rows(text: str, fmt: str, max_rows: int) -> list[ImportRow]:
+    """Parse and validate the whole payload; raise ImportValidationError listing bad rows."""
+    rows: list[ImportRow] = []
+    errors: list[dict] = []
+    for line, rec in _records(text, fmt):
+        if isinstance(rec, Exception):
+            errors.append({"line": line, "error": str(rec)})
+            continue
+        # empty CSV cells mean "not given"
+        rec = {k: v for k, v in rec.items() if v not in ("", None)}
+        try:
+            rows.append(ImportRow.model_validate(rec))
+        except ValidationError as e:
+            errors.append({"line": line, "error": "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            )})
+        if len(rows) + len(errors) > max_rows:
+            raise ImportValidationError([{"line": line, "error": f"too many rows (max {max_rows})"}])
+    if errors:
+        raise ImportValidationError(errors[:MAX_REPORTED_ERRORS])
+    if not rows:
+        raise ImportValidationError([{"line": 0, "error": "no rows to import"}])
+    return rows
+
+
+def import_rows(db, user_id: int, rows: list[ImportRow]) -> dict:
+    """Insert validated rows for `user_id` and recompute each affected symbol once."""
+    meta = {}
+    for r in rows:
+        meta.setdefault(r.symbol, (r.name or r.symbol, r.currency))
+    symbols = sorted(meta)
+    before = portfolio_stream.snapshot_positions(db, symbols, user_id=user_id)
+
+    try:
+        known = ensure_stocks_in_db_bulk(db, meta)
+        now = datetime.utcnow()
+        values = []
+        for r in rows:
+            # Prefer stored name/currency for known symbols, like create_transaction does
+            sp_name, sp_currency = known.get(r.symbol, (None, None))
+            values.append({
+                "user_id": user_id,
+                "symbol": r.symbol,
+                "name": sp_name or r.name or r.symbol,
+                "type": r.type,
+                "quantity": r.quantity,
+                "price": r.price,
+                "total_amount": r.quantity * r.price,
+                "currency": sp_currency or r.currency,
+                "created_at": r.created_at or now,
+            })
+        for i in range(0, len(values), BATCH_SIZE):
+            db.execute(insert(Transaction), values[i:i + BATCH_SIZE])
+        earliest = {}
+        for r in rows:
+            if r.created_at is not None and (r.symbol not in earliest or r.created_at < earliest[r.symbol]):
+                earliest[r.symbol] = r.created_at
+        for sym, created_at in earliest.items():
+            ledger.invalidate_since(db, user_id, sym, created_at)
+        for sym in symbols:
+            recompute_portfolios_for_symbol(db, sym, user_ids=[user_id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    portfolio_stream.publish_updates(db, symbols, before, user_ids=[user_id])
+    _logger.info("Imported %d transactions for user %s (%d symbols)", len(values), user_id, len(symbols))
+    return {"imported": len(values), "symbols": symbols}
@@ -0,0 +1,217 @@
+"""Leader election so only one process runs the price updater.
+
+Every uvicorn worker starts an elector thread. The worker that holds the
+lease runs the price updater; the others only consume its broadcasts over
+the websocket bus (see ws_pubsub). The leader renews its lease every third
+of LEADER_LEASE_SECONDS; if it dies or stalls, the lease expires and a
+follower takes over on its next attempt.
+
+LEADER_ELECTION selects the lease backend:
+
+  db    a row in `service_leases` (works for SQLite and PostgreSQL)
+  file  an exclusive flock on LEADER_LOCK_PATH (single host; the OS drops
+        the lock when the holder dies)
+  none  no election; every process runs its own updater
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ServiceLease
+from app.services.price_updater import start_price_updater
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except Exception:
+    fcntl = None
+
+PRICE_UPDATER_LEASE = "price_updater"
+
+# Unique id of this process for lease ownership
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# True while this process holds the price updater lease
+_is_leader = False
+
+
+def is_leader() -> bool:
+    return _is_leader
+
+
+class DbLease:
+    """Lease stored as a row in `service_leases`.
+
+    Acquire and renew are the same conditional UPDATE: it only succeeds when
+    we already hold the lease or the current holder's lease has expired.
+    """
+
+    def __init__(self, name: str, holder: str, ttl_seconds: int):
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl_seconds
+
+    def acquire(self) -> bool:
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=self.ttl)
+        db = SessionLocal()
+        try:
+            updated = (
+                db.query(ServiceLease)
+                .filter(
+                    ServiceLease.name == self.name,
+                    or_(ServiceLease.holder == self.holder, ServiceLease.expires_at < now),
+                )
+                .update({"holder": self.holder, "expires_at": expires}, synchronize_session=False)
+            )
+            if not updated:
+                if db.query(ServiceLease.name).filter(ServiceLease.name == self.name).first():
+                    # held by someone else and not expired
+                    db.rollback()
+                    return False
+                db.add(ServiceLease(name=self.name, holder=self.holder, expires_at=expires))
+            db.commit()
+            return True
+        except IntegrityError:
+            # another process inserted the row first
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    def release(self) -> None:
+        db = SessionLocal()
+        try:
+            db.query(ServiceLease).filter(
+                ServiceLease.name == self.name, ServiceLease.holder == self.holder
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            _logger.exception("Failed to release lease %s", self.name)
+        finally:
+            db.close()
+
+
+class FileLease:
+    """Lease backed by an exclusive, non-blocking flock on a lock file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def acquire(self) -> bool:
+        if self._fd is not None:
+            # the OS keeps the lock for as long as we keep the fd open
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, HOLDER_ID.encode("utf-8"))
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _make_lease(ttl: int):
+    mode = (settings.LEADER_ELECTION or "db").lower()
+    if mode == "file":
+        if fcntl is None:
+            _logger.warning("fcntl not available; falling back to db lease")
+        else:
+            return FileLease(settings.LEADER_LOCK_PATH)
+    return DbLease(PRICE_UPDATER_LEASE, HOLDER_ID, ttl)
+
+
+def _election_loop(lease, stop_event: threading.Event, ttl: int,
+                   on_elected: Callable[[], None], on_demoted: Callable[[], None]):
+    global _is_leader
+    renew_every = max(1, ttl // 3)
+    last_renewed = None
+    while not stop_event.is_set():
+        try:
+            held = lease.acquire()
+        except Exception:
+            # unknown outcome (e.g. DB unavailable); keep our role until the lease would have expired
+            _logger.exception("Lease acquire/renew failed")
+            held = None
+
+        now = datetime.utcnow()
+        if held:
+            last_renewed = now
+            if not _is_leader:
+                _logger.info("Elected price updater leader (%s)", HOLDER_ID)
+                _is_leader = True
+                on_elected()
+        elif _is_leader and (held is False or (now - last_renewed).total_seconds() >= ttl):
+            _logger.warning("Lost price updater leadership (%s)", HOLDER_ID)
+            _is_leader = False
+            on_demoted()
+
+        stop_event.wait(renew_every)
+
+    if _is_leader:
+        _is_leader = False
+        on_demoted()
+    try:
+        lease.release()
+    except Exception:
+        _logger.exception("Failed to release lease on shutdown")
+
+
+def start_leader_election(on_elected: Callable[[], None], on_demoted: Callable[[], None],
+                          ttl_seconds: int | None = None) -> tuple[threading.Thread, threading.Event]:
+    """Start the elector thread; callbacks run on that thread on role changes."""
+    ttl = ttl_seconds or settings.LEADER_LEASE_SECONDS
+    lease = _make_lease(ttl)
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=_election_loop, args=(lease, stop_event, ttl, on_elected, on_demoted), daemon=True
+    )
+    thread.start()
+    return thread, stop_event
+
+
+def start_price_updater_with_election(interval_seconds: int) -> tuple[threading.Thread, threading.Event]:
+    """Run the price updater only while this process holds the leader lease.
+
+    Returns the elector thread and its stop event; setting the event stops the
+    updater (if running here) and releases the lease.
+    """
+    if (settings.LEADER_ELECTION or "").lower() == "none":
+        return start_price_updater(interval_seconds=interval_seconds)
+
+    state = {}
+
+    def _on_elected():
+        state["updater"] = start_price_updater(interval_seconds=interval_seconds)
+
+    def _on_demoted():
+        updater = state.pop("updater", None)
+        if updater is not None:
+            thread, stop = updater
+            stop.set()
+            thread.join(timeout=5)
+
+    return start_leader_election(_on_elected, _on_demoted)
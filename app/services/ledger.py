@@ -0,0 +1,310 @@
+"""Ledger checkpoints: per-(user, symbol) position state as of a transaction id.
+
+A checkpoint folds every transaction of a position with id <= its
+`last_transaction_id` into quantity, net cost basis (spent - received, the
+same figure UserPortfolio.total_amount holds), the average-cost basis of the
+open quantity and realized P&L. Rebuilds start from the latest checkpoint and
+only aggregate newer transactions, so their cost tracks recent activity
+instead of total history.
+
+Transactions are folded in trade order, (created_at, id). A checkpoint
+covers the ids up to `last_transaction_id`, and newer ids are folded after
+it, so this relies on new transactions not predating the ones a checkpoint
+already covers. Live trades are stamped with the current time; the importer
+accepts historical timestamps and calls `invalidate_since` for positions it
+backdates. Editing or deleting a transaction that a checkpoint already
+covers invalidates that position's checkpoints from that id on (see
+`invalidate`), and the next rebuild falls back to the previous checkpoint or
+to the full history.
+
+Ids are allocated when a transaction is inserted, not when it commits, so on
+a database with concurrent writers (PostgreSQL) a lower id can become
+visible after a higher one. create_checkpoints therefore only covers ids it
+had already seen on its previous run, one CHECKPOINT_INTERVAL_SECONDS ago;
+a write transaction left open longer than that can still be missed.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable
+
+from sqlalchemy import and_, case, func
+
+from app.config import settings
+from app.models import LedgerChange, MaintenanceMarker, PortfolioCheckpoint, Transaction
+
+_logger = logging.getLogger(__name__)
+
+# MaintenanceMarker rows of create_checkpoints: the transaction id it has
+# checkpointed up to, and the highest id it saw on its previous run
+CHECKPOINT_MARKER = "ledger_checkpoints"
+CHECKPOINT_SEEN_MARKER = "ledger_checkpoints_seen"
+
+
+@dataclass
+class PositionState:
+    quantity: float = 0.0
+    cost_basis: float = 0.0
+    open_cost: float = 0.0
+    realized_pnl: float = 0.0
+    last_transaction_id: int = 0
+
+    @classmethod
+    def from_checkpoint(cls, cp: PortfolioCheckpoint | None) -> "PositionState":
+        if cp is None:
+            return cls()
+        return cls(cp.quantity, cp.cost_basis, cp.open_cost, cp.realized_pnl, cp.last_transaction_id)
+
+    def apply(self, tx_id: int, tx_type: str, quantity: float, total_amount: float) -> None:
+        """Fold one transaction in (average-cost method for realized P&L)."""
+        quantity = quantity or 0.0
+        total_amount = total_amount or 0.0
+        if (tx_type or "").upper() == "BUY":
+            self.quantity += quantity
+            self.cost_basis += total_amount
+            self.open_cost += total_amount
+        elif (tx_type or "").upper() == "SELL":
+            avg = self.open_cost / self.quantity if self.quantity > 0 else 0.0
+            sold = min(quantity, max(self.quantity, 0.0))
+            self.realized_pnl += total_amount - avg * sold
+            self.open_cost -= avg * sold
+            self.quantity -= quantity
+            self.cost_basis -= total_amount
+            if self.quantity <= 0:
+                self.open_cost = 0.0
+        self.last_transaction_id = max(self.last_transaction_id, tx_id)
+
+
+def _latest_ids(db, symbol: str):
+    """Subquery: (user_id, last_id) of the newest checkpoint per user for `symbol`."""
+    return (
+        db.query(
+            PortfolioCheckpoint.user_id.label("user_id"),
+            func.max(PortfolioCheckpoint.last_transaction_id).label("last_id"),
+        )
+        .filter(PortfolioCheckpoint.symbol == symbol)
+        .group_by(PortfolioCheckpoint.user_id)
+        .subquery()
+    )
+
+
+def latest_checkpoints(db, symbol: str, user_ids: Iterable[int] | None = None) -> Dict[int, PortfolioCheckpoint]:
+    """Return {user_id: newest checkpoint} for `symbol`."""
+    latest = _latest_ids(db, symbol)
+    q = db.query(PortfolioCheckpoint).join(
+        latest,
+        and_(
+            PortfolioCheckpoint.user_id == latest.c.user_id,
+            PortfolioCheckpoint.last_transaction_id == latest.c.last_id,
+        ),
+    ).filter(PortfolioCheckpoint.symbol == symbol)
+    if user_ids is not None:
+        q = q.filter(PortfolioCheckpoint.user_id.in_(list(user_ids)))
+    return {cp.user_id: cp for cp in q}
+
+
+def net_positions(db, symbol: str, user_ids: Iterable[int] | None = None) -> Dict[int, tuple[float, float]]:
+    """Return {user_id: (net quantity, net cost basis)} for `symbol`.
+
+    Starts from each user's latest checkpoint and adds SQL aggregates over the
+    transactions after it, so only post-checkpoint rows are read.
+    """
+    scope = list(user_ids) if user_ids is not None else None
+    latest = _latest_ids(db, symbol)
+    q = (
+        db.query(
+            Transaction.user_id,
+            func.coalesce(func.sum(case((Transaction.type.ilike('BUY'), Transaction.quantity), else_=0)), 0),
+            func.coalesce(func.sum(case((Transaction.type.ilike('SELL'), Transaction.quantity), else_=0)), 0),
+            func.coalesce(func.sum(case((Transaction.type.ilike('BUY'), Transaction.total_amount), else_=0)), 0),
+            func.coalesce(func.sum(case((Transaction.type.ilike('SELL'), Transaction.total_amount), else_=0)), 0),
+        )
+        .outerjoin(latest, latest.c.user_id == Transaction.user_id)
+        .filter(Transaction.symbol == symbol, Transaction.id > func.coalesce(latest.c.last_id, 0))
+    )
+    if scope is not None:
+        q = q.filter(Transaction.user_id.in_(scope))
+
+    positions = {
+        uid: (cp.quantity, cp.cost_basis) for uid, cp in latest_checkpoints(db, symbol, scope).items()
+    }
+    for uid, qty_buy, qty_sell, spent_buy, received_sell in q.group_by(Transaction.user_id):
+        qty, cost = positions.get(uid, (0.0, 0.0))
+        positions[uid] = (qty + (qty_buy or 0) - (qty_sell or 0), cost + (spent_buy or 0) - (received_sell or 0))
+    return positions
+
+
+def _fold_newer(db, user_id: int, symbol: str, state: PositionState, upto: int | None = None) -> PositionState:
+    q = db.query(Transaction.id, Transaction.type, Transaction.quantity, Transaction.total_amount).filter(
+        Transaction.symbol == symbol,
+        Transaction.user_id == user_id,
+        Transaction.id > state.last_transaction_id,
+    )
+    if upto is not None:
+        q = q.filter(Transaction.id <= upto)
+    rows = q.order_by(Transaction.created_at, Transaction.id).yield_per(1000)
+    for tx_id, tx_type, quantity, total_amount in rows:
+        state.apply(tx_id, tx_type, quantity, total_amount)
+    return state
+
+
+def position_state(db, user_id: int, symbol: str) -> PositionState:
+    """Full position state (incl. realized P&L): latest checkpoint + newer transactions."""
+    cp = latest_checkpoints(db, symbol, [user_id]).get(user_id)
+    return _fold_newer(db, user_id, symbol, PositionState.from_checkpoint(cp))
+
+
+def checkpoint_position(db, user_id: int, symbol: str, upto: int | None = None) -> PortfolioCheckpoint | None:
+    """Write a checkpoint covering the position's transactions (ids up to `upto`, default all).
+
+    Returns None when there is nothing new since the latest checkpoint. Does
+    not commit.
+    """
+    cp = latest_checkpoints(db, symbol, [user_id]).get(user_id)
+    state = _fold_newer(db, user_id, symbol, PositionState.from_checkpoint(cp), upto)
+    if cp is not None and state.last_transaction_id == cp.last_transaction_id:
+        return None
+    new_cp = PortfolioCheckpoint(
+        user_id=user_id,
+        symbol=symbol,
+        last_transaction_id=state.last_transaction_id,
+        quantity=state.quantity,
+        cost_basis=state.cost_basis,
+        open_cost=state.open_cost,
+        realized_pnl=state.realized_pnl,
+    )
+    db.add(new_cp)
+    return new_cp
+
+
+def invalidate(db, user_id: int, symbol: str, transaction_id: int) -> int:
+    """Drop the position's checkpoints that already cover `transaction_id`.
+
+    Call before committing an edit or delete of that transaction. Does not
+    commit; returns the number of checkpoints removed.
+    """
+    return (
+        db.query(PortfolioCheckpoint)
+        .filter(
+            PortfolioCheckpoint.symbol == symbol,
+            PortfolioCheckpoint.user_id == user_id,
+            PortfolioCheckpoint.last_transaction_id >= transaction_id,
+        )
+        .delete(synchronize_session=False)
+    )
+
+
+def note_change(db, user_id: int, symbol: str) -> None:
+    """Record that an existing transaction of the position was edited or deleted.
+
+    Incremental consistency checks pick the position up from `ledger_changes`.
+    Does not commit.
+    """
+    db.add(LedgerChange(user_id=user_id, symbol=symbol))
+
+
+def invalidate_since(db, user_id: int, symbol: str, created_at) -> int:
+    """Drop the position's checkpoints that cover a transaction made after `created_at`.
+
+    Call after inserting a transaction dated `created_at` that may predate
+    transactions a checkpoint already folded (imported history). Does not
+    commit; returns the number of checkpoints removed.
+    """
+    first_later = (
+        db.query(func.min(Transaction.id))
+        .filter(
+            Transaction.symbol == symbol,
+            Transaction.user_id == user_id,
+            Transaction.created_at > created_at,
+        )
+        .scalar()
+    )
+    if first_later is None:
+        return 0
+    return invalidate(db, user_id, symbol, first_later)
+
+
+def _set_marker(db, name: str, value: int) -> None:
+    marker = db.get(MaintenanceMarker, name)
+    if marker is None:
+        db.add(MaintenanceMarker(name=name, last_transaction_id=value))
+    else:
+        marker.last_transaction_id = value
+
+
+def create_checkpoints(db, min_transactions: int | None = None, upto: int | None = None) -> int:
+    """Checkpoint every position with at least `min_transactions` uncheckpointed rows.
+
+    Only positions with activity since the previous run are considered (a
+    MaintenanceMarker keeps the transaction id covered so far), so the job
+    itself reads recent transactions only. Checkpoints cover ids up to
+    `upto`, by default the highest id seen on the previous run (see the
+    module docstring); pass the current maximum only when no writes are in
+    flight. Commits; returns the number of checkpoints written.
+    """
+    if min_transactions is None:
+        min_transactions = settings.CHECKPOINT_MIN_TRANSACTIONS
+    marker = db.get(MaintenanceMarker, CHECKPOINT_MARKER)
+    seen = db.get(MaintenanceMarker, CHECKPOINT_SEEN_MARKER)
+    since = marker.last_transaction_id if marker else 0
+    high = db.query(func.max(Transaction.id)).scalar() or 0
+    if upto is None:
+        upto = seen.last_transaction_id if seen else 0
+    upto = min(upto, high)
+
+    active = []
+    if upto > since:
+        active = (
+            db.query(Transaction.user_id, Transaction.symbol)
+            .filter(Transaction.id > since, Transaction.id <= upto)
+            .distinct()
+            .all()
+        )
+    written = 0
+    for user_id, symbol in active:
+        cp = latest_checkpoints(db, symbol, [user_id]).get(user_id)
+        pending = (
+            db.query(func.count(Transaction.id))
+            .filter(
+                Transaction.symbol == symbol,
+                Transaction.user_id == user_id,
+                Transaction.id > (cp.last_transaction_id if cp else 0),
+                Transaction.id <= upto,
+            )
+            .scalar()
+        )
+        if pending < min_transactions:
+            continue
+        if checkpoint_position(db, user_id, symbol, upto) is not None:
+            written += 1
+
+    # positions below the threshold stay "active" through their next trade,
+    # which is newer than `upto` and puts them back in scope
+    _set_marker(db, CHECKPOINT_MARKER, max(since, upto))
+    _set_marker(db, CHECKPOINT_SEEN_MARKER, high)
+    db.commit()
+    _logger.info("Wrote %d ledger checkpoints (%d active positions)", written, len(active))
+    return written
+
+
+def compact_checkpoints(db, keep: int = 1) -> int:
+    """Delete all but the newest `keep` checkpoints of every position. Commits."""
+    keep = max(1, keep)
+    ranked = (
+        db.query(
+            PortfolioCheckpoint.id.label("id"),
+            func.row_number().over(
+                partition_by=(PortfolioCheckpoint.symbol, PortfolioCheckpoint.user_id),
+                order_by=PortfolioCheckpoint.last_transaction_id.desc(),
+            ).label("rn"),
+        )
+        .subquery()
+    )
+    stale = db.query(ranked.c.id).filter(ranked.c.rn > keep)
+    removed = (
+        db.query(PortfolioCheckpoint)
+        .filter(PortfolioCheckpoint.id.in_(stale.scalar_subquery()))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    _logger.info("Compacted ledger checkpoints: removed %d (keeping %d per position)", removed, keep)
+    return removed
@@ -0,0 +1,277 @@
+"""In-process metrics rendered in the Prometheus text format (/admin/metrics).
+
+A deliberately small registry (counters, gauges, histograms with labels)
+instead of a prometheus_client dependency. Every uvicorn worker keeps its
+own numbers, so scrape each worker or aggregate per instance.
+
+What is recorded:
+  - `MetricsMiddleware`: per-route request count, latency histogram and
+    in-flight requests. Routes are labelled by their path template
+    ("/portfolio/{user_id}"), never by the raw URL.
+  - engine events on every SQLAlchemy engine: query count and duration,
+    both overall and per request (through a contextvar that follows the
+    request into the threadpool and into async sessions).
+  - gauges sampled when the endpoint is scraped: threadpool tokens in use,
+    websocket clients, bus queue depths, the bcrypt pool backlog and event
+    loop lag.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+_UNMATCHED = "<unmatched>"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict = {}
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1.0, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labels) -> None:
+        self.inc(-amount, *labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket (non-cumulative) counts + overflow, then sum
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = f'le="{_num(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {running}")
+        return lines
+
+
+# -- registry ----------------------------------------------------------------
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+db_queries = Counter("db_queries_total", "SQL statements executed (all engines, incl. background work).")
+db_query_latency = Histogram("db_query_duration_seconds", "Duration of single SQL statements.", buckets=QUERY_BUCKETS)
+db_queries_per_request = Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request.", ("method", "route"), buckets=COUNT_BUCKETS
+)
+db_time_per_request = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per HTTP request.", ("method", "route"), buckets=QUERY_BUCKETS
+)
+
+REGISTRY = [http_requests, http_latency, http_in_flight, db_queries, db_query_latency,
+            db_queries_per_request, db_time_per_request]
+
+
+def reset() -> None:
+    """Clear every recorded value (tests, benchmarks)."""
+    for m in REGISTRY:
+        m.reset()
+
+
+# -- DB query tracking -------------------------------------------------------
+
+# [query count, seconds] of the current request, None outside requests
+_request_db: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("metrics_request_db", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_queries.inc()
+    db_query_latency.observe(elapsed)
+    stats = _request_db.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("metrics_query_start"):
+        conn.info["metrics_query_start"].pop()
+
+
+# -- HTTP middleware ---------------------------------------------------------
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return _UNMATCHED
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware overhead); HTTP only."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        root_path = scope.get("root_path", "")
+        db_stats = [0, 0.0]
+        token = _request_db.set(db_stats)
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            _request_db.reset(token)
+            route = _route_label(scope)
+            if route == _UNMATCHED and scope.get("root_path", "") != root_path:
+                route = scope["root_path"][len(root_path):] or route  # mounted app, e.g. /app
+            method = scope.get("method", "")
+            http_requests.inc(1, method, route, str(status["code"]))
+            http_latency.observe(elapsed, method, route)
+            db_queries_per_request.observe(db_stats[0], method, route)
+            db_time_per_request.observe(db_stats[1], method, route)
+
+
+# -- scrape ------------------------------------------------------------------
+
+def _sampled_gauges() -> list[str]:
+    """Gauges read from the live system at scrape time (call from the event loop)."""
+    from anyio.to_thread import current_default_thread_limiter
+
+    from app.services import rate_limit, ws_manager
+    from app.utils import auth
+
+    limiter = current_default_thread_limiter()
+    stats = limiter.statistics()
+    samples = [
+        ("threadpool_tokens_total", "Size of the threadpool used for sync endpoints/dependencies.",
+         limiter.total_tokens),
+        ("threadpool_tokens_in_use", "Threadpool tokens currently borrowed.", stats.borrowed_tokens),
+        ("threadpool_tasks_waiting", "Tasks waiting for a threadpool token (saturation).", stats.tasks_waiting),
+        ("password_hash_pending", "bcrypt calls queued or running in the hash pool.", auth.hash_queue_depth()),
+        ("event_loop_lag_seconds", "Latest measured event loop lag (load shedding input).", rate_limit.loop_lag()),
+    ]
+    samples.extend(ws_manager.stats())
+    lines = []
+    for name, doc, value in samples:
+        lines += [f"# HELP {name} {doc}", f"# TYPE {name} gauge", f"{name} {_num(value)}"]
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for m in REGISTRY:
+        lines += m.render()
+    lines += _sampled_gauges()
+    return "\n".join(lines) + "\n"
+
+
+def install(app) -> None:
+    """Add the middleware to `app` when METRICS_ENABLED."""
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
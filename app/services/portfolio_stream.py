@@ -0,0 +1,153 @@
+"""Server-side portfolio valuation pushed to per-user websocket channels.
+
+When prices change (price updater) or a user trades (transaction endpoints),
+the affected users' portfolios are valued in one query and a
+`portfolio_update` message is published on the websocket bus:
+
+    {"type": "portfolio_update", "user_id": 1,
+     "total_value": 1234.5, "total_cost": 1000.0, "profit": 234.5,
+     "positions": [{"symbol": "AAPL", "quantity": 10, "price": 123.45,
+                    "current_amount": 1234.5, "profit": 234.5, "delta": 12.0}]}
+
+`positions` only lists the changed symbols; `delta` is the change in the
+position's value since the previous snapshot. Only users holding (or, after a
+trade, having held) a changed symbol get a message.
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+from app.models import StockPrice, UserPortfolio
+from app.services import ws_manager
+
+_logger = logging.getLogger(__name__)
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+_CHUNK = 500
+
+Snapshot = Dict[Tuple[int, str], float]
+
+
+def _chunks(items, size=_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def snapshot_positions(db, symbols: Iterable[str], user_id: int | None = None) -> Snapshot:
+    """Return {(user_id, symbol): current_amount} for the given symbols.
+
+    Take it before recomputing so deltas can be reported afterwards.
+    """
+    snap: Snapshot = {}
+    for chunk in _chunks(set(symbols)):
+        q = db.query(UserPortfolio.user_id, UserPortfolio.symbol, UserPortfolio.current_amount).filter(
+            UserPortfolio.symbol.in_(chunk)
+        )
+        if user_id is not None:
+            q = q.filter(UserPortfolio.user_id == user_id)
+        for uid, sym, amount in q:
+            snap[(uid, sym)] = amount or 0.0
+    return snap
+
+
+def build_updates(db, changed: Iterable[str], before: Snapshot, user_ids: Iterable[int] | None = None) -> list[dict]:
+    """Value the portfolios of affected users and build their update messages.
+
+    Affected users are those holding a changed symbol now or in `before`
+    (unless `user_ids` is given explicitly).
+    """
+    changed = set(changed)
+    if user_ids is None:
+        users = {uid for (uid, _sym) in before}
+        for chunk in _chunks(changed):
+            users.update(
+                uid for (uid,) in db.query(UserPortfolio.user_id).filter(UserPortfolio.symbol.in_(chunk)).distinct()
+            )
+    else:
+        users = set(user_ids)
+    if not users:
+        return []
+
+    positions = defaultdict(list)
+    for chunk in _chunks(users):
+        rows = (
+            db.query(
+                UserPortfolio.user_id,
+                UserPortfolio.symbol,
+                UserPortfolio.quantity,
+                UserPortfolio.total_amount,
+                UserPortfolio.current_amount,
+                UserPortfolio.profit,
+                StockPrice.current_price,
+            )
+            .outerjoin(StockPrice, StockPrice.symbol == UserPortfolio.symbol)
+            .filter(UserPortfolio.user_id.in_(chunk))
+            .all()
+        )
+        for r in rows:
+            positions[r[0]].append(r)
+
+    # closed positions are looked up per user, so index the snapshot once
+    before_by_user = defaultdict(list)
+    for (b_uid, sym), amount in before.items():
+        if sym in changed:
+            before_by_user[b_uid].append((sym, amount))
+
+    updates = []
+    for uid in users:
+        total_value = 0.0
+        total_cost = 0.0
+        changed_positions = []
+        held = set()
+        for _uid, sym, qty, cost, amount, profit, price in positions.get(uid, []):
+            total_value += amount or 0.0
+            total_cost += cost or 0.0
+            held.add(sym)
+            if sym in changed:
+                changed_positions.append({
+                    "symbol": sym,
+                    "quantity": qty,
+                    "price": price,
+                    "current_amount": amount,
+                    "profit": profit,
+                    "delta": (amount or 0.0) - before.get((uid, sym), 0.0),
+                })
+        # positions that were closed since the snapshot
+        for sym, amount in before_by_user.get(uid, ()):
+            if sym not in held:
+                changed_positions.append({
+                    "symbol": sym,
+                    "quantity": 0.0,
+                    "price": None,
+                    "current_amount": 0.0,
+                    "profit": 0.0,
+                    "delta": -amount,
+                })
+        if not changed_positions:
+            continue
+        updates.append({
+            "type": "portfolio_update",
+            "user_id": uid,
+            "total_value": total_value,
+            "total_cost": total_cost,
+            "profit": total_value - total_cost,
+            "positions": changed_positions,
+        })
+    return updates
+
+
+def publish_updates(db, changed: Iterable[str], before: Snapshot, user_ids: Iterable[int] | None = None) -> int:
+    """Build and publish portfolio updates; safe to call from worker threads.
+
+    Returns the number of messages published. Errors are logged, not raised,
+    so a failed push never breaks the price update or the trade itself.
+    """
+    try:
+        updates = build_updates(db, changed, before, user_ids=user_ids)
+        for msg in updates:
+            ws_manager.enqueue_message_from_thread(msg)
+        return len(updates)
+    except Exception:
+        _logger.exception("Failed to publish portfolio updates")
+        return 0
@@ -3,97 +3,85 @@ import logging
 import threading
 import time
 from datetime import datetime
-from sqlalchemy import func
-from typing import List
-from sqlalchemy import case
+from typing import Iterable, List
 
+from app.config import settings
 from app.database import SessionLocal
-from app.models import StockPrice, UserPortfolio, Transaction
+from app.models import StockPrice, UserPortfolio
 from app.services.stocks import get_stock_info
 from app.services import ws_manager
+from app.services import portfolio_stream
+from app.services import ledger
+from app.services import profiling
+from app.services import updater_stats
 
 
-def recompute_portfolios_for_symbol(db, sym: str) -> None:
+def recompute_portfolios_for_symbol(db, sym: str, user_ids: Iterable[int] | None = None) -> None:
     """Recompute UserPortfolio rows for a single symbol using BUY transactions.
 
     This function expects an open SQLAlchemy session (`db`) and will upsert
     UserPortfolio rows for every user who has BUY transactions for `sym`.
+    Aggregation starts from each user's latest ledger checkpoint (see
+    app.services.ledger), so only newer transactions are read.
+    Pass `user_ids` to limit the recompute to those users (e.g. after a trade),
+    leaving everyone else's rows for the symbol untouched.
+    Errors propagate; the caller rolls the session back.
     """
-    try:
-        # Compute buys and sells aggregates per user so we can derive net quantity and cost basis.
-        portfolio_rows = (
-            db.query(
-                Transaction.user_id,
-                func.coalesce(func.sum(case((Transaction.type.ilike('BUY'), Transaction.quantity), else_=0)), 0).label('qty_buy'),
-                func.coalesce(func.sum(case((Transaction.type.ilike('SELL'), Transaction.quantity), else_=0)), 0).label('qty_sell'),
-                func.coalesce(func.sum(case((Transaction.type.ilike('BUY'), Transaction.total_amount), else_=0)), 0).label('spent_buy'),
-                func.coalesce(func.sum(case((Transaction.type.ilike('SELL'), Transaction.total_amount), else_=0)), 0).label('received_sell')
-            )
-            .filter(Transaction.symbol == sym)
-            .group_by(Transaction.user_id)
-            .all()
-        )
-
-        processed_user_ids = set()
-
-        for pr in portfolio_rows:
-            user_id = pr[0]
-            qty_buy = pr[1] or 0
-            qty_sell = pr[2] or 0
-            spent_buy = pr[3] or 0
-            received_sell = pr[4] or 0
-
-            net_qty = qty_buy - qty_sell
-            net_total = spent_buy - received_sell
-
-            # If net_qty <= 0, remove any existing portfolio row for this user/symbol
-            existing = db.query(UserPortfolio).filter(
-                UserPortfolio.user_id == user_id,
-                UserPortfolio.symbol == sym
-            ).first()
-
-            if net_qty <= 0:
-                if existing:
-                    db.delete(existing)
-                # nothing more to do for this user
-                continue
-
-            # compute current price and derived fields
-            sp = db.query(StockPrice).filter(StockPrice.symbol == sym).first()
-            current_price = sp.current_price if sp else 0
-            current_amount = net_qty * current_price
-            avg_cost = (net_total / net_qty) if net_qty > 0 else 0.0
-            profit = current_amount - net_total
-
-            processed_user_ids.add(user_id)
-
-            if existing:
-                existing.quantity = net_qty
-                existing.total_amount = net_total
-                existing.avg_cost = avg_cost
-                existing.current_amount = current_amount
-                existing.profit = profit
-                db.add(existing)
-            else:
-                up = UserPortfolio(
-                    user_id=user_id,
-                    symbol=sym,
-                    quantity=net_qty,
-                    total_amount=net_total,
-                    avg_cost=avg_cost,
-                    current_amount=current_amount,
-                    profit=profit,
-                )
-                db.add(up)
-
-        # Remove any UserPortfolio rows for this symbol that weren't in the processed_user_ids
-        if processed_user_ids:
-            db.query(UserPortfolio).filter(UserPortfolio.symbol == sym, ~UserPortfolio.user_id.in_(list(processed_user_ids))).delete(synchronize_session=False)
+    scope = list(set(user_ids)) if user_ids is not None else None
+    if scope is not None and not scope:
+        return
+    # Net quantity and cost basis per user: latest ledger checkpoint plus newer transactions
+    positions = ledger.net_positions(db, sym, scope)
+    existing_q = db.query(UserPortfolio).filter(UserPortfolio.symbol == sym)
+    if scope is not None:
+        existing_q = existing_q.filter(UserPortfolio.user_id.in_(scope))
+
+    # current rows for the symbol, keyed by user
+    existing_rows = {up.user_id: up for up in existing_q.all()}
+
+    # compute current price once for the symbol
+    sp = db.query(StockPrice).filter(StockPrice.symbol == sym).first()
+    current_price = sp.current_price if sp else 0
+
+    processed_user_ids = set()
+
+    for user_id, (net_qty, net_total) in positions.items():
+        # If net_qty <= 0, the existing portfolio row (if any) is removed below
+        if net_qty <= 0:
+            continue
+
+        # derived fields
+        current_amount = net_qty * (current_price or 0)
+        avg_cost = (net_total / net_qty) if net_qty > 0 else 0.0
+        profit = current_amount - net_total
+
+        processed_user_ids.add(user_id)
+
+        existing = existing_rows.get(user_id)
+        if existing:
+            existing.quantity = net_qty
+            existing.total_amount = net_total
+            existing.avg_cost = avg_cost
+            existing.current_amount = current_amount
+            existing.profit = profit
+            db.add(existing)
         else:
-            # no users have positions for this symbol: remove all portfolio rows for the symbol
-            db.query(UserPortfolio).filter(UserPortfolio.symbol == sym).delete(synchronize_session=False)
-    except Exception:
-        _logger.exception("Error recomputing portfolios for %s", sym)
+            up = UserPortfolio(
+                user_id=user_id,
+                symbol=sym,
+                quantity=net_qty,
+                total_amount=net_total,
+                avg_cost=avg_cost,
+                current_amount=current_amount,
+                profit=profit,
+            )
+            db.add(up)
+
+    # Remove any UserPortfolio rows (within scope) for this symbol that weren't in processed_user_ids
+    for user_id, existing in existing_rows.items():
+        if user_id not in processed_user_ids:
+            db.delete(existing)
+
 
 _logger = logging.getLogger(__name__)
 
@@ -103,16 +91,68 @@ def _fetch_price(symbol: str) -> tuple[str, dict]:
 
     This function is safe to run in a thread.
     """
+    start = time.perf_counter()
     info = get_stock_info(symbol, use_cache=False)
+    updater_stats.record_fetch(symbol, time.perf_counter() - start,
+                               info.get('error_type') if isinstance(info, dict) else None)
     return symbol, info
 
 
+def apply_quotes(db, results) -> List[str]:
+    """Write fetched quotes [(symbol, info)] to their StockPrice rows; return symbols whose price changed.
+
+    Symbols the source reports as not found are deleted. Does not commit.
+    """
+    changed = []
+    for sym, info in results:
+        sp = db.query(StockPrice).filter(StockPrice.symbol == sym).first()
+        if not sp:
+            continue
+        # If the fetch returned an explicit error indicating symbol not found,
+        # remove the StockPrice row to avoid keeping invalid symbols in the registry.
+        err = info.get('error') if isinstance(info, dict) else None
+        if err and ('Quote not found' in err or 'Not Found' in err or '404' in err or 'Quote not found for symbol' in err):
+            try:
+                db.delete(sp)
+            except Exception:
+                _logger.exception("Failed to delete invalid StockPrice %s", sym)
+            continue
+
+        old_price = sp.current_price
+        sp.current_price = info.get("price", sp.current_price)
+        if sp.current_price != old_price:
+            changed.append(sym)
+        sp.name = info.get("name", sp.name)
+        sp.currency = info.get("currency", sp.currency)
+        db.add(sp)
+    return changed
+
+
+def _maybe_checkpoint(last_run: float) -> float:
+    """Write ledger checkpoints when CHECKPOINT_INTERVAL_SECONDS have passed; return the last run time."""
+    every = settings.CHECKPOINT_INTERVAL_SECONDS
+    if not every or time.monotonic() - last_run < every:
+        return last_run
+    db = SessionLocal()
+    try:
+        ledger.create_checkpoints(db)
+    except Exception:
+        db.rollback()
+        _logger.exception("Failed to write ledger checkpoints")
+    finally:
+        db.close()
+    return time.monotonic()
+
+
 def _update_loop(stop_event: threading.Event, interval: int = 300, max_workers: int = 5):
     """Background loop that updates tracked stock prices every `interval` seconds.
 
     Uses a small ThreadPoolExecutor to parallelize network calls while performing a single DB commit per cycle.
     """
+    last_checkpoint = 0.0 if settings.CHECKPOINT_INTERVAL_SECONDS else time.monotonic()
     while not stop_event.is_set():
+        # POST /admin/updater/profile arms a sampling profile of this cycle
+        profile = profiling.start_cycle_profile()
         try:
             db = SessionLocal()
             try:
@@ -136,9 +176,11 @@ def _update_loop(stop_event: threading.Event, interval: int = 300, max_workers:
 
                 if symbols_to_update:
                     _logger.debug("Updating prices for %d symbols", len(symbols_to_update))
+                    cycle = updater_stats.Cycle(len(rows), len(symbols_to_update), interval)
 
                     # Fetch in parallel with limited workers
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as exc:
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="price-fetch") as exc:
                         futures = [exc.submit(_fetch_price, sym) for sym in symbols_to_update]
                         results = []
                         for fut in concurrent.futures.as_completed(futures):
@@ -147,28 +189,17 @@ def _update_loop(stop_event: threading.Event, interval: int = 300, max_workers:
                                 results.append((sym, info))
                             except Exception:
                                 _logger.exception("Error fetching price in worker")
+                    cycle.fetched = len(results)
+                    cycle.phase("fetch")
 
                     # Batch update DB in single transaction
-                    for sym, info in results:
-                        sp = db.query(StockPrice).filter(StockPrice.symbol == sym).first()
-                        if not sp:
-                            continue
-                        # If the fetch returned an explicit error indicating symbol not found,
-                        # remove the StockPrice row to avoid keeping invalid symbols in the registry.
-                        err = info.get('error') if isinstance(info, dict) else None
-                        if err and ('Quote not found' in err or 'Not Found' in err or '404' in err or 'Quote not found for symbol' in err):
-                            try:
-                                db.delete(sp)
-                            except Exception:
-                                _logger.exception("Failed to delete invalid StockPrice %s", sym)
-                            continue
-
-                        sp.current_price = info.get("price", sp.current_price)
-                        sp.name = info.get("name", sp.name)
-                        sp.currency = info.get("currency", sp.currency)
-                        db.add(sp)
+                    changed = apply_quotes(db, results)
+                    cycle.changed = len(changed)
+                    db.commit()
+                    cycle.phase("db_write")
 
-                    # enqueue websocket messages for live updates
+                    # enqueue websocket messages for live updates only once the prices are
+                    # committed: receivers (and other workers) re-read them on the tick
                     try:
                         for sym, info in results:
                             msg = {
@@ -177,28 +208,39 @@ def _update_loop(stop_event: threading.Event, interval: int = 300, max_workers:
                                 'price': info.get('price'),
                                 'name': info.get('name'),
                                 'currency': info.get('currency'),
-                                'last_updated': info.get('last_updated')
+                                'last_updated': info.get('last_updated'),
+                                # epoch seconds when the tick left the updater (delivery latency)
+                                'sent_at': time.time(),
                             }
                             # non-async thread -> enqueue safely
                             ws_manager.enqueue_message_from_thread(msg)
                     except Exception:
                         _logger.exception("Failed to enqueue websocket messages")
+                    cycle.phase("broadcast")
 
-                    db.commit()
                     # After updating prices, recompute user portfolios for affected symbols
                     try:
+                        before = portfolio_stream.snapshot_positions(db, changed)
                         # Recompute portfolios for symbols we just updated
                         for sym, info in results:
                             recompute_portfolios_for_symbol(db, sym)
                         db.commit()
+                        # push revalued portfolios to users holding a symbol whose price moved
+                        portfolio_stream.publish_updates(db, changed, before)
                     except Exception:
+                        db.rollback()
                         _logger.exception("Failed to recompute portfolios")
+                    cycle.phase("recompute")
+                    cycle.finish()
                 else:
                     _logger.debug("No symbols need updating at this cycle")
             finally:
                 db.close()
         except Exception:
             _logger.exception("Top-level error in price updater loop; will retry after sleep")
+        profiling.finish_cycle_profile(profile)
+
+        last_checkpoint = _maybe_checkpoint(last_checkpoint)
 
         # Sleep but be responsive to stop_event
         slept = 0
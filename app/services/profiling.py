@@ -0,0 +1,271 @@
+"""On-demand sampling profiles of single requests and price updater cycles.
+
+A request carrying `X-Profile: 1` together with a valid `x-admin-token`
+(same check as the /admin routes) is profiled by a sampling thread that
+reads the stacks of the event loop and threadpool threads every
+PROFILE_SAMPLE_INTERVAL_MS. Other requests running at the same time show
+up in the profile as well. The response carries `X-Profile-Id`; the profile
+is written to PROFILE_DIR and fetched through /admin/profiles/{id}.
+
+Profiling the next updater cycle is requested with a flag file (POST
+/admin/updater/profile). A file works across processes, so it reaches
+whichever worker currently runs the updater. Samples cover the updater
+thread and its fetch pool.
+
+Each profile consists of `<id>.collapsed` ("frame;frame;frame count" lines,
+the input format of flamegraph.pl and speedscope) and `<id>.json` (sample
+counts, duration and the hottest functions).
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Optional
+
+from app.config import settings
+
+_logger = logging.getLogger(__name__)
+
+CYCLE_FLAG = "profile-next-cycle"
+# threadpool threads the request profiler samples besides the event loop thread
+_REQUEST_THREAD_PREFIXES = ("AnyIO worker thread",)
+_UPDATER_FETCH_PREFIX = "price-fetch"
+# leaf frames that mean "blocked waiting for work" rather than busy
+_IDLE_LEAVES = {
+    ("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+_TOP_N = 25
+
+_request_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    co = frame.f_code
+    return f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})"
+
+
+class Sampler:
+    """Background thread sampling the stacks of the threads `wanted` accepts."""
+
+    def __init__(self, wanted: Callable[[threading.Thread], bool], interval: Optional[float] = None):
+        self.wanted = wanted
+        self.interval = interval if interval is not None else settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self.started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> "Sampler":
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.is_set():
+            threads = {t.ident: t for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                thread = threads.get(ident)
+                if ident == own or thread is None or not self.wanted(thread):
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+            self._stop.wait(self.interval)
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in self.stacks.most_common())
+
+    def summary(self, **extra) -> dict:
+        own, total = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            own[stack[-1]] += n
+            for label in set(stack):
+                total[label] += n
+        return {
+            **extra,
+            "duration_s": round(self.duration, 4),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "idle_samples": self.idle,
+            "top_self": [{"frame": k, "samples": v} for k, v in own.most_common(_TOP_N)],
+            "top_total": [{"frame": k, "samples": v} for k, v in total.most_common(_TOP_N)],
+        }
+
+
+# -- storage -----------------------------------------------------------------
+
+_ID_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:60] or "root"
+
+
+def new_id(kind: str) -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(kind)}-{uuid.uuid4().hex[:6]}"
+
+
+def save(profile_id: str, sampler: Sampler, **extra) -> str:
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    base = os.path.join(settings.PROFILE_DIR, profile_id)
+    with open(base + ".collapsed", "w", encoding="utf-8") as f:
+        f.write(sampler.collapsed())
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(sampler.summary(id=profile_id, **extra), f, indent=2)
+    _logger.info("Wrote profile %s (%d samples)", profile_id, sampler.samples)
+    return base
+
+
+def list_profiles() -> list[dict]:
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    out = []
+    for fn in sorted(os.listdir(settings.PROFILE_DIR), reverse=True):
+        if fn.endswith(".json"):
+            path = os.path.join(settings.PROFILE_DIR, fn)
+            out.append({"id": fn[:-5], "size": os.path.getsize(path), "modified": os.path.getmtime(path)})
+    return out
+
+
+def profile_path(profile_id: str, fmt: str) -> Optional[str]:
+    """Path of a stored profile file, or None for unknown ids/formats."""
+    if fmt not in ("json", "collapsed") or not _ID_RE.match(profile_id):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, f"{profile_id}.{fmt}")
+    return path if os.path.isfile(path) else None
+
+
+# -- request profiling -------------------------------------------------------
+
+def _request_threads(loop_thread: int) -> Callable[[threading.Thread], bool]:
+    def wanted(thread: threading.Thread) -> bool:
+        return (
+            thread.ident == loop_thread
+            or thread.name.startswith(_REQUEST_THREAD_PREFIXES)
+            # aiosqlite runs each connection in its own thread
+            or type(thread).__module__.startswith("aiosqlite")
+        )
+    return wanted
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for k, v in scope.get("headers", ()):
+        if k == name:
+            return v.decode("latin-1")
+    return None
+
+
+def _admin_ok(token: Optional[str]) -> bool:
+    from fastapi import HTTPException
+
+    from app.routers.admin import _check_token
+
+    try:
+        return _check_token(token)
+    except HTTPException:
+        return False
+
+
+class ProfilingMiddleware:
+    """Profile requests sent with `X-Profile` and a valid admin token (HTTP only)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _header(scope, b"x-profile"):
+            await self.app(scope, receive, send)
+            return
+        if not _admin_ok(_header(scope, b"x-admin-token")) or not _request_lock.acquire(blocking=False):
+            # unauthorized, or another profile is running: serve normally
+            await self.app(scope, receive, send)
+            return
+        profile_id = new_id(f"{scope.get('method', '')} {scope.get('path', '')}")
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode("latin-1"))]
+            await send(message)
+
+        sampler = Sampler(_request_threads(threading.get_ident())).start()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            sampler.stop()
+            _request_lock.release()
+            try:
+                import anyio
+
+                await anyio.to_thread.run_sync(
+                    lambda: save(profile_id, sampler, kind="request", method=scope.get("method"),
+                                 path=scope.get("path"), query=scope.get("query_string", b"").decode("latin-1"))
+                )
+            except Exception:
+                _logger.exception("Failed to store request profile %s", profile_id)
+
+
+def install(app) -> None:
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(ProfilingMiddleware)
+
+
+# -- updater cycle profiling -------------------------------------------------
+
+def _flag_path() -> str:
+    return os.path.join(settings.PROFILE_DIR, CYCLE_FLAG)
+
+
+def request_cycle_profile() -> str:
+    """Arm the flag that makes the updater profile its next cycle."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = _flag_path()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+    return path
+
+
+def start_cycle_profile() -> Optional[Sampler]:
+    """Called by the updater at the start of a cycle; consumes the flag if set."""
+    try:
+        os.remove(_flag_path())
+    except FileNotFoundError:
+        return None
+    except OSError:
+        _logger.exception("Failed to clear the cycle profile flag")
+        return None
+    updater = threading.get_ident()
+    return Sampler(lambda t: t.ident == updater or t.name.startswith(_UPDATER_FETCH_PREFIX)).start()
+
+
+def finish_cycle_profile(sampler: Optional[Sampler]) -> None:
+    if sampler is None:
+        return
+    sampler.stop()
+    try:
+        save(new_id("updater-cycle"), sampler, kind="updater_cycle")
+    except Exception:
+        _logger.exception("Failed to store updater cycle profile")
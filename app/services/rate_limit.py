@@ -0,0 +1,283 @@
+"""Per-client rate limiting and global load shedding (HTTP middleware).
+
+Rate limiting: every client has a token bucket per route budget. The client
+is the user of a valid bearer token, otherwise the remote address; run
+uvicorn with --proxy-headers behind a proxy. Budgets come from RATE_LIMITS,
+"prefix=rate:burst" entries (tokens per second, bucket size), matched
+against the request path by longest prefix; "*" is the fallback. A request
+over budget gets 429 with Retry-After.
+
+Buckets live in one of these backends, selected by RATE_LIMIT_BACKEND (like
+WS_BUS_BACKEND):
+
+  memory     per worker (default); with N workers a client effectively gets N budgets
+  redis      shared by all workers through REDIS_URL
+  fakeredis  the Redis code path against an in-process fakeredis server (tests, dev)
+
+If the shared backend fails, requests are let through (fail open).
+
+Load shedding: when more than SHED_MAX_THREADPOOL_WAITING tasks wait for a
+threadpool token, or the event loop lags more than SHED_MAX_LOOP_LAG_MS,
+new requests get 503 with Retry-After until the pressure drops. Lag is
+measured by a small monitor task started with the app.
+
+/admin routes are neither limited nor shed, so operators can still look
+at an overloaded worker.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import settings
+from app.services import ws_pubsub
+from app.utils import tokens
+
+_logger = logging.getLogger(__name__)
+
+EXEMPT_PREFIXES = ("/admin",)
+# cap on in-memory buckets: past it, refilled buckets and then the least recently used go
+_MAX_LOCAL_BUCKETS = 50000
+# minimum seconds between full sweeps for refilled buckets
+_EVICT_SWEEP_SECONDS = 1.0
+_LAG_PROBE_SECONDS = 0.1
+
+
+def parse_limits(text: str) -> dict[str, tuple[float, float]]:
+    """Parse RATE_LIMITS into {prefix: (rate per second, burst)}."""
+    limits = {}
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        prefix, sep, spec = part.rpartition("=")
+        rate, _sep2, burst = spec.partition(":")
+        if not sep or not prefix:
+            raise ValueError(f"RATE_LIMITS entry {part!r} must look like prefix=rate:burst")
+        rate = float(rate)
+        limits[prefix.strip()] = (rate, float(burst) if burst else max(1.0, rate))
+    return limits
+
+
+class LocalBuckets:
+    """Token buckets in this process (event loop only, no locking needed)."""
+
+    def __init__(self):
+        # key -> (tokens left, last refill, time the bucket is full again and can be dropped),
+        # least recently used first
+        self._buckets: OrderedDict[str, tuple[float, float, float]] = OrderedDict()
+        self._swept_at = float("-inf")
+
+    async def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        """Take one token; return 0 when allowed, else seconds until one is available."""
+        tokens_left, last, _expires = self._buckets.get(key, (burst, now, now))
+        tokens_left = min(burst, tokens_left + (now - last) * rate)
+        if tokens_left >= 1:
+            tokens_left -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens_left) / rate if rate > 0 else 60.0
+        # same horizon as the Redis TTL: idle this long, the bucket is full again and carries no state
+        refill = (burst - tokens_left) / rate if rate > 0 else 3600
+        self._buckets[key] = (tokens_left, now, now + refill)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > _MAX_LOCAL_BUCKETS:
+            self._evict(now)
+        return wait
+
+    def _evict(self, now: float) -> None:
+        # a full sweep at most once a second; in between, and when nothing has
+        # expired, the least recently used buckets go so the cap holds
+        if now - self._swept_at >= _EVICT_SWEEP_SECONDS:
+            self._swept_at = now
+            for k in [k for k, (_t, _last, expires) in self._buckets.items() if now > expires]:
+                del self._buckets[k]
+        while len(self._buckets) > _MAX_LOCAL_BUCKETS:
+            self._buckets.popitem(last=False)
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+class RedisBuckets:
+    """Token buckets shared through Redis (one hash per client and budget).
+
+    Uses WATCH/MULTI instead of a Lua script so the fakeredis stand-in
+    (which has no Lua without lupa) runs the same code.
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self._client = client
+        self._prefix = prefix
+
+    async def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        from redis.exceptions import WatchError
+
+        rkey = self._prefix + key
+        ttl_ms = int(math.ceil((burst / rate if rate > 0 else 3600) * 1000)) + 1000
+        async with self._client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(rkey)
+                    stored, last = await pipe.hmget(rkey, "tokens", "ts")
+                    tokens_left = burst if stored is None else float(stored)
+                    last = now if last is None else float(last)
+                    tokens_left = min(burst, tokens_left + max(0.0, now - last) * rate)
+                    wait = 0.0
+                    if tokens_left >= 1:
+                        tokens_left -= 1
+                    else:
+                        wait = (1 - tokens_left) / rate if rate > 0 else 60.0
+                    pipe.multi()
+                    pipe.hset(rkey, mapping={"tokens": tokens_left, "ts": now})
+                    pipe.pexpire(rkey, ttl_ms)
+                    await pipe.execute()
+                    return wait
+                except WatchError:
+                    continue  # another worker updated the bucket; retry
+
+    async def close(self) -> None:
+        try:
+            await self._client.aclose()
+        except Exception:
+            _logger.debug("Error closing rate limit redis client", exc_info=True)
+
+
+def create_backend(backend: Optional[str] = None, url: Optional[str] = None):
+    """Bucket store configured in settings; falls back to LocalBuckets like ws_pubsub.create_bus."""
+    backend = (backend or settings.RATE_LIMIT_BACKEND or "memory").lower()
+    if backend == "redis":
+        url = url or settings.REDIS_URL
+        aioredis = ws_pubsub._import_aioredis()
+        if not url or aioredis is None:
+            _logger.warning("RATE_LIMIT_BACKEND=redis needs REDIS_URL and the redis package; using local buckets")
+            return LocalBuckets()
+        return RedisBuckets(aioredis.from_url(url))
+    if backend == "fakeredis":
+        fakeredis = ws_pubsub._import_fakeredis()
+        if fakeredis is None:
+            _logger.warning("fakeredis not installed; using local buckets")
+            return LocalBuckets()
+        return RedisBuckets(ws_pubsub._fake_redis_client(fakeredis))
+    if backend != "memory":
+        _logger.warning("Unknown RATE_LIMIT_BACKEND %r; using local buckets", backend)
+    return LocalBuckets()
+
+
+# -- event loop lag ----------------------------------------------------------
+
+_loop_lag = 0.0
+
+
+def loop_lag() -> float:
+    """Latest measured event loop lag in seconds."""
+    return _loop_lag
+
+
+async def _monitor_lag() -> None:
+    global _loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(_LAG_PROBE_SECONDS)
+        _loop_lag = max(0.0, loop.time() - start - _LAG_PROBE_SECONDS)
+
+
+def start_lag_monitor(loop: asyncio.AbstractEventLoop):
+    return loop.create_task(_monitor_lag())
+
+
+def _overloaded() -> Optional[str]:
+    from anyio.to_thread import current_default_thread_limiter
+
+    max_waiting = settings.SHED_MAX_THREADPOOL_WAITING
+    if max_waiting and current_default_thread_limiter().statistics().tasks_waiting > max_waiting:
+        return "threadpool saturated"
+    max_lag = settings.SHED_MAX_LOOP_LAG_MS
+    if max_lag and _loop_lag * 1000 > max_lag:
+        return "event loop lagging"
+    return None
+
+
+# -- middleware --------------------------------------------------------------
+
+def _client_id(scope) -> str:
+    for k, v in scope.get("headers", ()):
+        if k == b"authorization":
+            scheme, _sep, token = v.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return f"u:{tokens.verify(token.strip())['sub']}"
+                except tokens.TokenError:
+                    pass
+            break
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+def _budget(limits: dict, path: str) -> tuple[Optional[str], Optional[tuple[float, float]]]:
+    best = None
+    for prefix in limits:
+        if prefix != "*" and path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    if best is None:
+        best = "*" if "*" in limits else None
+    return best, (limits[best] if best is not None else None)
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, backend=None):
+        self.app = app
+        self.limits = parse_limits(settings.RATE_LIMITS)
+        self.backend = backend if backend is not None else create_backend()
+        self._backend_failed_at = 0.0
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        reason = _overloaded()
+        if reason is not None:
+            await _reject(send, 503, f"Server overloaded ({reason}), retry later", settings.SHED_RETRY_AFTER)
+            return
+
+        prefix, budget = _budget(self.limits, path)
+        if budget is not None:
+            rate, burst = budget
+            key = f"{_client_id(scope)}|{prefix}"
+            try:
+                wait = await self.backend.take(key, rate, burst, time.time())
+            except Exception:
+                wait = 0.0
+                now = time.monotonic()
+                if now - self._backend_failed_at > 60:
+                    self._backend_failed_at = now
+                    _logger.exception("Rate limit backend failed; letting requests through")
+            if wait > 0:
+                await _reject(send, 429, "Too many requests", wait)
+                return
+        await self.app(scope, receive, send)
+
+
+def install(app) -> None:
+    if settings.RATE_LIMIT_ENABLED:
+        app.add_middleware(RateLimitMiddleware)
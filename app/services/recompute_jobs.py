@@ -0,0 +1,321 @@
+"""Background portfolio recompute jobs (POST /admin/recompute without a symbol).
+
+A job splits the tracked symbols into chunks of RECOMPUTE_CHUNK_SIZE, stored
+in `recompute_job_chunks`. Every process runs a runner thread that polls
+for queued jobs and claims one with a conditional UPDATE (like the db lease
+in app.services.leader), so each job runs in exactly one process. The
+runner hands the chunks to RECOMPUTE_WORKERS worker processes; each chunk
+is recomputed on its own session, and the chunk is marked done and the job's
+counters advanced in the same transaction that writes its portfolios. The
+chunk is only marked done if it is still pending, so a chunk finished twice
+(the old and the new runner after a takeover) is counted once.
+
+While a job runs, its runner renews `heartbeat_at`. On shutdown the job is
+put back in the queue; if the process dies instead, the heartbeat goes
+stale and after RECOMPUTE_JOB_STALE_SECONDS any runner takes the job over.
+Either way only the chunks that are not done yet are recomputed.
+
+A chunk that raises is retried up to RECOMPUTE_CHUNK_ATTEMPTS times; a job
+with chunks that still failed ends as "failed" with the last error.
+
+With SQLite the worker processes still write one at a time (busy_timeout
+serializes them), but reading and folding the ledger runs in parallel.
+"""
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import or_
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import RecomputeJob, RecomputeJobChunk, StockPrice, Transaction
+from app.services import versions
+from app.services.leader import HOLDER_ID
+
+_logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+
+# set by enqueue so the runner in this process starts without waiting for its next poll
+_wake = threading.Event()
+
+
+def _workers() -> int:
+    return settings.RECOMPUTE_WORKERS or os.cpu_count() or 1
+
+
+def enqueue(db, symbols: Optional[Iterable[str]] = None, chunk_size: Optional[int] = None) -> tuple[RecomputeJob, bool]:
+    """Queue a recompute of `symbols` (default: all tracked symbols).
+
+    Returns (job, created). A full recompute that is already queued or
+    running is returned instead of queueing a second one.
+    """
+    if symbols is None:
+        active = (
+            db.query(RecomputeJob)
+            .filter(RecomputeJob.status.in_(ACTIVE))
+            .order_by(RecomputeJob.id)
+            .first()
+        )
+        if active is not None:
+            return active, False
+        symbols = [s for (s,) in db.query(StockPrice.symbol).order_by(StockPrice.symbol)]
+    symbols = list(dict.fromkeys(symbols))
+    size = max(1, chunk_size or settings.RECOMPUTE_CHUNK_SIZE)
+    chunks = [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+    job = RecomputeJob(status="queued", chunks_total=len(chunks), chunks_done=0, chunks_failed=0,
+                       symbols_total=len(symbols), symbols_done=0, created_at=datetime.utcnow())
+    db.add(job)
+    db.flush()
+    db.add_all([RecomputeJobChunk(job_id=job.id, symbols=",".join(c), status="pending", attempts=0)
+                for c in chunks])
+    db.commit()
+    _wake.set()
+    return job, True
+
+
+def job_status(job: RecomputeJob) -> dict:
+    now = datetime.utcnow()
+    end = job.finished_at or now
+    elapsed = (end - job.started_at).total_seconds() if job.started_at else None
+    eta = None
+    if job.status == "running" and elapsed and job.symbols_done:
+        eta = elapsed / job.symbols_done * (job.symbols_total - job.symbols_done)
+    return {
+        "id": job.id,
+        "status": job.status,
+        "holder": job.holder,
+        "chunks_total": job.chunks_total,
+        "chunks_done": job.chunks_done,
+        "chunks_failed": job.chunks_failed,
+        "symbols_total": job.symbols_total,
+        "symbols_done": job.symbols_done,
+        "percent": round(100.0 * job.symbols_done / job.symbols_total, 1) if job.symbols_total else 100.0,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "heartbeat_at": job.heartbeat_at,
+        "finished_at": job.finished_at,
+        "elapsed_s": elapsed,
+        "eta_s": eta,
+    }
+
+
+# -- worker side -------------------------------------------------------------
+
+def _run_chunk(chunk_id: int) -> tuple[int, list[int]]:
+    """Recompute one chunk on its own session; returns (chunk_id, affected user ids).
+
+    Runs in a worker process (or the runner thread when RECOMPUTE_WORKERS=1).
+    """
+    from app.services.price_updater import recompute_portfolios_for_symbol
+
+    db = SessionLocal()
+    try:
+        chunk = db.get(RecomputeJobChunk, chunk_id)
+        if chunk is None or chunk.status != "pending":
+            return chunk_id, []
+        symbols = chunk.symbols.split(",") if chunk.symbols else []
+        for sym in symbols:
+            recompute_portfolios_for_symbol(db, sym)
+        db.flush()
+        user_ids = [uid for (uid,) in db.query(Transaction.user_id).filter(Transaction.symbol.in_(symbols)).distinct()]
+        # conditional, like _claim: after a takeover two runners can finish the same chunk
+        finished = (
+            db.query(RecomputeJobChunk)
+            .filter(RecomputeJobChunk.id == chunk_id, RecomputeJobChunk.status == "pending")
+            .update({"status": "done", "error": None}, synchronize_session=False)
+        )
+        if not finished:
+            db.rollback()
+            return chunk_id, []
+        db.query(RecomputeJob).filter(RecomputeJob.id == chunk.job_id).update({
+            "chunks_done": RecomputeJob.chunks_done + 1,
+            "symbols_done": RecomputeJob.symbols_done + len(symbols),
+            "heartbeat_at": datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+        return chunk_id, user_ids
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# -- runner side -------------------------------------------------------------
+
+def _claim(db) -> Optional[int]:
+    """Take the oldest queued job, or a running one whose runner stopped heartbeating."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.RECOMPUTE_JOB_STALE_SECONDS)
+    claimable = or_(
+        RecomputeJob.status == "queued",
+        (RecomputeJob.status == "running") & or_(RecomputeJob.heartbeat_at.is_(None), RecomputeJob.heartbeat_at < stale),
+    )
+    for (job_id,) in db.query(RecomputeJob.id).filter(claimable).order_by(RecomputeJob.id).limit(5).all():
+        updated = (
+            db.query(RecomputeJob)
+            .filter(RecomputeJob.id == job_id, claimable)
+            .update({"status": "running", "holder": HOLDER_ID, "heartbeat_at": now}, synchronize_session=False)
+        )
+        db.commit()
+        if updated:
+            job = db.get(RecomputeJob, job_id)
+            if job.started_at is None:
+                job.started_at = now
+                db.commit()
+            return job_id
+    return None
+
+
+def _heartbeat(db, job_id: int) -> bool:
+    """Renew our claim; False when another runner has taken the job over."""
+    updated = (
+        db.query(RecomputeJob)
+        .filter(RecomputeJob.id == job_id, RecomputeJob.holder == HOLDER_ID, RecomputeJob.status == "running")
+        .update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(updated)
+
+
+def _chunk_failed(db, job_id: int, chunk_id: int, exc: BaseException) -> bool:
+    """Record a failed attempt; True when the chunk should be retried."""
+    chunk = db.get(RecomputeJobChunk, chunk_id)
+    chunk.attempts += 1
+    chunk.error = f"{type(exc).__name__}: {exc}"[:2000]
+    retry = chunk.attempts < settings.RECOMPUTE_CHUNK_ATTEMPTS
+    if not retry:
+        chunk.status = "failed"
+        job = db.get(RecomputeJob, job_id)
+        job.chunks_failed += 1
+        job.error = chunk.error
+    db.commit()
+    _logger.warning("Recompute job %s chunk %s failed (attempt %s): %s", job_id, chunk_id, chunk.attempts, chunk.error)
+    return retry
+
+
+def _finish(db, job_id: int) -> None:
+    job = db.get(RecomputeJob, job_id)
+    job.status = "failed" if job.chunks_failed else "done"
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    _logger.info("Recompute job %s %s: %s/%s symbols in %s chunks", job_id, job.status,
+                 job.symbols_done, job.symbols_total, job.chunks_total)
+
+
+def _requeue(db, job_id: int) -> None:
+    db.query(RecomputeJob).filter(RecomputeJob.id == job_id, RecomputeJob.holder == HOLDER_ID).update(
+        {"status": "queued", "holder": None}, synchronize_session=False)
+    db.commit()
+
+
+def run_job(job_id: int, stop_event: Optional[threading.Event] = None, workers: Optional[int] = None) -> None:
+    """Recompute the pending chunks of a job this process has claimed."""
+    stop_event = stop_event or threading.Event()
+    workers = workers or _workers()
+    db = SessionLocal()
+    executor = None
+    try:
+        pending = [cid for (cid,) in db.query(RecomputeJobChunk.id)
+                   .filter(RecomputeJobChunk.job_id == job_id, RecomputeJobChunk.status == "pending")
+                   .order_by(RecomputeJobChunk.id)]
+        db.commit()
+        if workers > 1 and len(pending) > 1:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(workers, len(pending)), mp_context=multiprocessing.get_context("spawn"))
+
+        def submit(cid):
+            if executor is not None:
+                return executor.submit(_run_chunk, cid)
+            f = concurrent.futures.Future()
+            try:
+                f.set_result(_run_chunk(cid))
+            except Exception as exc:
+                f.set_exception(exc)
+            return f
+
+        # inline runs go one chunk at a time so stop and heartbeat are checked in between
+        queue = list(pending)
+        running = {}
+        beat_every = max(1, settings.RECOMPUTE_JOB_STALE_SECONDS // 4)
+        last_beat = time.monotonic()
+        while queue or running:
+            while queue and len(running) < (workers if executor is not None else 1):
+                cid = queue.pop(0)
+                running[submit(cid)] = cid
+            done, _not_done = concurrent.futures.wait(
+                running, timeout=1, return_when=concurrent.futures.FIRST_COMPLETED)
+            for f in done:
+                cid = running.pop(f)
+                try:
+                    _cid, user_ids = f.result()
+                    versions.bump_users(user_ids)
+                except Exception as exc:
+                    db.rollback()
+                    if _chunk_failed(db, job_id, cid, exc):
+                        queue.append(cid)
+            if time.monotonic() - last_beat >= beat_every:
+                last_beat = time.monotonic()
+                if not _heartbeat(db, job_id):
+                    _logger.warning("Recompute job %s was taken over by another runner; stopping", job_id)
+                    return
+            if stop_event.is_set():
+                # finish nothing more; the job resumes from its pending chunks
+                for f in running:
+                    f.cancel()
+                _requeue(db, job_id)
+                _logger.info("Recompute job %s interrupted; requeued", job_id)
+                return
+        _finish(db, job_id)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        db.close()
+
+
+def _runner_loop(stop_event: threading.Event) -> None:
+    while not stop_event.is_set():
+        job_id = None
+        db = SessionLocal()
+        try:
+            job_id = _claim(db)
+        except Exception:
+            db.rollback()
+            _logger.exception("Failed to claim a recompute job")
+        finally:
+            db.close()
+        if job_id is not None:
+            _logger.info("Running recompute job %s", job_id)
+            try:
+                run_job(job_id, stop_event)
+            except Exception:
+                _logger.exception("Recompute job %s crashed; it resumes once its heartbeat is stale", job_id)
+            continue
+        _wake.wait(settings.RECOMPUTE_JOB_POLL_SECONDS)
+        _wake.clear()
+
+
+def start_job_runner() -> tuple[Optional[threading.Thread], Optional[threading.Event]]:
+    """Start this process's job runner thread (RECOMPUTE_JOB_POLL_SECONDS=0 disables it)."""
+    if settings.RECOMPUTE_JOB_POLL_SECONDS <= 0:
+        return None, None
+    stop_event = threading.Event()
+    thread = threading.Thread(target=_runner_loop, args=(stop_event,), name="recompute-jobs", daemon=True)
+    thread.start()
+    return thread, stop_event
+
+
+def stop_job_runner(stop_event: Optional[threading.Event]) -> None:
+    if stop_event is not None:
+        stop_event.set()
+        _wake.set()
@@ -1,12 +1,28 @@
 import logging
+import random
 import threading
 import time
+import zlib
 from typing import Optional
 
-import yfinance as yf
+from app.config import settings
+from app.services import updater_stats
 
 _logger = logging.getLogger(__name__)
 
+# yfinance pulls in pandas and numpy; import it on the first price lookup
+# instead of at module load so workers start fast.
+_yf = None
+
+
+def _yfinance():
+    global _yf
+    if _yf is None:
+        import yfinance
+
+        _yf = yfinance
+    return _yf
+
 # Simple in-memory TTL cache to avoid duplicate yfinance calls in short succession.
 _stock_info_cache: dict[str, tuple[float, dict]] = {}
 _stock_info_lock = threading.Lock()
@@ -21,9 +37,13 @@ def _get_from_cache(symbol: str) -> Optional[dict]:
         if entry:
             ts, data = entry
             if now - ts < _CACHE_TTL:
+                updater_stats.record_cache("hit")
                 return data
             # expired
             del _stock_info_cache[symbol.upper()]
+            updater_stats.record_cache("expired")
+            return None
+    updater_stats.record_cache("miss")
     return None
 
 
@@ -32,11 +52,27 @@ def _set_cache(symbol: str, data: dict) -> None:
         _stock_info_cache[symbol.upper()] = (time.time(), data)
 
 
+# PRICE_SOURCE=offline: last synthetic price per symbol
+_offline_prices: dict[str, float] = {}
+
+
+def _offline_quote(sym: str) -> dict:
+    """Synthetic quote (random walk around a per-symbol base price); no network."""
+    with _stock_info_lock:
+        price = _offline_prices.get(sym)
+        if price is None:
+            price = 10 + zlib.crc32(sym.encode("utf-8")) % 490
+        price = max(0.01, price * (1 + random.uniform(-0.01, 0.01)))
+        _offline_prices[sym] = price
+    return {"symbol": sym, "name": sym, "price": round(price, 2), "currency": "USD"}
+
+
 def get_stock_info(symbol: str, use_cache: bool = True) -> dict:
     """Return basic stock info for a ticker symbol using yfinance.
 
     Returns dict with keys: symbol, name, price, currency
     Set use_cache=False to force a fresh network call.
+    With PRICE_SOURCE=offline the quote is synthetic (load tests, development).
     """
     sym = symbol.upper()
     if use_cache:
@@ -44,8 +80,13 @@ def get_stock_info(symbol: str, use_cache: bool = True) -> dict:
         if cached is not None:
             return cached
 
+    if settings.PRICE_SOURCE == "offline":
+        result = _offline_quote(sym)
+        _set_cache(sym, result)
+        return result
+
     try:
-        ticker = yf.Ticker(sym)
+        ticker = _yfinance().Ticker(sym)
         # Try fast_info first
         price = None
         try:
@@ -82,7 +123,8 @@ def get_stock_info(symbol: str, use_cache: bool = True) -> dict:
     except Exception as e:
         _logger.exception("Error fetching %s", sym)
         # Return an error field so callers can act (for example remove invalid symbols)
-        return {"symbol": sym, "name": sym, "price": 0, "currency": "N/A", "error": str(e)}
+        return {"symbol": sym, "name": sym, "price": 0, "currency": "N/A", "error": str(e),
+                "error_type": type(e).__name__}
 
 
 def ensure_stock_in_db(db, symbol: str):
@@ -114,3 +156,86 @@ def ensure_stock_in_db(db, symbol: str):
     db.commit()
     db.refresh(sp)
     return sp
+
+
+def ensure_stocks_in_db_bulk(db, meta: dict) -> dict:
+    """Insert lightweight StockPrice rows for symbols that are not tracked yet.
+
+    `meta` maps symbol -> (name, currency) used for the new rows (price 0, no
+    network calls). Returns symbol -> (name, currency) for the rows that
+    already existed. Does not commit, so it can share the caller's transaction.
+    """
+    from sqlalchemy import insert
+    from app.models import StockPrice
+    from app.services import symbol_index, versions
+
+    existing = {}
+    syms = list(meta)
+    for i in range(0, len(syms), 500):
+        rows = db.query(StockPrice.symbol, StockPrice.name, StockPrice.currency).filter(
+            StockPrice.symbol.in_(syms[i:i + 500])
+        )
+        for sym, name, currency in rows:
+            existing[sym] = (name, currency)
+
+    missing = [
+        {"symbol": sym, "name": name, "currency": currency, "current_price": 0.0}
+        for sym, (name, currency) in meta.items()
+        if sym not in existing
+    ]
+    if missing:
+        db.execute(insert(StockPrice), missing)
+        # Core inserts bypass the ORM hooks that keep the search index current
+        symbol_index.note_upserted(db, missing)
+        versions.note_symbols(db, [r["symbol"] for r in missing])
+    return existing
+
+
+def upsert_stocks_bulk(db, rows: list[dict]) -> tuple[int, int]:
+    """Insert or update StockPrice rows in a few statements; return (inserted, updated).
+
+    Each row has `symbol` and any of `name`, `currency`, `current_price`;
+    keys that are missing or None leave the stored value alone (new rows get
+    price 0). Does not commit.
+    """
+    from sqlalchemy import insert, update
+    from app.models import StockPrice
+    from app.services import symbol_index, versions
+
+    by_symbol = {r["symbol"]: r for r in rows}
+    ids, stored = {}, {}
+    syms = list(by_symbol)
+    for i in range(0, len(syms), 500):
+        q = db.query(StockPrice.symbol, StockPrice.id, StockPrice.name, StockPrice.current_price).filter(
+            StockPrice.symbol.in_(syms[i:i + 500])
+        )
+        for sym, pk, name, price in q:
+            ids[sym] = pk
+            stored[sym] = {"symbol": sym, "name": name, "current_price": price}
+
+    fields = ("name", "currency", "current_price")
+    missing = [
+        {"symbol": sym, "name": r.get("name"), "currency": r.get("currency"),
+         "current_price": r.get("current_price") or 0.0}
+        for sym, r in by_symbol.items()
+        if sym not in ids
+    ]
+    # executemany needs the same keys in every row, so group updates by the fields they set
+    updates: dict[tuple, list[dict]] = {}
+    for sym, r in by_symbol.items():
+        if sym in ids:
+            values = {k: r[k] for k in fields if r.get(k) is not None}
+            if values:
+                updates.setdefault(tuple(sorted(values)), []).append({"id": ids[sym], **values})
+
+    if missing:
+        db.execute(insert(StockPrice), missing)
+    for group in updates.values():
+        db.execute(update(StockPrice), group)
+    # Core/bulk statements bypass the ORM hooks that keep the search index and ETags current
+    written = missing + [
+        {**stored[sym], **{k: v for k, v in by_symbol[sym].items() if v is not None}} for sym in ids
+    ]
+    symbol_index.note_upserted(db, written)
+    versions.note_symbols(db, [r["symbol"] for r in written])
+    return len(missing), len(ids)
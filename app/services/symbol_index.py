@@ -0,0 +1,294 @@
+"""In-process search index over tracked stocks and the local symbol registry.
+
+Backs `/symbols/search` and `/stock_prices/search` autocomplete. The index
+holds every StockPrice row plus `app/data/symbols.json` and answers a query
+from prebuilt structures instead of ILIKE '%q%' scans:
+
+  - symbols sorted in lowercase, so a symbol prefix is a bisect plus a short walk
+  - sorted (token, symbol) pairs of the name words for word-prefix matches
+  - an n-gram map (n <= 3) for substring matches on symbol or name
+
+Results are ranked exact symbol > symbol prefix > name word prefix >
+substring, then alphabetically.
+
+StockPrice changes committed through any SQLAlchemy session in this process
+are applied after the commit: price-only changes update the entry in place,
+while inserts, deletes and renames rebuild the index. Bulk Core inserts are
+not seen by the ORM, so callers report them with `note_upserted`. Price
+ticks from other workers arrive with their websocket broadcasts
+(`update_price`). The whole index is reloaded from the database every
+SYMBOL_INDEX_TTL_SECONDS to pick up anything else.
+"""
+import asyncio
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import new_async_session
+from app.models import StockPrice
+
+_logger = logging.getLogger(__name__)
+
+REGISTRY_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'symbols.json')
+
+_MAX_GRAM = 3
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# session.info key for StockPrice changes waiting for commit
+_PENDING_KEY = "symbol_index_changes"
+_DELETED = object()
+
+
+class _Entry:
+    __slots__ = ("symbol", "name", "price", "in_db")
+
+    def __init__(self, symbol: str, name: Optional[str], price: Optional[float], in_db: bool):
+        self.symbol = symbol
+        self.name = name
+        self.price = price
+        self.in_db = in_db
+
+    def as_dict(self) -> dict:
+        return {"symbol": self.symbol, "name": self.name or self.symbol, "price": self.price}
+
+
+def _grams(text: str):
+    for n in range(1, _MAX_GRAM + 1):
+        for i in range(len(text) - n + 1):
+            yield text[i:i + n]
+
+
+class _Snapshot:
+    """Immutable lookup structures over a set of entries."""
+
+    def __init__(self, entries: Iterable[_Entry]):
+        self.entries = {e.symbol: e for e in entries}
+        self.by_lower = {}
+        self.symbols = []
+        tokens = set()
+        self.grams = defaultdict(set)
+        for e in self.entries.values():
+            sym_l = e.symbol.lower()
+            name_l = (e.name or "").lower()
+            self.by_lower[sym_l] = e.symbol
+            self.symbols.append((sym_l, e.symbol))
+            for tok in _TOKEN_RE.findall(name_l):
+                tokens.add((tok, e.symbol))
+            for text in (sym_l, name_l):
+                for g in _grams(text):
+                    self.grams[g].add(e.symbol)
+        self.symbols.sort()
+        self.tokens = sorted(tokens)
+
+    @staticmethod
+    def _walk_prefix(pairs, q: str):
+        i = bisect.bisect_left(pairs, (q,))
+        while i < len(pairs) and pairs[i][0].startswith(q):
+            yield pairs[i][1]
+            i += 1
+
+    def _substring(self, q: str) -> set:
+        if len(q) <= _MAX_GRAM:
+            return self.grams.get(q, set())
+        parts = sorted((self.grams.get(q[i:i + _MAX_GRAM], set()) for i in range(len(q) - _MAX_GRAM + 1)), key=len)
+        candidates = set(parts[0]).intersection(*parts[1:])
+        return {
+            s for s in candidates
+            if q in s.lower() or q in (self.entries[s].name or "").lower()
+        }
+
+    def search(self, q: str, limit: int) -> list[str]:
+        found = []
+        seen = set()
+
+        def take(symbols):
+            for sym in symbols:
+                if len(found) >= limit:
+                    return
+                if sym not in seen:
+                    seen.add(sym)
+                    found.append(sym)
+
+        exact = self.by_lower.get(q)
+        if exact is not None:
+            take([exact])
+        take(self._walk_prefix(self.symbols, q))
+        token_hits = set()
+        for sym in self._walk_prefix(self.tokens, q):
+            if sym not in seen:
+                token_hits.add(sym)
+        take(sorted(token_hits))
+        if len(found) < limit:
+            rest = (s for s in self._substring(q) if s not in seen)
+            take(heapq.nsmallest(limit - len(found), rest))
+        return found
+
+
+class SymbolIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._registry: Optional[list[dict]] = None
+        self._db_entries: dict[str, _Entry] = {}
+        self._all = _Snapshot([])
+        self._db = _Snapshot([])
+        self._loaded_at: Optional[float] = None
+
+    # -- loading -------------------------------------------------------------
+
+    def load_registry(self, path: str = REGISTRY_PATH) -> None:
+        """Read the local symbol registry (missing or invalid file -> empty)."""
+        registry = []
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    registry = [r for r in json.load(f) if r.get('symbol')]
+            except Exception:
+                _logger.exception("Failed to load symbol registry %s", path)
+        with self._lock:
+            self._registry = registry
+            self._rebuild()
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        """Replace the DB part of the index with (symbol, name, price) rows."""
+        entries = {sym: _Entry(sym, name, price, True) for sym, name, price in rows}
+        with self._lock:
+            self._db_entries = entries
+            self._rebuild()
+            self._loaded_at = time.monotonic()
+
+    @property
+    def registry_loaded(self) -> bool:
+        return self._registry is not None
+
+    def needs_reload(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        ttl = settings.SYMBOL_INDEX_TTL_SECONDS
+        return bool(ttl) and time.monotonic() - self._loaded_at >= ttl
+
+    def _rebuild(self) -> None:
+        # caller holds the lock
+        merged = {
+            r['symbol']: _Entry(r['symbol'], r.get('name'), None, False)
+            for r in self._registry or []
+        }
+        merged.update(self._db_entries)  # DB rows win over registry entries
+        self._all = _Snapshot(merged.values())
+        self._db = _Snapshot(self._db_entries.values())
+
+    # -- changes -------------------------------------------------------------
+
+    def apply(self, changes: dict) -> None:
+        """Apply {symbol: (name, price) | _DELETED} committed StockPrice changes."""
+        rebuild = False
+        with self._lock:
+            for sym, change in changes.items():
+                entry = self._db_entries.get(sym)
+                if change is _DELETED:
+                    if self._db_entries.pop(sym, None) is not None:
+                        rebuild = True
+                    continue
+                name, price = change
+                if entry is None or entry.name != name:
+                    self._db_entries[sym] = _Entry(sym, name, price, True)
+                    rebuild = True
+                else:
+                    entry.price = price
+            if rebuild:
+                self._rebuild()
+
+    def update_price(self, symbol: str, price) -> None:
+        """Update a tracked symbol's price in place (no rebuild)."""
+        entry = self._db_entries.get(symbol)
+        if entry is not None and price is not None:
+            entry.price = price
+
+    # -- queries -------------------------------------------------------------
+
+    def search(self, q: str, limit: int = 20, db_only: bool = False) -> list[dict]:
+        """Ranked matches for `q`; `db_only` restricts to tracked StockPrice rows."""
+        q = q.strip().lower()
+        if not q:
+            return []
+        snap = self._db if db_only else self._all
+        return [snap.entries[sym].as_dict() for sym in snap.search(q, limit)]
+
+
+index = SymbolIndex()
+
+
+async def ensure_loaded(db) -> None:
+    """(Re)load the DB part of the index through an AsyncSession when stale."""
+    if not index.needs_reload():
+        return
+    rows = (await db.execute(select(StockPrice.symbol, StockPrice.name, StockPrice.current_price))).all()
+    if not index.registry_loaded:
+        index.load_registry()
+    index.load(rows)
+
+
+async def warm() -> None:
+    """Load the registry (in a thread) and the DB rows; run as a startup task."""
+    try:
+        if not index.registry_loaded:
+            await asyncio.get_running_loop().run_in_executor(None, index.load_registry)
+        async with new_async_session() as db:
+            await ensure_loaded(db)
+    except Exception:
+        _logger.exception("Failed to warm symbol index; it will load on first search")
+
+
+def search(q: str, limit: int = 20, db_only: bool = False) -> list[dict]:
+    return index.search(q, limit, db_only=db_only)
+
+
+def update_price(symbol: str, price) -> None:
+    index.update_price(symbol, price)
+
+
+def note_upserted(db, rows: Iterable[dict]) -> None:
+    """Stage StockPrice rows written with Core statements; applied on commit."""
+    pending = db.info.setdefault(_PENDING_KEY, {})
+    for r in rows:
+        pending[r["symbol"]] = (r.get("name"), r.get("current_price"))
+
+
+# -- session hooks -----------------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    pending = None
+    for obj in session.new | session.dirty:
+        if isinstance(obj, StockPrice):
+            pending = pending if pending is not None else session.info.setdefault(_PENDING_KEY, {})
+            pending[obj.symbol] = (obj.name, obj.current_price)
+    for obj in session.deleted:
+        if isinstance(obj, StockPrice):
+            pending = pending if pending is not None else session.info.setdefault(_PENDING_KEY, {})
+            pending[obj.symbol] = _DELETED
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        try:
+            index.apply(pending)
+        except Exception:
+            _logger.exception("Failed to update symbol index")
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_changes(session):
+    session.info.pop(_PENDING_KEY, None)
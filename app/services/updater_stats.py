@@ -0,0 +1,142 @@
+"""Instrumentation of the price updater's fetch path (GET /admin/updater/stats).
+
+Kept in memory by the process that runs the updater (the elected leader);
+other workers only report cache statistics of their own lookups.
+
+  - per-symbol fetch latency (last / mean / max) and error counts
+  - errors grouped by exception type
+  - per-cycle durations split into fetch, db_write, broadcast and recompute,
+    plus the number of symbols due vs. tracked (the backlog)
+  - hit/miss/expiry counts of the `_stock_info_cache` in app.services.stocks
+"""
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+
+# Cycles kept for the rolling summary
+MAX_CYCLES = 50
+# Symbols listed in the slowest / failing tables
+TOP_N = 10
+
+_lock = threading.Lock()
+_symbols: dict[str, dict] = {}
+_errors: Counter = Counter()
+_cache: Counter = Counter()
+_cycles: deque = deque(maxlen=MAX_CYCLES)
+_started_at = time.time()
+
+
+def record_fetch(symbol: str, seconds: float, error_type: Optional[str] = None) -> None:
+    with _lock:
+        s = _symbols.get(symbol)
+        if s is None:
+            s = _symbols[symbol] = {"fetches": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0, "last_s": 0.0,
+                                    "last_error": None}
+        s["fetches"] += 1
+        s["total_s"] += seconds
+        s["last_s"] = seconds
+        s["max_s"] = max(s["max_s"], seconds)
+        if error_type:
+            s["errors"] += 1
+            s["last_error"] = error_type
+            _errors[error_type] += 1
+
+
+def record_cache(outcome: str) -> None:
+    """outcome: "hit", "miss" or "expired"."""
+    with _lock:
+        _cache[outcome] += 1
+
+
+class Cycle:
+    """Times the phases of one updater cycle; `finish` stores it."""
+
+    def __init__(self, tracked: int, due: int, interval: int):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._mark = self._t0
+        self.phases: dict[str, float] = {}
+        self.tracked = tracked
+        self.due = due
+        self.interval = interval
+        self.fetched = 0
+        self.changed = 0
+
+    def phase(self, name: str) -> None:
+        """Close the phase `name` (time since the previous mark)."""
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def finish(self) -> None:
+        record = {
+            "started_at": self.started,
+            "duration_s": time.perf_counter() - self._t0,
+            "phases_s": self.phases,
+            "tracked": self.tracked,
+            "due": self.due,
+            "fetched": self.fetched,
+            "changed": self.changed,
+            "interval_s": self.interval,
+        }
+        with _lock:
+            _cycles.append(record)
+
+
+def snapshot() -> dict:
+    with _lock:
+        cycles = list(_cycles)
+        symbols = {k: dict(v) for k, v in _symbols.items()}
+        errors = dict(_errors)
+        cache = dict(_cache)
+
+    lookups = cache.get("hit", 0) + cache.get("miss", 0) + cache.get("expired", 0)
+    summary = None
+    if cycles:
+        durations = sorted(c["duration_s"] for c in cycles)
+        phases = {}
+        for c in cycles:
+            for name, secs in c["phases_s"].items():
+                phases[name] = phases.get(name, 0.0) + secs
+        last = cycles[-1]
+        summary = {
+            "count": len(cycles),
+            "mean_s": sum(durations) / len(durations),
+            "max_s": durations[-1],
+            "p95_s": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "mean_phases_s": {k: v / len(cycles) for k, v in phases.items()},
+            # a cycle longer than the interval means symbols fall further behind
+            "keeps_up": last["duration_s"] < last["interval_s"],
+            "backlog": last["due"],
+        }
+
+    for s in symbols.values():
+        s["mean_s"] = s["total_s"] / s["fetches"] if s["fetches"] else 0.0
+        del s["total_s"]
+    slowest = sorted(symbols.items(), key=lambda kv: kv[1]["mean_s"], reverse=True)[:TOP_N]
+    failing = sorted(((k, v) for k, v in symbols.items() if v["errors"]),
+                     key=lambda kv: kv[1]["errors"], reverse=True)[:TOP_N]
+    return {
+        "since": _started_at,
+        "cycles": summary,
+        "last_cycle": cycles[-1] if cycles else None,
+        "fetch": {
+            "symbols": len(symbols),
+            "fetches": sum(s["fetches"] for s in symbols.values()),
+            "errors_by_type": errors,
+            "slowest": [{"symbol": k, **v} for k, v in slowest],
+            "failing": [{"symbol": k, **v} for k, v in failing],
+        },
+        "cache": {**cache, "hit_ratio": (cache.get("hit", 0) / lookups) if lookups else None},
+    }
+
+
+def reset() -> None:
+    global _started_at
+    with _lock:
+        _symbols.clear()
+        _errors.clear()
+        _cache.clear()
+        _cycles.clear()
+        _started_at = time.time()
@@ -0,0 +1,136 @@
+"""Change counters behind the ETags of the price and portfolio reads.
+
+Every process keeps a monotonically increasing version per symbol (bumped
+when its StockPrice row changes) and per user (bumped when one of their
+UserPortfolio rows changes, i.e. after trades and revaluations). ETags are
+built from those versions, so `If-None-Match` can be answered with 304
+before the database is touched.
+
+Local changes are picked up from committed ORM flushes (after_flush and
+after_commit, like symbol_index). Changes made by other workers arrive as
+their websocket broadcasts (`observe_message`): a price_update whose price
+differs from the last one seen bumps the symbol, and a portfolio_update
+bumps the user.
+
+Each ETag includes this process's boot id, and also a time bucket of
+ETAG_MAX_AGE_SECONDS. Writes that bypass both paths, such as maintenance
+scripts run against the database, therefore show up within that window.
+"""
+import hashlib
+import itertools
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import StockPrice, UserPortfolio
+
+BOOT_ID = uuid.uuid4().hex[:8]
+
+_clock = itertools.count(1)
+_lock = threading.Lock()
+_symbols: dict[str, int] = {}
+_users: dict[int, int] = {}
+_last_prices: dict[str, float] = {}
+# bumped with any symbol (covers the unfiltered price list)
+_prices_version = 0
+
+_PENDING_KEY = "versions_pending"
+
+
+def bump_symbols(symbols: Iterable[str]) -> None:
+    global _prices_version
+    with _lock:
+        for sym in symbols:
+            v = next(_clock)
+            _symbols[sym] = v
+            _prices_version = v
+
+
+def bump_users(user_ids: Iterable[int]) -> None:
+    with _lock:
+        for uid in user_ids:
+            _users[uid] = next(_clock)
+
+
+def observe_message(msg: dict) -> None:
+    """Bump versions for a websocket bus message (changes made by any worker)."""
+    t = msg.get("type")
+    if t == "price_update" and msg.get("symbol"):
+        sym, price = msg["symbol"], msg.get("price")
+        if _last_prices.get(sym) != price:
+            _last_prices[sym] = price
+            bump_symbols([sym])
+    elif t == "portfolio_update" and msg.get("user_id") is not None:
+        bump_users([msg["user_id"]])
+
+
+def _bucket() -> int:
+    max_age = settings.ETAG_MAX_AGE_SECONDS
+    return int(time.time() // max_age) if max_age else 0
+
+
+def prices_etag(symbols: Optional[Iterable[str]] = None) -> str:
+    if symbols is None:
+        key = f"all:{_prices_version}"
+    else:
+        key = ",".join(f"{s}:{_symbols.get(s, 0)}" for s in sorted(set(symbols)))
+    digest = hashlib.blake2s(key.encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{BOOT_ID}-{_bucket()}-p{digest}"'
+
+
+def portfolio_etag(user_id: int) -> str:
+    return f'W/"{BOOT_ID}-{_bucket()}-u{user_id}.{_users.get(user_id, 0)}"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when the client's If-None-Match header already names `etag`."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [t.strip() for t in if_none_match.split(",")]
+
+
+def note_symbols(db, symbols: Iterable[str]) -> None:
+    """Stage symbol bumps for writes the ORM doesn't track (Core statements)."""
+    db.info.setdefault(_PENDING_KEY, (set(), set()))[0].update(symbols)
+
+
+# -- session hooks -----------------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    symbols, users = set(), set()
+    # Session.dirty builds a new set on every access; read it once
+    dirty = session.dirty
+    for obj in itertools.chain(session.new, dirty, session.deleted):
+        if not isinstance(obj, (StockPrice, UserPortfolio)):
+            continue
+        if obj in dirty and not session.is_modified(obj):
+            continue  # e.g. the price updater re-setting an unchanged price
+        if isinstance(obj, StockPrice):
+            symbols.add(obj.symbol)
+        else:
+            users.add(obj.user_id)
+    if symbols or users:
+        pending = session.info.setdefault(_PENDING_KEY, (set(), set()))
+        pending[0].update(symbols)
+        pending[1].update(users)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        bump_symbols(pending[0])
+        bump_users(pending[1])
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -5,22 +5,75 @@ from typing import Dict, Set
 
 from starlette.websockets import WebSocket
 
+from app.config import settings
+from app.services import symbol_index, versions, ws_pubsub
+from app.utils import tokens
+
 _logger = logging.getLogger(__name__)
 
 # Global state initialized on app startup
 _loop: asyncio.AbstractEventLoop | None = None
+# Messages received from the bus, waiting to be sent to local clients
 _queue: asyncio.Queue | None = None
+# Messages produced in this process, waiting to be published on the bus
+_outbox: asyncio.Queue | None = None
+_bus = None
 # Map websocket -> set of subscribed symbols (empty set means subscribe to all)
 _clients: Dict[WebSocket, Set[str]] = {}
+# Per-user portfolio channel: websocket -> user_id and user_id -> websockets
+_portfolio_subs: Dict[WebSocket, int] = {}
+_user_clients: Dict[int, Set[WebSocket]] = {}
+
 
+async def init(loop: asyncio.AbstractEventLoop, bus=None):
+    """Start the bus subscription plus the publisher and broadcaster tasks.
 
-async def init(loop: asyncio.AbstractEventLoop):
-    global _loop, _queue
+    `bus` defaults to the backend configured in settings (see ws_pubsub).
+    """
+    global _loop, _queue, _outbox, _bus
     _loop = loop
     _queue = asyncio.Queue()
-    # start broadcaster task
+    _outbox = asyncio.Queue()
+    _bus = bus if bus is not None else ws_pubsub.create_bus()
+    await _bus.start(_deliver)
+    # start publisher and broadcaster tasks
+    loop.create_task(_publisher())
     loop.create_task(_broadcaster())
-    _logger.info("ws_manager initialized")
+    _logger.info("ws_manager initialized with %s", type(_bus).__name__)
+
+
+async def close():
+    """Stop the bus subscription (called on app shutdown)."""
+    global _bus
+    if _bus is not None:
+        await _bus.stop()
+        _bus = None
+
+
+async def _deliver(msg: dict):
+    """Bus handler: queue a message for the local clients of this worker."""
+    if msg.get("type") == "token_revoked":
+        # internal message, not for websocket clients
+        tokens.revoke_local(msg["jti"], msg["exp"])
+        return
+    if msg.get("type") == "price_update" and msg.get("symbol"):
+        # keep this worker's search index prices in step with the leader's updater
+        symbol_index.update_price(msg["symbol"], msg.get("price"))
+    # changes made by any worker invalidate this worker's ETags
+    versions.observe_message(msg)
+    if _queue is not None:
+        _queue.put_nowait(msg)
+
+
+async def _publisher():
+    # Publish outgoing messages one at a time so they keep their order on the bus
+    while True:
+        msg = await _outbox.get()
+        try:
+            if _bus is not None:
+                await _bus.publish(msg)
+        except Exception:
+            _logger.exception("Failed to publish websocket message on bus")
 
 
 async def _broadcaster():
@@ -31,32 +84,69 @@ async def _broadcaster():
     while True:
         try:
             msg = await _queue.get()
-            # msg is expected to be a dict with at least 'symbol'
-            symbol = msg.get('symbol')
             text = json.dumps(msg, default=str)
-            # send to all clients whose subscription includes symbol
+            if msg.get('type') == 'portfolio_update':
+                # per-user channel: only clients subscribed to this user's portfolio
+                targets = list(_user_clients.get(msg.get('user_id'), ()))
+            else:
+                # msg is expected to be a dict with at least 'symbol'
+                symbol = msg.get('symbol')
+                # send to all clients whose subscription includes symbol;
+                # an empty set means all symbols, unless the client only follows a portfolio
+                targets = [
+                    ws for ws, subs in list(_clients.items())
+                    if (not subs and ws not in _portfolio_subs) or (symbol and symbol in subs)
+                ]
             to_remove = []
-            for ws, subs in list(_clients.items()):
+            for ws in targets:
                 try:
-                    # if subs empty -> subscribed to all
-                    if not subs or (symbol and symbol in subs):
-                        await ws.send_text(text)
+                    await ws.send_text(text)
                 except Exception:
                     _logger.exception("Removing websocket due to send failure")
                     to_remove.append(ws)
             for ws in to_remove:
-                _clients.pop(ws, None)
+                _remove_client(ws)
         except Exception:
             _logger.exception("Error in ws broadcaster loop")
 
 
+def _unsubscribe_portfolio(ws: WebSocket):
+    user_id = _portfolio_subs.pop(ws, None)
+    if user_id is None:
+        return
+    conns = _user_clients.get(user_id)
+    if conns is not None:
+        conns.discard(ws)
+        if not conns:
+            _user_clients.pop(user_id, None)
+
+
+def _remove_client(ws: WebSocket):
+    _clients.pop(ws, None)
+    _unsubscribe_portfolio(ws)
+
+
+def _portfolio_allowed(token, user_id: int) -> bool:
+    if not token:
+        return not settings.AUTH_ENFORCE
+    try:
+        return tokens.verify(token)["sub"] == user_id
+    except tokens.TokenError:
+        return False
+
+
 async def handle_connection(ws: WebSocket):
     """Accept a websocket and handle simple subscription messages.
 
     Protocol (JSON):
       {"type": "subscribe", "symbols": ["AAPL","TSLA"]}
       {"type": "unsubscribe", "symbols": ["AAPL"]}
+      {"type": "subscribe_portfolio", "user_id": 1, "token": "<access token>"}
+      {"type": "unsubscribe_portfolio"}
       If no subscribe message is received, client will receive only broadcasts sent to all (if any).
+      A portfolio subscription delivers `portfolio_update` messages for that user
+      (see portfolio_stream) instead of raw price ticks. The token must belong
+      to that user; it may be left out while AUTH_ENFORCE is off.
     """
     await ws.accept()
     _clients[ws] = set()
@@ -77,19 +167,47 @@ async def handle_connection(ws: WebSocket):
                 if isinstance(syms, list):
                     for s in syms:
                         _clients[ws].discard(s.upper())
+            elif t == 'subscribe_portfolio':
+                user_id = j.get('user_id')
+                if isinstance(user_id, int) and _portfolio_allowed(j.get('token'), user_id):
+                    _unsubscribe_portfolio(ws)
+                    _portfolio_subs[ws] = user_id
+                    _user_clients.setdefault(user_id, set()).add(ws)
+            elif t == 'unsubscribe_portfolio':
+                _unsubscribe_portfolio(ws)
             # ignore other messages
     except Exception:
         # websocket disconnect or error
-        _clients.pop(ws, None)
+        _remove_client(ws)
+
+
+def stats() -> list[tuple[str, str, int]]:
+    """(name, help, value) gauges for the metrics endpoint."""
+    return [
+        ("ws_clients", "Websocket clients connected to this worker.", len(_clients)),
+        ("ws_portfolio_subscribers", "Websocket clients following a portfolio.", len(_portfolio_subs)),
+        ("ws_broadcast_queue_depth", "Bus messages waiting to be sent to local clients.",
+         _queue.qsize() if _queue is not None else 0),
+        ("ws_publish_queue_depth", "Messages waiting to be published on the bus.",
+         _outbox.qsize() if _outbox is not None else 0),
+    ]
+
+
+async def publish(msg: dict):
+    """Queue a message for broadcast to the clients of every worker."""
+    if _outbox is None:
+        _logger.debug("ws_manager not initialized; dropping message: %s", msg)
+        return
+    _outbox.put_nowait(msg)
 
 
 def enqueue_message_from_thread(msg: dict):
     """Called from non-async threads (like the price updater) to queue a message for broadcast."""
-    global _loop, _queue
-    if _loop is None or _queue is None:
+    global _loop, _outbox
+    if _loop is None or _outbox is None:
         _logger.debug("ws_manager not initialized; dropping message: %s", msg)
         return
     try:
-        _loop.call_soon_threadsafe(_queue.put_nowait, msg)
+        _loop.call_soon_threadsafe(_outbox.put_nowait, msg)
     except Exception:
         _logger.exception("Failed to enqueue websocket message from thread")
@@ -1,52 +1,164 @@
-"""Optional Redis-backed pub/sub bridge for websocket broadcasting.
+"""Pub/sub bus that fans websocket broadcasts out to every worker process.
 
-This module provides a small wrapper that can be enabled by setting REDIS_URL.
-It's intentionally minimal: it subscribes to a channel and forwards messages into the
-existing ws_manager queue. The in-process ws_manager remains the default when
-REDIS_URL is not set.
+Every message published on the bus is delivered to all subscribers, including
+the publishing process, so each uvicorn worker pushes it to its own websocket
+clients. The backend is selected with the WS_BUS_BACKEND setting:
+
+  memory     in-process only (default); enough for a single worker
+  redis      Redis pub/sub through the redis-py asyncio client (REDIS_URL)
+  fakeredis  the Redis code path against an in-process fakeredis server;
+             a local stand-in for tests and development without Redis
 """
-import os
 import asyncio
 import json
 import logging
+from typing import Awaitable, Callable, Optional
 
-_logger = logging.getLogger(__name__)
+from app.config import settings
 
-try:
-    import aioredis
-except Exception:
-    aioredis = None
+_logger = logging.getLogger(__name__)
 
 
-async def start_redis_bridge(loop, ws_enqueue_fn):
-    url = os.environ.get('REDIS_URL')
-    if not url:
-        _logger.info('REDIS_URL not configured; Redis pubsub bridge disabled')
-        return None
-    if aioredis is None:
-        _logger.warning('aioredis not installed; cannot start redis bridge')
+def _import_aioredis():
+    # imported only when a Redis bus is configured (keeps worker start-up light)
+    try:
+        import redis.asyncio as aioredis
+    except Exception:
         return None
+    return aioredis
+
 
-    _logger.info('Starting Redis pubsub bridge to %s', url)
+def _import_fakeredis():
+    # fakeredis pulls in numpy; only load it for WS_BUS_BACKEND=fakeredis
     try:
-        r = await aioredis.create_redis_pool(url)
-        ch, = await r.subscribe('prices')
-
-        async def reader(channel):
-            while await channel.wait_message():
-                msg = await channel.get(encoding='utf-8')
-                try:
-                    j = json.loads(msg)
-                except Exception:
-                    j = { 'type': 'price_update', 'payload': msg }
-                # forward into ws_manager queue
-                try:
-                    await ws_enqueue_fn(j)
-                except Exception:
-                    _logger.exception('Failed to enqueue message from redis')
-
-        loop.create_task(reader(ch))
-        return r
+        import fakeredis
     except Exception:
-        _logger.exception('Failed to start redis bridge')
         return None
+    return fakeredis
+
+MessageHandler = Callable[[dict], Awaitable[None]]
+
+# Shared fakeredis server so every FakeAsyncRedis client in this process sees
+# the same channels (mimics several workers talking to one Redis).
+_fake_server = None
+
+
+class InProcessBus:
+    """Delivers published messages straight back to the local handler."""
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler) -> None:
+        self._handler = handler
+
+    async def publish(self, msg: dict) -> None:
+        if self._handler is None:
+            _logger.debug("bus not started; dropping message: %s", msg)
+            return
+        await self._handler(msg)
+
+    async def stop(self) -> None:
+        self._handler = None
+
+
+class RedisBus:
+    """Redis pub/sub backend; every worker subscribes to the same channel."""
+
+    def __init__(self, client, channel: str = "prices"):
+        self._client = client
+        self._channel = channel
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler) -> None:
+        self._handler = handler
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(self._channel)
+        self._task = asyncio.get_running_loop().create_task(self._reader())
+        _logger.info("Redis bus subscribed to channel %s", self._channel)
+
+    async def _reader(self) -> None:
+        while True:
+            try:
+                m = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                _logger.exception("Error reading from redis bus; retrying")
+                await asyncio.sleep(1)
+                continue
+            if not m:
+                continue
+            data = m.get("data")
+            if isinstance(data, bytes):
+                data = data.decode("utf-8", errors="replace")
+            try:
+                j = json.loads(data)
+            except Exception:
+                j = {"type": "price_update", "payload": data}
+            try:
+                await self._handler(j)
+            except Exception:
+                _logger.exception("Failed to handle message from redis bus")
+
+    async def publish(self, msg: dict) -> None:
+        await self._client.publish(self._channel, json.dumps(msg, default=str))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self._channel)
+                await self._pubsub.aclose()
+            except Exception:
+                _logger.debug("Error closing redis pubsub", exc_info=True)
+            self._pubsub = None
+        try:
+            await self._client.aclose()
+        except Exception:
+            _logger.debug("Error closing redis client", exc_info=True)
+
+
+def _fake_redis_client(fakeredis):
+    global _fake_server
+    if _fake_server is None:
+        _fake_server = fakeredis.FakeServer()
+    return fakeredis.FakeAsyncRedis(server=_fake_server)
+
+
+def create_bus(backend: Optional[str] = None, url: Optional[str] = None, channel: Optional[str] = None):
+    """Build the bus configured in settings (arguments override settings).
+
+    Falls back to the in-process bus when the requested backend's client
+    library is missing or no REDIS_URL is configured.
+    """
+    backend = (backend or settings.WS_BUS_BACKEND or "memory").lower()
+    channel = channel or settings.WS_BUS_CHANNEL
+    if backend == "redis":
+        url = url or settings.REDIS_URL
+        if not url:
+            _logger.warning("WS_BUS_BACKEND=redis but REDIS_URL not configured; using in-process bus")
+            return InProcessBus()
+        aioredis = _import_aioredis()
+        if aioredis is None:
+            _logger.warning("redis package not installed; using in-process bus")
+            return InProcessBus()
+        _logger.info("Using Redis websocket bus at %s", url)
+        return RedisBus(aioredis.from_url(url), channel=channel)
+    if backend == "fakeredis":
+        fakeredis = _import_fakeredis()
+        if fakeredis is None:
+            _logger.warning("fakeredis not installed; using in-process bus")
+            return InProcessBus()
+        return RedisBus(_fake_redis_client(fakeredis), channel=channel)
+    if backend != "memory":
+        _logger.warning("Unknown WS_BUS_BACKEND %r; using in-process bus", backend)
+    return InProcessBus()
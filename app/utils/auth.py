@@ -1,6 +1,13 @@
 # app/utils/auth.py
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 from passlib.context import CryptContext
 
+from app.config import settings
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def get_password_hash(password: str) -> str:
@@ -23,4 +30,80 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     pw_bytes = plain_password.encode("utf-8")
     if len(pw_bytes) > 72:
         pw_bytes = pw_bytes[:72]
-    return pwd_context.verify(pw_bytes, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(pw_bytes, hashed_password)
+
+
+# --- bcrypt uden for request-threadpoolen ---
+# bcrypt takes ~250 ms of CPU per call. Running it inline on Starlette's
+# threadpool lets a login burst starve every other sync endpoint, so the async
+# helpers below run it in a small process pool and refuse new work (HashingBusy
+# -> 503 + Retry-After) once PASSWORD_HASH_MAX_PENDING calls are queued.
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+
+class HashingBusy(Exception):
+    """Raised when the password hashing queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("password hashing queue full")
+        self.retry_after = retry_after
+
+
+def _get_pool():
+    global _pool
+    if _pool is None and settings.PASSWORD_HASH_WORKERS > 0:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a process that runs an event loop and threads is unsafe
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def warm_hash_pool() -> None:
+    """Start the worker processes ahead of the first login (blocking)."""
+    pool = _get_pool()
+    if pool is not None:
+        list(pool.map(_noop, range(settings.PASSWORD_HASH_WORKERS)))
+
+
+def _noop(_i):
+    return None
+
+
+def shutdown_hash_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def hash_queue_depth() -> int:
+    """Hashing calls admitted and not finished yet (running + queued)."""
+    return _pending
+
+
+async def _run_hashing(fn, *args):
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HashingBusy(settings.PASSWORD_HASH_RETRY_AFTER)
+    _pending += 1  # only touched from the event loop
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_pool(), fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hashing(verify_password, plain_password, hashed_password)
@@ -0,0 +1,42 @@
+# app/utils/conftest.py
+"""Shared pytest fixtures for the checks in app/utils.
+
+`scratch_db` gives a test an empty SQLite file with the full schema, so
+checks that write never touch the database configured in DATABASE_URL.
+"""
+import sys
+from dataclasses import dataclass
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (registers every table on Base)
+from app import database
+from app.database import Base, make_engine
+
+
+@dataclass
+class ScratchDB:
+    path: str
+    engine: object
+    Session: sessionmaker
+
+    @property
+    def async_url(self) -> str:
+        return f"sqlite+aiosqlite:///{self.path}"
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """A fresh database file; app modules' SessionLocal is pointed at it for the test."""
+    path = str(tmp_path / "scratch.db")
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # services open their own sessions (worker entry points, runner threads)
+    configured = database.SessionLocal
+    for name, module in list(sys.modules.items()):
+        if name.startswith("app.") and getattr(module, "SessionLocal", None) is configured:
+            monkeypatch.setattr(module, "SessionLocal", Session)
+    yield ScratchDB(path, engine, Session)
+    engine.dispose()
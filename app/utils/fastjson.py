@@ -0,0 +1,45 @@
+# app/utils/fastjson.py
+"""JSON responses for the hot read endpoints that skip FastAPI's encoder.
+
+Handlers build plain dicts/lists straight from row tuples and return a
+FastJSONResponse, which FastAPI sends as-is: no response_model validation
+and no jsonable_encoder pass. Serialization uses orjson when it is
+installed and falls back to the standard json module with the same output
+format as FastAPI's JSONResponse.
+"""
+import json
+from datetime import date, datetime, timezone
+from typing import Any
+
+from fastapi import Response
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+
+def _default(obj):
+    # match pydantic's rendering of datetimes (UTC as "Z")
+    if isinstance(obj, datetime):
+        s = obj.isoformat()
+        if obj.tzinfo is not None and obj.utcoffset() == timezone.utc.utcoffset(None):
+            s = s[:-6] + "Z"
+        return s
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,91 @@
+# app/utils/static_files.py
+"""StaticFiles that serves precompressed variants and immutable cache headers.
+
+Works with the output of scripts/build_frontend.py: for a request of `x`
+it sends `x.br` or `x.gz` when the client accepts that encoding and the
+file exists, so nothing is compressed per request. Files listed in the
+directory's manifest.json (content-hashed names) are sent with
+`Cache-Control: public, max-age=31536000, immutable`. Everything else,
+including index.html, gets `no-cache` and is revalidated with its
+ETag / Last-Modified.
+"""
+import json
+import logging
+import mimetypes
+import os
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+_logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# preferred first
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _accepted(accept_encoding: str) -> set:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _sep, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def has_manifest(directory: str) -> bool:
+    return os.path.isfile(os.path.join(directory, MANIFEST_NAME))
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.immutable = set()
+        manifest = os.path.join(directory, MANIFEST_NAME)
+        if os.path.isfile(manifest):
+            try:
+                with open(manifest, "r", encoding="utf-8") as f:
+                    self.immutable = {os.path.basename(v) for v in json.load(f).values()}
+            except Exception:
+                _logger.exception("Failed to read %s; serving without immutable caching", manifest)
+
+    def _variant(self, full_path: str, scope: Scope) -> tuple[Optional[str], Optional[str], Optional[os.stat_result]]:
+        accepted = _accepted(Headers(scope=scope).get("accept-encoding", ""))
+        for coding, suffix in _ENCODINGS:
+            if coding in accepted or "*" in accepted:
+                try:
+                    return coding, full_path + suffix, os.stat(full_path + suffix)
+                except OSError:
+                    continue
+        return None, None, None
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        full_path = str(full_path)
+        coding, variant_path, variant_stat = self._variant(full_path, scope)
+        if coding is not None:
+            media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+            response = FileResponse(variant_path, status_code=status_code, stat_result=variant_stat,
+                                    media_type=media_type)
+            response.headers["Content-Encoding"] = coding
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["Vary"] = "Accept-Encoding"
+        name = os.path.basename(full_path)
+        response.headers["Cache-Control"] = IMMUTABLE if name in self.immutable else REVALIDATE
+
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,106 @@
+# app/utils/test_consistency.py
+"""Checks for the streaming ledger/portfolio verifier in app/services/consistency.py.
+
+Run with: PYTHONPATH="$(pwd)" python -m pytest app/utils/test_consistency.py
+"""
+from sqlalchemy import func
+
+from app.models import LedgerChange, PortfolioCheckpoint, StockPrice, Transaction, User, UserPortfolio
+from app.services import consistency, ledger
+from app.services.price_updater import recompute_portfolios_for_symbol
+
+
+def _trade(db, user_id, symbol, type_, quantity, total):
+    db.add(Transaction(user_id=user_id, symbol=symbol, name=symbol, type=type_, quantity=quantity,
+                       price=total / quantity, total_amount=total, currency="USD"))
+
+
+def _seed(Session):
+    db = Session()
+    try:
+        users = [User(username=f"verify{i}", hashed_password="x") for i in range(6)]
+        db.add_all(users)
+        db.flush()
+        for sym in ("AAA", "BBB"):
+            db.add(StockPrice(symbol=sym, name=sym, currency="USD", current_price=10.0))
+            for u in users:
+                _trade(db, u.id, sym, "BUY", 4, 20.0)
+                if u.id % 2:
+                    _trade(db, u.id, sym, "SELL", 4, 30.0)  # closed position
+            db.flush()
+            recompute_portfolios_for_symbol(db, sym)
+        db.commit()
+        ledger.create_checkpoints(db, min_transactions=1, upto=db.query(func.max(Transaction.id)).scalar())
+        return [u.id for u in users]
+    finally:
+        db.close()
+
+
+def test_finds_and_repairs_inconsistencies(scratch_db):
+    user_ids = _seed(scratch_db.Session)
+    db = scratch_db.Session()
+    try:
+        open_user, closed_user = user_ids[1], user_ids[0]  # ids start at 1: even ids stay open
+        db.query(UserPortfolio).filter_by(user_id=open_user, symbol="AAA").update({"quantity": 99})
+        db.query(UserPortfolio).filter_by(user_id=open_user, symbol="BBB").delete()
+        db.add(UserPortfolio(user_id=closed_user, symbol="AAA", quantity=1, total_amount=5,
+                             avg_cost=5, current_amount=10, profit=5))
+        db.query(PortfolioCheckpoint).filter_by(user_id=user_ids[3], symbol="BBB").update({"quantity": 7})
+        db.commit()
+    finally:
+        db.close()
+
+    report = consistency.verify(workers=1)
+    assert report.counts == {"mismatch": 1, "missing": 1, "unexpected": 1, "checkpoint": 1}
+
+    assert consistency.verify(workers=1, repair=True).repaired == 4
+    assert consistency.verify(workers=1).problems == 0
+
+
+def test_incremental_checks_only_new_activity(scratch_db):
+    user_ids = _seed(scratch_db.Session)
+    assert consistency.verify(workers=1).problems == 0  # sets the marker
+
+    db = scratch_db.Session()
+    try:
+        # a trade that never reached user_portfolios, and a stale row nobody traded since
+        _trade(db, user_ids[1], "AAA", "BUY", 1, 5.0)
+        db.query(UserPortfolio).filter_by(user_id=user_ids[3], symbol="BBB").update({"quantity": 42})
+        db.commit()
+    finally:
+        db.close()
+
+    report = consistency.verify(incremental=True, workers=1)
+    assert report.counts == {"mismatch": 1}
+    assert report.findings[0]["user_id"] == user_ids[1] and report.findings[0]["symbol"] == "AAA"
+
+
+def test_incremental_checks_edited_and_deleted_transactions(scratch_db):
+    user_ids = _seed(scratch_db.Session)
+    assert consistency.verify(workers=1).problems == 0
+
+    db = scratch_db.Session()
+    try:
+        # edits and deletes whose recompute never ran, recorded like the PUT/DELETE routes do
+        edited = db.query(Transaction).filter_by(user_id=user_ids[1], symbol="AAA").first()
+        edited.quantity, edited.total_amount = 3, 15.0
+        ledger.invalidate(db, user_ids[1], "AAA", edited.id)
+        ledger.note_change(db, user_ids[1], "AAA")
+        deleted = db.query(Transaction).filter_by(user_id=user_ids[3], symbol="BBB").first()
+        ledger.invalidate(db, user_ids[3], "BBB", deleted.id)
+        ledger.note_change(db, user_ids[3], "BBB")
+        db.delete(deleted)
+        db.commit()
+    finally:
+        db.close()
+
+    report = consistency.verify(incremental=True, workers=1)
+    assert report.counts == {"mismatch": 1, "unexpected": 1}
+    assert consistency.verify(incremental=True, workers=1, repair=True).repaired == 2
+    # the clean run pruned the change log
+    db = scratch_db.Session()
+    try:
+        assert db.query(LedgerChange).count() == 0
+    finally:
+        db.close()
+    assert consistency.verify(workers=1).problems == 0
@@ -0,0 +1,31 @@
+# app/utils/test_importer.py
+"""Checks for the bulk transaction import in app/services/importer.py.
+
+Run with: PYTHONPATH="$(pwd)" python -m pytest app/utils/test_importer.py
+"""
+from datetime import datetime
+
+from app.models import Transaction, User
+from app.services import importer
+
+
+def test_import_mixes_offset_and_naive_timestamps(scratch_db):
+    csv_body = (
+        "symbol,type,quantity,price,created_at\n"
+        "AAA,BUY,2,5,2024-01-01T10:00:00Z\n"
+        "AAA,BUY,1,6,2024-01-01T09:30:00\n"
+        "AAA,SELL,1,8,2024-01-01T12:00:00+02:00\n"
+    )
+    rows = importer.parse_rows(csv_body, "csv", 10)
+    db = scratch_db.Session()
+    try:
+        user = User(username="importer", hashed_password="x")
+        db.add(user)
+        db.commit()
+        assert importer.import_rows(db, user.id, rows) == {"imported": 3, "symbols": ["AAA"]}
+
+        stamps = [t.created_at for t in db.query(Transaction).order_by(Transaction.created_at, Transaction.id)]
+        # offsets are converted to naive UTC, the same form as rows imported without one
+        assert stamps == [datetime(2024, 1, 1, 9, 30), datetime(2024, 1, 1, 10, 0), datetime(2024, 1, 1, 10, 0)]
+    finally:
+        db.close()
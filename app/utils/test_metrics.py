@@ -0,0 +1,32 @@
+# app/utils/test_metrics.py
+"""Checks for the Prometheus text rendering in app/services/metrics.py.
+
+Run with: PYTHONPATH="$(pwd)" python -m pytest app/utils/test_metrics.py
+"""
+from sqlalchemy import create_engine, text
+
+from app.services import metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    h = metrics.Histogram("t_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v, "/x")
+    lines = h.render()
+    assert 't_seconds_bucket{route="/x",le="0.1"} 2' in lines
+    assert 't_seconds_bucket{route="/x",le="1"} 3' in lines
+    assert 't_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 't_seconds_count{route="/x"} 4' in lines
+
+
+def test_queries_are_counted_per_request_context():
+    engine = create_engine("sqlite://")
+    stats = [0, 0.0]
+    token = metrics._request_db.set(stats)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("select 1"))
+            conn.execute(text("select 2"))
+    finally:
+        metrics._request_db.reset(token)
+    assert stats[0] == 2 and stats[1] > 0
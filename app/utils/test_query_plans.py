@@ -0,0 +1,212 @@
+# app/utils/test_query_plans.py
+"""Query-plan regression checks for the hot queries.
+
+Each check runs the real code path against a small SQLite database, records
+every statement it sends, and runs EXPLAIN QUERY PLAN on it. A plan step that
+scans a whole table ("SCAN transactions", "SCAN user_portfolios", ...) fails
+the test, so a change that drops or bypasses an index is caught here.
+
+Run with: PYTHONPATH="$(pwd)" python -m pytest app/utils/test_query_plans.py
+"""
+import asyncio
+import re
+from datetime import datetime
+
+from fastapi import Response
+from sqlalchemy import event, func
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import pytest
+
+from app.models import StockPrice, Transaction, User
+from app.routers.portfolio import get_portfolio
+from app.routers.stocks import get_stock_prices
+from app.routers.transaction import get_transactions_for_user, get_transactions_page
+from app.services import ledger, portfolio_stream
+from app.services.price_updater import recompute_portfolios_for_symbol
+
+HOT_TABLES = ("transactions", "user_portfolios", "stock_prices", "users")
+_FULL_SCAN = re.compile(r"^SCAN (%s)\b" % "|".join(HOT_TABLES))
+
+@pytest.fixture(autouse=True)
+def _seed(scratch_db):
+    db = scratch_db.Session()
+    try:
+        users = [User(username=f"user{i}", hashed_password="x") for i in range(20)]
+        db.add_all(users)
+        for sym in ("AAPL", "MSFT", "TSLA"):
+            db.add(StockPrice(symbol=sym, name=sym, currency="USD", current_price=100.0))
+        db.flush()
+        for u in users:
+            for sym in ("AAPL", "MSFT"):
+                db.add(Transaction(user_id=u.id, symbol=sym, name=sym, type="BUY",
+                                   quantity=2, price=10, total_amount=20, currency="USD"))
+        db.commit()
+        for sym in ("AAPL", "MSFT"):
+            recompute_portfolios_for_symbol(db, sym)
+        db.commit()
+        ledger.create_checkpoints(db, min_transactions=1, upto=db.query(func.max(Transaction.id)).scalar())
+        db.add(Transaction(user_id=users[0].id, symbol="AAPL", name="AAPL", type="SELL",
+                           quantity=1, price=12, total_amount=12, currency="USD"))
+        db.commit()
+    finally:
+        db.close()
+
+
+class _Recorder:
+    """Collects (statement, parameters) for every query sent through an engine."""
+
+    def __init__(self, sync_engine):
+        self.engine = sync_engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+
+def _full_scans(engine, statements):
+    """Return [(statement, plan step)] for every full table scan in the plans."""
+    offenders = []
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for statement, params in statements:
+            for row in cur.execute("EXPLAIN QUERY PLAN " + statement, params):
+                detail = row[-1]
+                if _FULL_SCAN.match(detail):
+                    offenders.append((statement, detail))
+    finally:
+        raw.close()
+    return offenders
+
+
+def _assert_no_full_scans(scratch_db, rec):
+    assert rec.statements, "no statements were recorded"
+    offenders = _full_scans(scratch_db.engine, rec.statements)
+    assert not offenders, "full table scan in hot query:\n" + "\n".join(
+        f"{detail}\n  {stmt}" for stmt, detail in offenders
+    )
+
+
+def _run_async(scratch_db, fn, *args, **kwargs):
+    async_engine = create_async_engine(scratch_db.async_url)
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def run():
+        try:
+            with _Recorder(async_engine.sync_engine) as rec:
+                async with AsyncSession() as db:
+                    await fn(*args, db=db, **kwargs)
+            return rec
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_recompute_portfolios_for_symbol_uses_indexes(scratch_db):
+    db = scratch_db.Session()
+    try:
+        with _Recorder(scratch_db.engine) as rec:
+            recompute_portfolios_for_symbol(db, "AAPL")
+            db.flush()
+        db.rollback()
+    finally:
+        db.close()
+    _assert_no_full_scans(scratch_db, rec)
+
+
+def test_ledger_checkpoint_queries_use_indexes(scratch_db):
+    db = scratch_db.Session()
+    try:
+        with _Recorder(scratch_db.engine) as rec:
+            ledger.net_positions(db, "AAPL", [1])
+            ledger.position_state(db, 1, "AAPL")
+            ledger.checkpoint_position(db, 1, "AAPL")
+            db.flush()
+        db.rollback()
+    finally:
+        db.close()
+    _assert_no_full_scans(scratch_db, rec)
+
+
+def test_portfolio_stream_queries_use_indexes(scratch_db):
+    db = scratch_db.Session()
+    try:
+        with _Recorder(scratch_db.engine) as rec:
+            before = portfolio_stream.snapshot_positions(db, ["AAPL"])
+            portfolio_stream.build_updates(db, ["AAPL"], before)
+            portfolio_stream.snapshot_positions(db, ["MSFT"], user_id=1)
+    finally:
+        db.close()
+    _assert_no_full_scans(scratch_db, rec)
+
+
+def test_get_portfolio_uses_indexes(scratch_db):
+    rec = _run_async(scratch_db, get_portfolio, 1, response=Response(), if_none_match=None)
+    _assert_no_full_scans(scratch_db, rec)
+
+
+def test_get_transactions_for_user_uses_indexes(scratch_db):
+    _assert_no_full_scans(scratch_db, _run_async(scratch_db, get_transactions_for_user, 1))
+
+
+def test_get_transactions_page_uses_indexes(scratch_db):
+    filters = dict(symbol=None, tx_type=None, since=None, until=None)
+    first = _run_async(scratch_db, get_transactions_page, 1, limit=1, cursor=None, **filters)
+    _assert_no_full_scans(scratch_db, first)
+
+
+def test_get_transactions_page_cursor_has_no_overlap_or_gap(scratch_db):
+    db = scratch_db.Session()
+    try:
+        user = User(username="pager", hashed_password="x")
+        db.add(user)
+        db.flush()
+        # several rows share a created_at, so the cursor must break ties on id
+        stamps = [datetime(2026, 1, 1, 12, 0, 0)] * 3 + [datetime(2026, 1, 2, 9, 30, 0)] * 2 + [
+            datetime(2026, 1, 3, 8, 0, 0, 500000), datetime(2026, 1, 3, 8, 0, 0, 500000)]
+        for i, ts in enumerate(stamps):
+            db.add(Transaction(user_id=user.id, symbol="TSLA", name="TSLA", type="BUY", quantity=1,
+                               price=10 + i, total_amount=10 + i, currency="USD", created_at=ts))
+        db.commit()
+        user_id = user.id
+        expected = [t.id for t in db.query(Transaction).filter(Transaction.user_id == user_id)
+                    .order_by(Transaction.created_at.desc(), Transaction.id.desc())]
+    finally:
+        db.close()
+
+    async def walk():
+        async_engine = create_async_engine(scratch_db.async_url)
+        AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+        pages, cursor = [], None
+        try:
+            while True:
+                async with AsyncSession() as adb:
+                    page = await get_transactions_page(user_id, limit=2, cursor=cursor, symbol=None,
+                                                       tx_type=None, since=None, until=None, db=adb)
+                pages.append([t.id for t in page["items"]])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    return pages
+        finally:
+            await async_engine.dispose()
+
+    pages = asyncio.run(walk())
+    assert len(pages) == 4
+    # page 2 starts right after page 1, and the pages together are the full history once
+    assert pages[1][0] == expected[expected.index(pages[0][-1]) + 1]
+    assert [tx_id for page in pages for tx_id in page] == expected
+
+
+def test_get_stock_prices_for_symbols_uses_indexes(scratch_db):
+    rec = _run_async(scratch_db, get_stock_prices, Response(), "AAPL,MSFT", if_none_match=None)
+    _assert_no_full_scans(scratch_db, rec)
+
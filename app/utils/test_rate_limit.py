@@ -0,0 +1,65 @@
+# app/utils/test_rate_limit.py
+"""Checks for the token buckets in app/services/rate_limit.py.
+
+Run with: PYTHONPATH="$(pwd)" python -m pytest app/utils/test_rate_limit.py
+"""
+import asyncio
+
+from app.services import rate_limit
+
+
+def test_parse_limits_and_longest_prefix():
+    limits = rate_limit.parse_limits("*=20:40,/stock_prices/=2:10,/stock_prices/search=5")
+    assert limits["/stock_prices/search"] == (5.0, 5.0)
+    assert rate_limit._budget(limits, "/stock_prices/search")[0] == "/stock_prices/search"
+    assert rate_limit._budget(limits, "/stock_prices/")[0] == "/stock_prices/"
+    assert rate_limit._budget(limits, "/portfolio/1")[0] == "*"
+
+
+def test_local_bucket_burst_then_refill():
+    async def run():
+        buckets = rate_limit.LocalBuckets()
+        waits = [await buckets.take("ip:1|*", 2.0, 3, 100.0) for _ in range(4)]
+        assert waits[:3] == [0.0, 0.0, 0.0] and waits[3] == 0.5
+        # half a second at 2 tokens/s refills one token
+        assert await buckets.take("ip:1|*", 2.0, 3, 100.5) == 0.0
+        # other clients have their own bucket
+        assert await buckets.take("ip:2|*", 2.0, 3, 100.5) == 0.0
+
+    asyncio.run(run())
+
+
+def test_local_eviction_keeps_buckets_of_slower_budgets(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_MAX_LOCAL_BUCKETS", 3)
+
+    async def run():
+        buckets = rate_limit.LocalBuckets()
+        # a slow budget: 2 tokens, one more every 100 s
+        for _ in range(2):
+            await buckets.take("ip:1|/slow", 0.01, 2, 100.0)
+        # fast-budget clients that have long refilled, then one whose request triggers eviction
+        await buckets.take("ip:2|*", 10.0, 5, 105.0)
+        await buckets.take("ip:3|*", 10.0, 5, 105.0)
+        await buckets.take("ip:4|*", 10.0, 5, 110.0)
+        assert list(buckets._buckets) == ["ip:1|/slow", "ip:4|*"]
+        assert await buckets.take("ip:1|/slow", 0.01, 2, 110.0) > 0
+        # once it would have refilled, it can go
+        await buckets.take("ip:5|*", 10.0, 5, 400.0)
+        await buckets.take("ip:6|*", 10.0, 5, 400.0)
+        assert list(buckets._buckets) == ["ip:5|*", "ip:6|*"]
+
+    asyncio.run(run())
+
+
+def test_local_buckets_stay_capped_when_nothing_has_refilled(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_MAX_LOCAL_BUCKETS", 3)
+
+    async def run():
+        buckets = rate_limit.LocalBuckets()
+        for i in range(10):
+            await buckets.take(f"ip:{i}|*", 1.0, 5, 100.0 + i * 0.01)
+        await buckets.take("ip:7|*", 1.0, 5, 100.2)
+        # the least recently used buckets went first
+        assert list(buckets._buckets) == ["ip:8|*", "ip:9|*", "ip:7|*"]
+
+    asyncio.run(run())
@@ -0,0 +1,115 @@
+# app/utils/test_recompute_jobs.py
+"""Checks for the chunked, resumable recompute jobs in app/services/recompute_jobs.py.
+
+Run with: PYTHONPATH="$(pwd)" python -m pytest app/utils/test_recompute_jobs.py
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import RecomputeJob, RecomputeJobChunk, StockPrice, Transaction, User, UserPortfolio
+from app.services import price_updater, recompute_jobs
+
+SYMBOLS = ("AAA", "BBB", "CCC", "DDD")
+
+
+@pytest.fixture(autouse=True)
+def _seed(scratch_db):
+    db = scratch_db.Session()
+    try:
+        user = User(username="jobs", hashed_password="x")
+        db.add(user)
+        db.flush()
+        for sym in SYMBOLS:
+            db.add(StockPrice(symbol=sym, name=sym, currency="USD", current_price=10.0))
+            db.add(Transaction(user_id=user.id, symbol=sym, name=sym, type="BUY",
+                               quantity=2, price=5.0, total_amount=10.0, currency="USD"))
+        db.commit()
+        # transactions were added without touching portfolios, so every row is missing
+        db.query(UserPortfolio).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_stale_job_resumes_from_pending_chunks(scratch_db):
+    db = scratch_db.Session()
+    try:
+        job, created = recompute_jobs.enqueue(db, chunk_size=1)
+        assert created and job.chunks_total == len(SYMBOLS)
+        # a full job that is already queued is returned instead of a second one
+        assert recompute_jobs.enqueue(db)[0].id == job.id
+
+        # simulate a runner that finished the first chunk and then died
+        first = db.query(RecomputeJobChunk).filter_by(job_id=job.id).order_by(RecomputeJobChunk.id).first()
+        first.status = "done"
+        job.status, job.holder = "running", "dead-process"
+        job.chunks_done, job.symbols_done = 1, 1
+        job.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+        db.commit()
+
+        assert recompute_jobs._claim(db) == job.id
+        recompute_jobs.run_job(job.id, workers=1)
+
+        db.expire_all()
+        job = db.get(RecomputeJob, job.id)
+        assert job.status == "done" and job.chunks_done == len(SYMBOLS) and job.symbols_done == len(SYMBOLS)
+        assert recompute_jobs.job_status(job)["percent"] == 100.0
+        # the chunk marked done before the "crash" was not recomputed again
+        assert sorted(s for (s,) in db.query(UserPortfolio.symbol)) == list(SYMBOLS[1:])
+    finally:
+        db.close()
+
+
+def test_chunk_finished_twice_is_counted_once(scratch_db, monkeypatch):
+    db = scratch_db.Session()
+    try:
+        job, _created = recompute_jobs.enqueue(db, chunk_size=len(SYMBOLS))
+        chunk_id = db.query(RecomputeJobChunk.id).filter_by(job_id=job.id).scalar()
+        real = price_updater.recompute_portfolios_for_symbol
+
+        def finished_elsewhere(session, symbol, **kw):
+            # the runner that took the job over finishes the chunk while this one still works on it
+            if symbol == SYMBOLS[0]:
+                other = scratch_db.Session()
+                other.query(RecomputeJobChunk).filter_by(id=chunk_id).update({"status": "done"})
+                other.query(RecomputeJob).filter_by(id=job.id).update(
+                    {"chunks_done": 1, "symbols_done": len(SYMBOLS)})
+                other.commit()
+                other.close()
+            return real(session, symbol, **kw)
+
+        monkeypatch.setattr(price_updater, "recompute_portfolios_for_symbol", finished_elsewhere)
+        assert recompute_jobs._run_chunk(chunk_id) == (chunk_id, [])
+
+        db.expire_all()
+        job = db.get(RecomputeJob, job.id)
+        assert job.chunks_done == 1 and recompute_jobs.job_status(job)["percent"] == 100.0
+    finally:
+        db.close()
+
+
+def test_failing_chunk_is_retried_then_fails_the_job(scratch_db, monkeypatch):
+    calls = []
+
+    def broken(session, symbol, **kw):
+        calls.append(symbol)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(price_updater, "recompute_portfolios_for_symbol", broken)
+    db = scratch_db.Session()
+    try:
+        job, _created = recompute_jobs.enqueue(db, symbols=[SYMBOLS[0]])
+        assert recompute_jobs._claim(db) == job.id
+        recompute_jobs.run_job(job.id, workers=1)
+
+        db.expire_all()
+        job = db.get(RecomputeJob, job.id)
+        chunk = db.query(RecomputeJobChunk).filter_by(job_id=job.id).one()
+        assert len(calls) == settings.RECOMPUTE_CHUNK_ATTEMPTS
+        assert chunk.status == "failed" and chunk.attempts == settings.RECOMPUTE_CHUNK_ATTEMPTS
+        assert job.status == "failed" and job.chunks_failed == 1 and "boom" in job.error
+        assert db.query(UserPortfolio).count() == 0
+    finally:
+        db.close()
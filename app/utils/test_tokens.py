@@ -0,0 +1,38 @@
+# app/utils/test_tokens.py
+"""Checks for the signed session tokens in app/utils/tokens.py.
+
+Run with: PYTHONPATH="$(pwd)" python -m pytest app/utils/test_tokens.py
+"""
+import json
+
+import pytest
+
+from app.utils import tokens
+
+
+def test_issued_token_verifies():
+    token, _exp = tokens.issue(7)
+    assert tokens.verify(token)["sub"] == 7
+    with pytest.raises(tokens.TokenError):
+        tokens.verify(token, tokens.REFRESH)
+
+
+@pytest.mark.parametrize("mangle", [
+    lambda t: "é" + t,                        # non-ASCII in the key id
+    lambda t: t[:-1] + "é",                   # non-ASCII in the signature
+    lambda t: t.encode("ascii"),              # not a string at all
+    lambda t: None,
+    lambda t: t + ".extra",
+])
+def test_malformed_tokens_are_rejected(mangle):
+    token, _exp = tokens.issue(7)
+    with pytest.raises(tokens.TokenError):
+        tokens.verify(mangle(token))
+
+
+def test_signed_claims_must_be_an_object():
+    kid, key = next(iter(tokens._load_keys().items()))
+    payload = tokens._b64encode(json.dumps([1, 2]).encode("utf-8"))
+    signature = tokens._sign(key, f"{kid}.{payload}".encode("ascii"))
+    with pytest.raises(tokens.TokenError, match="malformed"):
+        tokens.verify(f"{kid}.{payload}.{signature}")
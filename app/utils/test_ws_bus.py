@@ -0,0 +1,64 @@
+# app/utils/test_ws_bus.py
+"""Checks for the websocket pub/sub bus using the fakeredis stand-in.
+
+Run with: PYTHONPATH="$(pwd)" python -m pytest app/utils/test_ws_bus.py
+"""
+import asyncio
+
+from app.services import ws_pubsub
+
+
+async def _collect(bus, received):
+    async def handler(msg):
+        received.append(msg)
+    await bus.start(handler)
+
+
+async def _wait_for(predicate, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+def test_in_process_bus_delivers_locally():
+    async def run():
+        bus = ws_pubsub.create_bus(backend="memory")
+        received = []
+        await _collect(bus, received)
+        await bus.publish({"type": "price_update", "symbol": "AAPL", "price": 1.0})
+        await bus.stop()
+        return received
+
+    received = asyncio.run(run())
+    assert received == [{"type": "price_update", "symbol": "AAPL", "price": 1.0}]
+
+
+def test_fakeredis_bus_fans_out_to_every_worker():
+    async def run():
+        # two buses on the shared fake server behave like two uvicorn workers
+        worker_a = ws_pubsub.create_bus(backend="fakeredis", channel="test-prices")
+        worker_b = ws_pubsub.create_bus(backend="fakeredis", channel="test-prices")
+        got_a, got_b = [], []
+        await _collect(worker_a, got_a)
+        await _collect(worker_b, got_b)
+
+        await worker_a.publish({"type": "price_update", "symbol": "TSLA", "price": 250.5})
+        ok = await _wait_for(lambda: got_a and got_b)
+
+        await worker_a.stop()
+        await worker_b.stop()
+        return ok, got_a, got_b
+
+    ok, got_a, got_b = asyncio.run(run())
+    assert ok, "message was not delivered to both workers"
+    assert got_a[0]["symbol"] == "TSLA" and got_b[0]["symbol"] == "TSLA"
+    assert got_b[0]["price"] == 250.5
+
+
+if __name__ == "__main__":
+    test_in_process_bus_delivers_locally()
+    test_fakeredis_bus_fans_out_to_every_worker()
+    print("ws bus OK")
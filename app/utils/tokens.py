@@ -0,0 +1,225 @@
+# app/utils/tokens.py
+"""Stateless signed session tokens (HMAC-SHA256).
+
+A token is `<kid>.<payload>.<signature>`: base64url JSON claims
+{"sub": user_id, "typ": "access"|"refresh", "exp": ..., "jti": ...} signed
+with the key named `kid`. Verifying one is pure CPU work (one HMAC and a JSON
+decode), with no DB lookup or bcrypt call per request.
+
+Keys come from AUTH_SECRET_KEYS ("kid1:secret1,kid2:secret2"). The first key
+signs new tokens and all listed keys verify, so a key is rotated by putting
+a new one in front and dropping the old one after REFRESH_TOKEN_TTL_SECONDS.
+Refresh tokens are single use: /auth/refresh revokes the one it consumes.
+
+Revoked token ids (logout, used refresh tokens) are kept in a small
+in-memory cache until the token would have expired anyway. Revocations are
+sent over the websocket bus, so every worker learns about them.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Header, HTTPException, Request
+
+from app.config import settings
+
+_logger = logging.getLogger(__name__)
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+# Upper bound on remembered revocations; the soonest-expiring entries go first
+_REVOCATION_CACHE_SIZE = 10000
+
+
+class TokenError(Exception):
+    """Raised when a token is malformed, badly signed, expired or revoked."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+_keys: Optional[OrderedDict] = None
+
+
+def _load_keys() -> OrderedDict:
+    global _keys
+    if _keys is None:
+        keys = OrderedDict()
+        for part in (settings.AUTH_SECRET_KEYS or "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            kid, sep, secret = part.partition(":")
+            if not sep or not kid or not secret:
+                raise ValueError("AUTH_SECRET_KEYS entries must look like kid:secret")
+            keys[kid] = secret.encode("utf-8")
+        if not keys:
+            # tokens from this key only verify in this process and die with it
+            _logger.warning("AUTH_SECRET_KEYS not set; using a random per-process signing key")
+            keys["dev"] = secrets.token_bytes(32)
+        _keys = keys
+    return _keys
+
+
+def _sign(key: bytes, msg: bytes) -> str:
+    return _b64encode(hmac.new(key, msg, hashlib.sha256).digest())
+
+
+def issue(user_id: int, typ: str = ACCESS, ttl_seconds: Optional[int] = None) -> tuple[str, int]:
+    """Return (token, expires_at) for `user_id`."""
+    if ttl_seconds is None:
+        ttl_seconds = settings.ACCESS_TOKEN_TTL_SECONDS if typ == ACCESS else settings.REFRESH_TOKEN_TTL_SECONDS
+    keys = _load_keys()
+    kid, key = next(iter(keys.items()))
+    exp = int(time.time()) + ttl_seconds
+    claims = {"sub": user_id, "typ": typ, "exp": exp, "jti": secrets.token_urlsafe(12)}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    signing_input = f"{kid}.{payload}".encode("ascii")
+    return f"{kid}.{payload}.{_sign(key, signing_input)}", exp
+
+
+def issue_pair(user_id: int) -> dict:
+    """Access and refresh token for a login or refresh response."""
+    access, _exp = issue(user_id, ACCESS)
+    refresh, _rexp = issue(user_id, REFRESH)
+    return {
+        "access_token": access,
+        "refresh_token": refresh,
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_TTL_SECONDS,
+    }
+
+
+def verify(token: str, typ: str = ACCESS) -> dict:
+    """Return the claims of a valid token or raise TokenError."""
+    # tokens come straight from headers and websocket messages
+    if not isinstance(token, str) or not token.isascii():
+        raise TokenError("malformed token")
+    try:
+        kid, payload, signature = token.split(".")
+    except ValueError:
+        raise TokenError("malformed token")
+    key = _load_keys().get(kid)
+    if key is None:
+        raise TokenError("unknown signing key")
+    expected = _sign(key, f"{kid}.{payload}".encode("ascii"))
+    if not hmac.compare_digest(expected, signature):
+        raise TokenError("bad signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise TokenError("malformed token")
+    if not isinstance(claims, dict):
+        raise TokenError("malformed token")
+    if claims.get("typ") != typ:
+        raise TokenError("wrong token type")
+    if claims.get("exp", 0) < time.time():
+        raise TokenError("token expired")
+    if is_revoked(claims.get("jti")):
+        raise TokenError("token revoked")
+    return claims
+
+
+# -- revocation cache ---------------------------------------------------------
+
+_revoked: dict[str, int] = {}
+_revoked_lock = threading.Lock()
+
+
+def is_revoked(jti: Optional[str]) -> bool:
+    return jti is not None and jti in _revoked
+
+
+def revoke_local(jti: str, exp: int) -> None:
+    """Remember a revoked token id in this process until it expires."""
+    now = time.time()
+    with _revoked_lock:
+        _revoked[jti] = exp
+        if len(_revoked) > _REVOCATION_CACHE_SIZE:
+            for k in [k for k, e in _revoked.items() if e < now]:
+                del _revoked[k]
+        if len(_revoked) > _REVOCATION_CACHE_SIZE:
+            _logger.warning("Token revocation cache full; forgetting the soonest-expiring entries")
+            for k, _e in sorted(_revoked.items(), key=lambda kv: kv[1])[:len(_revoked) - _REVOCATION_CACHE_SIZE]:
+                del _revoked[k]
+
+
+def revocation_message(claims: dict) -> dict:
+    """Bus message that makes every worker revoke the token (see ws_manager)."""
+    return {"type": "token_revoked", "jti": claims["jti"], "exp": claims["exp"]}
+
+
+def reset() -> None:
+    """Forget loaded keys and revocations (tests, key reloads)."""
+    global _keys
+    _keys = None
+    with _revoked_lock:
+        _revoked.clear()
+
+
+# -- FastAPI dependencies -----------------------------------------------------
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    scheme, _sep, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return token.strip()
+
+
+def current_user_id(authorization: Optional[str] = Header(None)) -> Optional[int]:
+    """User id from a valid bearer access token; None without a token unless AUTH_ENFORCE."""
+    token = bearer_token(authorization)
+    if token is None:
+        if settings.AUTH_ENFORCE:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        return None
+    try:
+        return verify(token)["sub"]
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+
+async def authorize_user(request: Request, authorization: Optional[str] = Header(None)) -> Optional[int]:
+    """Router dependency: the token's user must match the request's `user_id`.
+
+    `user_id` is taken from the path, the query string or a JSON body. Sets
+    `request.state.user_id`. Requests without a token pass while
+    AUTH_ENFORCE is off so clients can migrate gradually.
+    """
+    sub = current_user_id(authorization)
+    request.state.user_id = sub
+    if sub is None:
+        return None
+    target = request.path_params.get("user_id") or request.query_params.get("user_id")
+    if target is None and request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            target = body.get("user_id")
+    if target is not None:
+        try:
+            target = int(target)
+        except (TypeError, ValueError):
+            # leave malformed ids to request validation
+            return sub
+        if target != sub:
+            raise HTTPException(status_code=403, detail="Token does not belong to this user")
+    return sub
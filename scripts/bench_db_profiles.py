@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Benchmark concurrent transaction posts under the database engine profiles.
+
+For each profile ("default" = plain SQLAlchemy, "tuned" = WAL, pragmas and
+pool settings from app.config) this creates a fresh database, then runs
+--threads writer threads that each post --posts transactions through the
+real `create_transaction` endpoint function, while a background thread keeps
+rewriting stock prices like the price updater does. Reports throughput and
+how many posts failed (e.g. "database is locked").
+
+Run from project root:
+  python scripts/bench_db_profiles.py
+  python scripts/bench_db_profiles.py --url postgresql://user:pw@localhost/bench
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, make_engine
+from app.models import StockPrice, User
+from app.routers.transaction import create_transaction
+from app.schemas.transaction import TransactionCreate
+
+SYMBOLS = ['AAPL', 'MSFT', 'TSLA', 'NVDA', 'AMZN']
+
+
+def _setup(Session, users: int):
+    db = Session()
+    try:
+        for i in range(users):
+            db.add(User(username=f'bench{i}', hashed_password='x'))
+        for s in SYMBOLS:
+            db.add(StockPrice(symbol=s, name=s, currency='USD', current_price=100.0))
+        db.commit()
+        return [u.id for u in db.query(User).all()]
+    finally:
+        db.close()
+
+
+def _price_writer(Session, stop: threading.Event, counter: list):
+    price = 100.0
+    while not stop.is_set():
+        db = Session()
+        try:
+            price += 0.01
+            for sp in db.query(StockPrice).all():
+                sp.current_price = price
+            db.commit()
+            counter[0] += 1
+        except Exception:
+            db.rollback()
+        finally:
+            db.close()
+        time.sleep(0.01)
+
+
+def run_profile(url: str, profile: str, threads: int, posts: int) -> dict:
+    engine = make_engine(url, profile=profile)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    user_ids = _setup(Session, threads)
+
+    ok = [0]
+    errors: dict[str, int] = {}
+    lock = threading.Lock()
+
+    def writer(n: int):
+        uid = user_ids[n % len(user_ids)]
+        for i in range(posts):
+            db = Session()
+            try:
+                payload = TransactionCreate(user_id=uid, symbol=SYMBOLS[i % len(SYMBOLS)], name='Bench',
+                                            type='BUY', quantity=1, price=100.0, currency='USD')
+                create_transaction(payload, db)
+                with lock:
+                    ok[0] += 1
+            except Exception as e:
+                key = type(e).__name__ + (': database is locked' if 'locked' in str(e) else '')
+                with lock:
+                    errors[key] = errors.get(key, 0) + 1
+                db.rollback()
+            finally:
+                db.close()
+
+    stop = threading.Event()
+    price_cycles = [0]
+    bg = threading.Thread(target=_price_writer, args=(Session, stop, price_cycles), daemon=True)
+    bg.start()
+    start = time.perf_counter()
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    bg.join(timeout=5)
+    engine.dispose()
+    return {
+        'profile': profile,
+        'ok': ok[0],
+        'failed': sum(errors.values()),
+        'errors': errors,
+        'elapsed': elapsed,
+        'posts_per_sec': ok[0] / elapsed if elapsed else 0.0,
+        'price_cycles': price_cycles[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='Database URL (default: a fresh temporary SQLite file per profile)')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--posts', type=int, default=50, help='Transactions posted per thread')
+    parser.add_argument('--profiles', default='default,tuned')
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'ok':>6} {'failed':>7} {'posts/s':>9} {'elapsed':>8} {'price cycles':>13}")
+    for profile in [p.strip() for p in args.profiles.split(',') if p.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = args.url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            r = run_profile(url, profile, args.threads, args.posts)
+        print(f"{r['profile']:<8} {r['ok']:>6} {r['failed']:>7} {r['posts_per_sec']:>9.1f} {r['elapsed']:>7.2f}s {r['price_cycles']:>13}")
+        for err, n in sorted(r['errors'].items()):
+            print(f"           {n} x {err}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks of the data-layer hot paths, with stored baselines.
+
+Builds synthetic SQLite databases at each --scales entry (USERSxSYMBOLS).
+Every user holds --positions positions with --tx transactions each, and
+symbol popularity is skewed so a few symbols are held by many users. Each
+database is cached in --db-dir and reused on later runs; --rebuild forces a
+new one. Then times each path (median of --repeat runs after one warm-up):
+
+  recompute_hot     recompute_portfolios_for_symbol, most-held symbol (all holders)
+  recompute_median  recompute_portfolios_for_symbol, median-popularity symbol
+  recompute_user    recompute_portfolios_for_symbol for one user (the trade path)
+  update_write      price updater write phase: apply_quotes for every symbol + commit
+  get_portfolio     GET /portfolio/{user_id} handler incl. serialization
+
+Recomputes are rolled back, so every run sees the same data.
+
+--save-baseline stores the medians in --baseline. Later runs compare against
+that file and exit with status 1 when a path is slower by more than
+--threshold percent and by at least --min-ms. Baselines are machine-specific,
+so the default file is gitignored.
+
+Run from project root:
+  python scripts/bench_hot_paths.py --save-baseline
+  python scripts/bench_hot_paths.py                       # compare against the baseline
+  python scripts/bench_hot_paths.py --scales 1000x500,10000x500,100000x500 --threshold 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fastapi import Response
+from sqlalchemy import func, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, make_engine
+from app.models import StockPrice, Transaction, User, UserPortfolio
+from app.routers.portfolio import get_portfolio
+from app.services.price_updater import apply_quotes, recompute_portfolios_for_symbol
+
+DEFAULT_BASELINE = os.path.join(ROOT, ".bench", "hot_paths.json")
+# bump when the synthetic data changes so cached databases are rebuilt
+DATA_VERSION = 1
+BATCH = 10000
+PATHS = ("recompute_hot", "recompute_median", "recompute_user", "update_write", "get_portfolio")
+
+
+def _parse_scales(text: str) -> list[tuple[int, int]]:
+    scales = []
+    for part in text.split(","):
+        users, _sep, symbols = part.strip().lower().partition("x")
+        scales.append((int(users), int(symbols)))
+    return scales
+
+
+def _insert(db, model, rows):
+    for i in range(0, len(rows), BATCH):
+        db.execute(insert(model), rows[i:i + BATCH])
+
+
+def _build(path: str, users: int, symbols: int, positions: int, tx: int) -> None:
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    rng = random.Random(42)
+    try:
+        syms = [f"B{i:04d}" for i in range(symbols)]
+        prices = {s: round(rng.uniform(5, 500), 2) for s in syms}
+        _insert(db, StockPrice, [{"symbol": s, "name": f"Bench {s}", "currency": "USD", "current_price": p}
+                                 for s, p in prices.items()])
+        _insert(db, User, [{"username": f"bench{i}", "hashed_password": "x"} for i in range(users)])
+        weights = [1 / (rank + 1) for rank in range(symbols)]  # Zipf-like popularity
+        transactions, portfolio = [], []
+        for uid in range(1, users + 1):
+            held = set()
+            while len(held) < min(positions, symbols):
+                held.add(rng.choices(syms, weights)[0])
+            for s in held:
+                qty = cost = 0.0
+                for _ in range(tx):
+                    q = rng.randint(1, 20)
+                    p = round(prices[s] * rng.uniform(0.8, 1.2), 2)
+                    qty += q
+                    cost += q * p
+                    transactions.append({"user_id": uid, "symbol": s, "name": f"Bench {s}", "type": "BUY",
+                                         "quantity": q, "price": p, "total_amount": q * p, "currency": "USD"})
+                current = qty * prices[s]
+                portfolio.append({"user_id": uid, "symbol": s, "quantity": qty, "total_amount": cost,
+                                  "avg_cost": cost / qty, "current_amount": current, "profit": current - cost})
+            if len(transactions) >= BATCH:
+                _insert(db, Transaction, transactions)
+                transactions = []
+        _insert(db, Transaction, transactions)
+        _insert(db, UserPortfolio, portfolio)
+        db.commit()
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _median_ms(fn, repeat: int) -> float:
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def _bench_scale(path: str, repeat: int) -> dict:
+    engine = make_engine(f"sqlite:///{path}")
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    results = {}
+    try:
+        held = (
+            db.query(UserPortfolio.symbol, func.count(UserPortfolio.id))
+            .group_by(UserPortfolio.symbol)
+            .order_by(func.count(UserPortfolio.id).desc())
+            .all()
+        )
+        hot, median = held[0][0], held[len(held) // 2][0]
+        user_id = db.query(UserPortfolio.user_id).filter(UserPortfolio.symbol == hot).first()[0]
+
+        def recompute(sym, user_ids=None):
+            def run():
+                recompute_portfolios_for_symbol(db, sym, user_ids=user_ids)
+                db.flush()
+                db.rollback()
+            return run
+
+        results["recompute_hot"] = _median_ms(recompute(hot), repeat)
+        results["recompute_median"] = _median_ms(recompute(median), repeat)
+        results["recompute_user"] = _median_ms(recompute(hot, [user_id]), repeat)
+
+        symbols = [s for (s,) in db.query(StockPrice.symbol)]
+        rng = random.Random(7)
+
+        def update_write():
+            quotes = [(s, {"symbol": s, "name": f"Bench {s}", "currency": "USD",
+                           "price": round(rng.uniform(5, 500), 2)}) for s in symbols]
+            apply_quotes(db, quotes)
+            db.commit()
+
+        results["update_write"] = _median_ms(update_write, repeat)
+    finally:
+        db.close()
+        engine.dispose()
+
+    async def portfolio_ms():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+        try:
+            times = []
+            for i in range(repeat + 1):
+                async with AsyncSession() as adb:
+                    start = time.perf_counter()
+                    response = await get_portfolio(user_id, response=Response(), if_none_match=None, db=adb)
+                    getattr(response, "body", None) or json.dumps(response, default=str)
+                    if i:  # first run is the warm-up
+                        times.append((time.perf_counter() - start) * 1000)
+            return statistics.median(times)
+        finally:
+            await async_engine.dispose()
+
+    results["get_portfolio"] = asyncio.run(portfolio_ms())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1000x500,10000x500", help="comma-separated USERSxSYMBOLS")
+    parser.add_argument("--positions", type=int, default=5, help="positions per user")
+    parser.add_argument("--tx", type=int, default=2, help="transactions per position")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db-dir", default=os.path.join(tempfile.gettempdir(), "stockapp-bench"))
+    parser.add_argument("--rebuild", action="store_true", help="rebuild cached databases")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=25.0, help="allowed slowdown in percent")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    results, regressions = {}, []
+    print(f"{'scale':18} {'path':17} {'median ms':>10} {'baseline':>10} {'change':>8}")
+    for users, symbols in _parse_scales(args.scales):
+        scale = f"{users}x{symbols}"
+        key = f"{scale}_p{args.positions}_t{args.tx}"
+        path = os.path.join(args.db_dir, f"hot_paths_{key}_v{DATA_VERSION}.db")
+        if args.rebuild or not os.path.exists(path):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            start = time.perf_counter()
+            _build(path, users, symbols, args.positions, args.tx)
+            print(f"built {path} in {time.perf_counter() - start:.1f}s")
+        results[key] = _bench_scale(path, args.repeat)
+        for name in PATHS:
+            ms = results[key][name]
+            base = baseline.get(key, {}).get(name)
+            if base:
+                change = (ms - base) / base * 100
+                flag = ""
+                if change > args.threshold and ms - base >= args.min_ms:
+                    regressions.append(f"{key} {name}: {base:.1f} -> {ms:.1f} ms ({change:+.0f}%)")
+                    flag = "  REGRESSION"
+                print(f"{key:18} {name:17} {ms:10.2f} {base:10.2f} {change:+7.0f}%{flag}")
+            else:
+                print(f"{key:18} {name:17} {ms:10.2f} {'-':>10} {'-':>8}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+        print(f"saved baseline to {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} path(s) regressed by more than {args.threshold:.0f}%:")
+        for r in regressions:
+            print(f"  {r}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Measure how long a fresh interpreter takes to import the app (worker boot).
+
+Each run starts a new `python -X importtime -c "import app.main"` process, so
+nothing is cached in-process. Reports wall time per run, and the slowest
+top-level imports of the last run. Fails with exit code 1 when the median
+exceeds --budget seconds.
+
+Run from project root:
+  python scripts/bench_import_time.py
+  python scripts/bench_import_time.py --runs 10 --module app.main --budget 1.0
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _run_once(module: str) -> tuple[float, str]:
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"importing {module} failed")
+    return elapsed, proc.stderr
+
+
+def _top_level(importtime_output: str, top: int):
+    """Return [(cumulative_us, module)] for modules imported directly (depth 1)."""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        # depth is the indentation of the module name (two spaces per level)
+        if len(name) - len(name.lstrip(" ")) <= 3:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--budget", type=float, default=None, help="fail if the median exceeds this (seconds)")
+    args = parser.parse_args()
+
+    _run_once(args.module)  # warm the OS file cache / .pyc files
+    times = []
+    output = ""
+    for _ in range(args.runs):
+        elapsed, output = _run_once(args.module)
+        times.append(elapsed)
+
+    median = statistics.median(times)
+    print(f"import {args.module}: median {median:.3f}s  min {min(times):.3f}s  max {max(times):.3f}s  ({args.runs} runs)")
+    print("slowest imports (cumulative):")
+    for us, name in _top_level(output, args.top):
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    if args.budget is not None and median > args.budget:
+        print(f"FAIL: median {median:.3f}s exceeds budget {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
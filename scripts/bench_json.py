@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark the FAST_JSON response path of the hot read endpoints.
+
+Seeds a scratch SQLite database with one user holding --positions positions
+and --symbols stock prices, then calls GET /portfolio/{id} and
+GET /stock_prices/ through the real app (TestClient) with FAST_JSON off
+(ORM objects + response_model + jsonable_encoder + json) and on (row tuples
++ orjson). Checks that both modes return identical JSON, then prints the
+time per request.
+
+Run from project root:
+  python scripts/bench_json.py
+  python scripts/bench_json.py --positions 200 --symbols 2000 --requests 500
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+# hundreds of requests from one test client would hit the per-client rate limits
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base, get_async_db, make_engine
+from app.main import app
+from app.models import StockPrice, User, UserPortfolio
+from app.utils import fastjson
+
+
+def _seed(url: str, positions: int, symbols: int) -> int:
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        user = User(username="bench", hashed_password="x")
+        db.add(user)
+        db.add_all(
+            StockPrice(symbol=f"S{i:05d}", name=f"Stock number {i}", currency="USD", current_price=100.0 + i / 7)
+            for i in range(symbols)
+        )
+        db.flush()
+        db.add_all(
+            UserPortfolio(user_id=user.id, symbol=f"S{i:05d}", quantity=3.0 + i, total_amount=250.0 + i,
+                          avg_cost=(250.0 + i) / (3.0 + i), current_amount=(3.0 + i) * (100.0 + i / 7),
+                          profit=(3.0 + i) * (100.0 + i / 7) - (250.0 + i))
+            for i in range(min(positions, symbols))
+        )
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _time(client: TestClient, path: str, n: int) -> tuple[float, bytes]:
+    body = client.get(path).content  # warm-up
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get(path)
+    return (time.perf_counter() - start) / n * 1000, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=100)
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        user_id = _seed(f"sqlite:///{path}", args.positions, args.symbols)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+        async def _db():
+            async with AsyncSession() as db:
+                yield db
+
+        app.dependency_overrides[get_async_db] = _db
+        # no `with`: skip startup (price updater, schema creation on the default DB)
+        client = TestClient(app)
+        print(f"serializer: {'orjson' if fastjson.orjson is not None else 'json (orjson not installed)'}")
+        print(f"{'endpoint':28} {'standard ms':>12} {'fast ms':>9} {'speedup':>8}")
+        try:
+            for label, url in ((f"/portfolio ({args.positions} pos)", f"/portfolio/{user_id}"),
+                               (f"/stock_prices ({args.symbols})", "/stock_prices/")):
+                results = {}
+                for mode in (False, True):
+                    settings.FAST_JSON = mode
+                    results[mode] = _time(client, url, args.requests)
+                if json.loads(results[False][1]) != json.loads(results[True][1]):
+                    raise SystemExit(f"{url}: fast path output differs from the standard path")
+                slow, fast = results[False][0], results[True][0]
+                print(f"{label:28} {slow:12.2f} {fast:9.2f} {slow / fast:7.1f}x")
+        finally:
+            app.dependency_overrides.clear()
+            import asyncio
+            asyncio.run(async_engine.dispose())
+
+
+if __name__ == "__main__":
+    main()
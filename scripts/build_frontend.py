@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Build the static frontend into frontend/dist for production serving.
+
+- every asset except index.html is copied to a content-hashed name
+  (main.css -> main.3f2a9c1b0d.css) and references to it in index.html are
+  rewritten, so the hashed files can be cached forever (`immutable`)
+- every file gets precompressed .gz and, when the `brotli` package is
+  installed, .br siblings that the app serves without compressing per request
+- manifest.json maps source names to hashed names
+
+The app serves frontend/dist when its manifest exists and falls back to the
+raw frontend/ directory otherwise. Re-run after editing the frontend.
+
+Run from project root:
+  python scripts/build_frontend.py
+  python scripts/build_frontend.py --src frontend --out frontend/dist
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+from app.utils.static_files import MANIFEST_NAME
+
+# URL prefix the frontend is mounted at (see app/main.py)
+URL_PREFIX = "/app/"
+# Files smaller than this aren't worth a compressed copy
+MIN_COMPRESS_SIZE = 256
+HASH_LENGTH = 10
+
+
+def _hashed_name(name: str, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if len(data) < MIN_COMPRESS_SIZE:
+        return
+    # mtime=0 keeps builds reproducible
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build(src: str, out: str) -> dict:
+    assets = {}
+    for dirpath, dirnames, filenames in os.walk(src):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != out]
+        for fn in filenames:
+            full = os.path.join(dirpath, fn)
+            assets[os.path.relpath(full, src).replace(os.sep, "/")] = full
+
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+
+    manifest = {}
+    pages = {}
+    for name, full in sorted(assets.items()):
+        with open(full, "rb") as f:
+            data = f.read()
+        if name.endswith(".html"):
+            pages[name] = data  # HTML keeps its name and is revalidated
+            continue
+        hashed = _hashed_name(name, data)
+        manifest[name] = hashed
+        _write(os.path.join(out, hashed), data)
+
+    for name, data in pages.items():
+        html = data.decode("utf-8")
+        # longest names first so "a.css" doesn't clobber "extra.css"
+        for src_name in sorted(manifest, key=len, reverse=True):
+            html = html.replace(URL_PREFIX + src_name, URL_PREFIX + manifest[src_name])
+        _write(os.path.join(out, name), html.encode("utf-8"))
+
+    with open(os.path.join(out, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--src", default=os.path.join(ROOT, "frontend"))
+    parser.add_argument("--out", default=os.path.join(ROOT, "frontend", "dist"))
+    args = parser.parse_args()
+
+    manifest = build(os.path.abspath(args.src), os.path.abspath(args.out))
+    for name, hashed in sorted(manifest.items()):
+        print(f"{name} -> {hashed}")
+    if brotli is None:
+        print("brotli not installed: wrote .gz variants only")
+    print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Manage ledger checkpoints (see app.services.ledger).
+
+Run from project root:
+  python scripts/checkpoints.py create              # positions with >= CHECKPOINT_MIN_TRANSACTIONS new rows
+  python scripts/checkpoints.py create --min 1      # checkpoint every position with new activity
+  python scripts/checkpoints.py create --all        # also cover ids newer than the previous run (no writers running)
+  python scripts/checkpoints.py compact --keep 1    # drop all but the newest checkpoint per position
+  python scripts/checkpoints.py stats
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models import PortfolioCheckpoint, Transaction
+from app.services import ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    create = sub.add_parser("create", help="write checkpoints for active positions")
+    create.add_argument("--min", type=int, default=None, help="minimum new transactions per position")
+    create.add_argument("--all", action="store_true",
+                        help="cover every transaction, not only those seen by the previous run")
+    compact = sub.add_parser("compact", help="delete old checkpoints")
+    compact.add_argument("--keep", type=int, default=1, help="checkpoints to keep per position (>= 1)")
+    sub.add_parser("stats", help="print checkpoint counts")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "create":
+            upto = (db.query(func.max(Transaction.id)).scalar() or 0) if args.all else None
+            print("checkpoints written:", ledger.create_checkpoints(db, min_transactions=args.min, upto=upto))
+        elif args.command == "compact":
+            print("checkpoints removed:", ledger.compact_checkpoints(db, keep=args.keep))
+        else:
+            total = db.query(func.count(PortfolioCheckpoint.id)).scalar()
+            positions = db.query(PortfolioCheckpoint.user_id, PortfolioCheckpoint.symbol).distinct().count()
+            print(f"checkpoints: {total} across {positions} positions")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
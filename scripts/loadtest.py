@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""End-to-end load test: synthetic users, REST traffic and websocket clients.
+
+Starts the app with uvicorn on a scratch SQLite database and the offline
+price source (PRICE_SOURCE=offline, no network). The price updater then ticks
+every symbol every --tick seconds. Seeds --symbols stocks and --users users
+holding --transactions trades in total, imported in bulk. Then runs for
+--seconds:
+
+  --clients concurrent REST clients, each picking operations by --mix weight:
+      trade      POST /transactions/ (one BUY)
+      portfolio  GET /portfolio/{user_id}
+      search     GET /symbols/search?q=<prefix>
+      prices     GET /stock_prices/?symbols=<5 symbols>
+  --ws websocket clients on /ws/prices, subscribed to all symbols
+
+It reports p50/p95/p99 latency and throughput per operation, plus
+tick-to-client latency, measured from the updater stamping the message
+(`sent_at`) to a client receiving it. The first --warmup seconds are not
+counted. --json writes the results to a file for comparisons between runs.
+--fail-p95-ms makes the run exit with status 1 when any operation's p95 is
+over that budget.
+
+Run from project root:
+  python scripts/loadtest.py
+  python scripts/loadtest.py --users 200 --transactions 20000 --clients 64 --ws 200 --seconds 60
+  python scripts/loadtest.py --workers 4 --redis-url redis://localhost:6379/0 --json before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+try:
+    import websockets
+except Exception:
+    websockets = None
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PASSWORD = "loadtest-password"
+OPERATIONS = ("trade", "portfolio", "search", "prices")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(db_path: str, port: int, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        PRICE_SOURCE="offline",
+        PRICE_UPDATE_INTERVAL=str(args.tick),
+        CHECKPOINT_INTERVAL_SECONDS="0",
+        # every synthetic client shares one IP; measure the app, not the limiter
+        RATE_LIMIT_ENABLED="false",
+        LEADER_ELECTION="none" if args.workers == 1 else "file",
+        LEADER_LOCK_PATH=db_path + ".lock",
+    )
+    if args.redis_url:
+        env.update(WS_BUS_BACKEND="redis", REDIS_URL=args.redis_url)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("server did not start")
+
+
+# -- seeding -----------------------------------------------------------------
+
+def _symbols(n: int) -> list[str]:
+    return [f"L{i:04d}" for i in range(n)]
+
+
+async def _seed(base: str, db_path: str, args) -> list[int]:
+    symbols = _symbols(args.symbols)
+    con = sqlite3.connect(db_path)
+    try:
+        # old last_updated so the updater picks every symbol up on its first cycle
+        con.executemany(
+            "INSERT INTO stock_prices (symbol, name, currency, current_price, last_updated) "
+            "VALUES (?, ?, 'USD', 100.0, '2000-01-01 00:00:00')",
+            [(s, f"Loadtest {s}") for s in symbols],
+        )
+        con.commit()
+    finally:
+        con.close()
+
+    async with httpx.AsyncClient(base_url=base, timeout=120) as client:
+        sem = asyncio.Semaphore(8)
+
+        async def _user(i):
+            async with sem:
+                r = await client.post("/users/", json={"username": f"load{i}", "password": PASSWORD})
+                r.raise_for_status()
+                return r.json()["id"]
+
+        user_ids = await asyncio.gather(*[_user(i) for i in range(args.users)])
+        per_user = max(1, args.transactions // max(1, args.users))
+        # imports are big write transactions; one at a time keeps SQLite from timing out
+        import_lock = asyncio.Lock()
+        rng = random.Random(1)
+
+        async def _import(uid):
+            lines = []
+            for _ in range(per_user):
+                sym = rng.choice(symbols)
+                lines.append(json.dumps({"symbol": sym, "type": "BUY", "quantity": rng.randint(1, 20),
+                                         "price": round(rng.uniform(50, 150), 2), "name": f"Loadtest {sym}"}))
+            async with import_lock:
+                r = await client.post("/transactions/import", params={"user_id": uid, "format": "ndjson"},
+                                      content="\n".join(lines), headers={"content-type": "application/x-ndjson"})
+                r.raise_for_status()
+
+        await asyncio.gather(*[_import(uid) for uid in user_ids])
+    return list(user_ids)
+
+
+# -- traffic -----------------------------------------------------------------
+
+def _parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _sep, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def _rest_client(base, user_ids, symbols, mix, state, rng):
+    names, weights = list(mix), list(mix.values())
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        while not state["stop"]:
+            op = rng.choices(names, weights)[0]
+            uid = rng.choice(user_ids)
+            if op == "trade":
+                sym = rng.choice(symbols)
+                req = client.post("/transactions/", json={
+                    "user_id": uid, "type": "BUY", "symbol": sym, "amount": 1, "price": 100,
+                    "currency": "USD", "full_name": f"Loadtest {sym}",
+                })
+            elif op == "portfolio":
+                req = client.get(f"/portfolio/{uid}")
+            elif op == "search":
+                req = client.get("/symbols/search", params={"q": rng.choice(symbols)[:rng.randint(1, 3)]})
+            else:
+                req = client.get("/stock_prices/", params={"symbols": ",".join(rng.sample(symbols, 5))})
+            t = time.perf_counter()
+            try:
+                status = (await req).status_code
+            except httpx.HTTPError:
+                status = "error"
+            if state["measuring"]:
+                state["latency"][op].append((time.perf_counter() - t) * 1000)
+                if status != 200:
+                    state["errors"][op][str(status)] = state["errors"][op].get(str(status), 0) + 1
+
+
+async def _ws_client(url, state):
+    try:
+        async with websockets.connect(url, max_queue=None) as ws:
+            state["ws_connected"] += 1
+            while not state["stop"]:
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.time()
+                msg = json.loads(raw)
+                if state["measuring"] and msg.get("type") == "price_update" and msg.get("sent_at"):
+                    state["ticks"].append((received - msg["sent_at"]) * 1000)
+    except Exception as e:
+        state["ws_errors"].append(type(e).__name__)
+
+
+async def _run(base: str, user_ids: list[int], args) -> dict:
+    symbols = _symbols(args.symbols)
+    state = {
+        "stop": False, "measuring": False,
+        "latency": {op: [] for op in OPERATIONS}, "errors": {op: {} for op in OPERATIONS},
+        "ticks": [], "ws_connected": 0, "ws_errors": [],
+    }
+    mix = _parse_mix(args.mix)
+    tasks = [asyncio.create_task(_rest_client(base, user_ids, symbols, mix, state, random.Random(i)))
+             for i in range(args.clients)]
+    if args.ws:
+        if websockets is None:
+            print("websockets package not installed: skipping websocket clients")
+        else:
+            url = base.replace("http://", "ws://") + "/ws/prices"
+            tasks += [asyncio.create_task(_ws_client(url, state)) for _ in range(args.ws)]
+    await asyncio.sleep(args.warmup)
+    state["measuring"] = True
+    started = time.perf_counter()
+    await asyncio.sleep(args.seconds)
+    state["measuring"] = False
+    elapsed = time.perf_counter() - started
+    state["stop"] = True
+    await asyncio.gather(*tasks, return_exceptions=True)
+    state["elapsed"] = elapsed
+    return state
+
+
+# -- report ------------------------------------------------------------------
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+def _summary(values: list, elapsed: float) -> dict:
+    return {
+        "count": len(values),
+        "rps": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": _pct(values, 0.50),
+        "p95_ms": _pct(values, 0.95),
+        "p99_ms": _pct(values, 0.99),
+        "max_ms": max(values) if values else float("nan"),
+    }
+
+
+def _report(state: dict, args) -> dict:
+    elapsed = state["elapsed"]
+    ops = {op: {**_summary(v, elapsed), "errors": state["errors"][op]}
+           for op, v in state["latency"].items() if v}
+    total = sum(s["count"] for s in ops.values())
+    result = {
+        "config": {k: getattr(args, k) for k in ("users", "transactions", "symbols", "clients", "ws",
+                                                   "seconds", "tick", "workers", "mix")},
+        "operations": ops,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "ticks": {**_summary(state["ticks"], elapsed), "clients_connected": state["ws_connected"],
+                  "client_errors": len(state["ws_errors"])},
+    }
+    print(f"{'operation':10} {'reqs':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  errors")
+    for op, s in ops.items():
+        errors = ", ".join(f"{k}: {v}" for k, v in sorted(s["errors"].items())) or "-"
+        print(f"{op:10} {s['count']:7d} {s['rps']:8.1f} {s['p50_ms']:8.1f} {s['p95_ms']:8.1f} "
+              f"{s['p99_ms']:8.1f} {s['max_ms']:8.1f}  {errors}")
+    print(f"total throughput: {result['throughput_rps']:.1f} req/s over {elapsed:.1f}s")
+    t = result["ticks"]
+    if args.ws:
+        print(f"ticks: {t['count']} delivered to {t['clients_connected']} clients "
+              f"({t['client_errors']} client errors), tick-to-client p50 {t['p50_ms']:.1f} ms, "
+              f"p95 {t['p95_ms']:.1f} ms, p99 {t['p99_ms']:.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--transactions", type=int, default=2000, help="seeded transactions, spread over users")
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent REST clients")
+    parser.add_argument("--ws", type=int, default=20, help="websocket clients")
+    parser.add_argument("--seconds", type=float, default=20.0, help="measured duration")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--tick", type=int, default=2, help="price updater interval (seconds)")
+    parser.add_argument("--mix", default="trade=1,portfolio=5,search=2,prices=2")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (>1 needs --redis-url)")
+    parser.add_argument("--redis-url", default=None, help="websocket bus for multi-worker runs")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    parser.add_argument("--fail-p95-ms", type=float, default=None, help="exit 1 if any operation's p95 exceeds this")
+    args = parser.parse_args()
+    if args.workers > 1 and not args.redis_url:
+        parser.error("--workers > 1 needs --redis-url so every worker's websocket clients get the ticks")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "loadtest.db")
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}"
+        proc = _start_server(db_path, port, args)
+        try:
+            t = time.perf_counter()
+            user_ids = asyncio.run(_seed(base, db_path, args))
+            print(f"seeded {len(user_ids)} users, {args.transactions} transactions, "
+                  f"{args.symbols} symbols in {time.perf_counter() - t:.1f}s")
+            state = asyncio.run(_run(base, user_ids, args))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=15)
+
+    result = _report(state, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.fail_p95_ms is not None:
+        slow = [op for op, s in result["operations"].items() if s["p95_ms"] > args.fail_p95_ms]
+        if slow:
+            print(f"p95 over {args.fail_p95_ms} ms: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Load test: do read endpoints keep their latency during a login storm?
+
+Starts the app with uvicorn on a scratch SQLite database and seeds a user,
+some stock prices and a portfolio. For each mode it then measures
+GET /portfolio/{id} and GET /stock_prices/ latency twice: alone, and while
+--storm concurrent clients hammer POST /auth/login. Logins rejected with
+503 (hashing queue full) are counted separately.
+
+Modes:
+  pool    bcrypt in the process pool (PASSWORD_HASH_WORKERS=--hash-workers)
+  thread  bcrypt on the event loop's default thread pool (PASSWORD_HASH_WORKERS=0)
+
+Run from project root:
+  python scripts/loadtest_login_storm.py
+  python scripts/loadtest_login_storm.py --storm 64 --seconds 10 --modes pool
+"""
+import argparse
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PASSWORD = "storm-password"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(db_path: str, port: int, hash_workers: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        PASSWORD_HASH_WORKERS=str(hash_workers),
+        LEADER_ELECTION="none",
+        PRICE_UPDATE_INTERVAL="3600",
+        CHECKPOINT_INTERVAL_SECONDS="0",
+        # every synthetic client shares one IP; measure the app, not the limiter
+        RATE_LIMIT_ENABLED="false",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("server did not start")
+
+
+def _seed(base: str, db_path: str) -> int:
+    user = httpx.post(f"{base}/users/", json={"username": "storm", "password": PASSWORD}, timeout=30).json()
+    con = sqlite3.connect(db_path)
+    try:
+        # fresh last_updated so the price updater leaves the rows alone (no network)
+        con.executemany(
+            "INSERT INTO stock_prices (symbol, name, currency, current_price, last_updated) "
+            "VALUES (?, ?, 'USD', 100.0, CURRENT_TIMESTAMP)",
+            [(f"S{i:03d}", f"Stock {i}") for i in range(50)],
+        )
+        con.commit()
+    finally:
+        con.close()
+    for i in range(10):
+        httpx.post(f"{base}/transactions/", timeout=30, json={
+            "user_id": user["id"], "type": "BUY", "symbol": f"S{i:03d}", "amount": 1,
+            "price": 90, "currency": "USD", "full_name": f"Stock {i}",
+        })
+    return user["id"]
+
+
+def _probe(base: str, user_id: int, stop: threading.Event, out: dict):
+    with httpx.Client(base_url=base, timeout=30) as client:
+        while not stop.is_set():
+            for name, path in (("portfolio", f"/portfolio/{user_id}"), ("stock_prices", "/stock_prices/")):
+                t = time.perf_counter()
+                client.get(path)
+                out.setdefault(name, []).append((time.perf_counter() - t) * 1000)
+            time.sleep(0.01)
+
+
+def _login_worker(base: str, stop: threading.Event, counts: dict, lock: threading.Lock):
+    with httpx.Client(base_url=base, timeout=60) as client:
+        while not stop.is_set():
+            r = client.post("/auth/login", json={"username": "storm", "password": PASSWORD})
+            with lock:
+                counts[r.status_code] = counts.get(r.status_code, 0) + 1
+            if r.status_code == 503:
+                time.sleep(0.05)
+
+
+def _phase(base: str, user_id: int, seconds: float, storm: int):
+    stop = threading.Event()
+    lat, counts, lock = {}, {}, threading.Lock()
+    threads = [threading.Thread(target=_probe, args=(base, user_id, stop, lat))]
+    threads += [threading.Thread(target=_login_worker, args=(base, stop, counts, lock)) for _ in range(storm)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return lat, counts
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storm", type=int, default=32, help="concurrent login clients")
+    parser.add_argument("--seconds", type=float, default=8.0, help="duration of each phase")
+    parser.add_argument("--hash-workers", type=int, default=2)
+    parser.add_argument("--modes", default="pool,thread")
+    args = parser.parse_args()
+
+    print(f"{'mode':7} {'phase':9} {'endpoint':13} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'reqs':>6}  logins")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "storm.db")
+            port = _free_port()
+            proc = _start_server(db_path, port, args.hash_workers if mode == "pool" else 0)
+            base = f"http://127.0.0.1:{port}"
+            try:
+                user_id = _seed(base, db_path)
+                for phase, storm in (("idle", 0), ("storm", args.storm)):
+                    lat, counts = _phase(base, user_id, args.seconds, storm)
+                    logins = ", ".join(f"{k}: {v}" for k, v in sorted(counts.items())) or "-"
+                    for name, values in sorted(lat.items()):
+                        print(f"{mode:7} {phase:9} {name:13} {statistics.median(values):8.1f} "
+                              f"{_pct(values, 0.95):8.1f} {max(values):8.1f} {len(values):6d}  {logins}")
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,26 @@
 """Seed the StockPrice table with a curated set of symbols.
 
 This script will:
- - fetch the S&P 500 constituents (tries pandas.read_html, falls back to lightweight parse)
+ - take the symbols from app/data/symbols.json (falls back to the S&P 500
+   constituents from Wikipedia when that file is missing or empty)
  - add a curated small list for Denmark, Sweden and Norway
  - add top-10 crypto USD tickers
- - call ensure_stock_in_db for each symbol (inserting or updating rows)
+ - de-duplicate the list, fetch quotes in parallel (--workers threads) and
+   upsert StockPrice rows in batches of --batch, one transaction per batch
 
-Run without args to execute. Use --dry-run to only print actions.
+With --offline no network is used: rows get the names from symbols.json and
+the curated lists, a currency derived from the ticker suffix, and price 0
+(the price updater fills prices in). Existing prices are left alone.
+
+Run from project root:
+  python scripts/seed_stockprices.py
+  python scripts/seed_stockprices.py --offline          # fresh environment, no network
+  python scripts/seed_stockprices.py --dry-run
 """
 import sys
 import time
 import argparse
+import concurrent.futures
 import requests
 import re
 import os
@@ -22,10 +32,54 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from app.database import SessionLocal
-from app.services.stocks import ensure_stock_in_db
+from app.services.stocks import get_stock_info, upsert_stocks_bulk
 from pathlib import Path
 import json
 
+# Curated Nordic lists (small, safe set)
+DENMARK = {
+    'NOVO-B.CO': 'Novo Nordisk B',
+    'MAERSK-B.CO': 'A.P. Møller - Mærsk B',
+    'DANSKE.CO': 'Danske Bank',
+    'VWS.CO': 'Vestas Wind Systems',
+    'CARL-B.CO': 'Carlsberg B',
+    'DSV.CO': 'DSV A/S',
+    'GN.CO': 'GN Store Nord',
+    'DEMANT.CO': 'Demant A/S',
+    'FLS.CO': 'FLSmidth & Co.',
+    'TRYG.CO': 'Tryg A/S',
+    'NETC.CO': 'Netcompany Group',
+    'PNDORA.CO': 'Pandora A/S',
+    'JYSK.CO': 'Jyske Bank',
+    'RBREW.CO': 'Royal Unibrew',
+    'ORSTED.CO': 'Ørsted A/S',
+    'NSIS-B.CO': 'Novozymes B',  # nu en del af Novonesis, men bruges stadig
+    'ROCK-B.CO': 'Rockwool International B',
+    'BAVA.CO': 'Bavarian Nordic',
+    'COLO-B.CO': 'Coloplast B',
+    'HLUN-A.CO': 'Lundbeck',
+    'AMBU-B.CO': 'Ambu B',
+}
+SWEDEN = {
+    'VOLV-B.ST': 'Volvo B',
+    'ERIC-B.ST': 'Ericsson B',
+    'HM-B.ST': 'H&M B',
+    'ATCO-A.ST': 'Atlas Copco A',
+}
+NORWAY = {
+    'EQNR.OL': 'Equinor',
+    'YAR.OL': 'Yara International',
+    'DNB.OL': 'DNB Bank',
+    'ORK.OL': 'Orkla',
+}
+CRYPTO = {
+    'BTC-USD': 'Bitcoin USD', 'ETH-USD': 'Ethereum USD', 'USDT-USD': 'Tether USD',
+    'BNB-USD': 'BNB USD', 'USDC-USD': 'USD Coin USD', 'XRP-USD': 'XRP USD',
+    'ADA-USD': 'Cardano USD', 'DOGE-USD': 'Dogecoin USD', 'DOT-USD': 'Polkadot USD',
+    'TRX-USD': 'TRON USD',
+}
+# --offline: currency by ticker suffix (anything else is listed in USD)
+CURRENCY_BY_SUFFIX = {'.CO': 'DKK', '.ST': 'SEK', '.OL': 'NOK'}
 
 def fetch_sp500_symbols() -> list:
     url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
@@ -69,112 +123,122 @@ def fetch_sp500_symbols() -> list:
         return []
 
 
-def main(dry_run: bool = False):
-    # Prefer static symbols.json in the repo for reliability; fallback to live fetch
-    repo_symbols = []
+def load_registry() -> list:
+    """(symbol, name) pairs from app/data/symbols.json (empty when missing or unreadable)."""
     try:
         data_path = Path(__file__).resolve().parents[1] / 'app' / 'data' / 'symbols.json'
         if data_path.exists():
-            repo_symbols = json.loads(data_path.read_text())
-            repo_symbols = [s.get('symbol') for s in repo_symbols if isinstance(s, dict) and s.get('symbol')]
-    except Exception:
-        repo_symbols = []
-
-    sp500 = repo_symbols or fetch_sp500_symbols()
-
-    # Curated Nordic lists (small, safe set)
-    denmark = [
-    'NOVO-B.CO',     # Novo Nordisk B
-    'MAERSK-B.CO',   # A.P. Møller - Mærsk B
-    'DANSKE.CO',     # Danske Bank
-    'VWS.CO',        # Vestas Wind Systems
-    'CARL-B.CO',     # Carlsberg B
-    'DSV.CO',        # DSV A/S
-    'GN.CO',         # GN Store Nord
-    'DEMANT.CO',     # Demant A/S
-    'FLS.CO',        # FLSmidth & Co.
-    'TRYG.CO',       # Tryg A/S
-    'NETC.CO',       # Netcompany Group
-    'PNDORA.CO',     # Pandora A/S
-    'JYSK.CO',       # Jyske Bank
-    'RBREW.CO',      # Royal Unibrew
-    'ORSTED.CO',     # Ørsted A/S
-    'NSIS-B.CO',     # Novozymes B (nu en del af Novonesis, men bruges stadig)
-    'ROCK-B.CO',     # Rockwool International B
-    'BAVA.CO',       # Bavarian Nordic
-    'COLO-B.CO',     # Coloplast B
-    'HLUN-A.CO',     # Lundbeck
-    'DEMANT.CO',     # William Demant Holding (nu Demant, men symbolet virker stadig)
-    'AMBU-B.CO',     # Ambu B
-    ]
-    sweden = [
-        'VOLV-B.ST',
-        'ERIC-B.ST',
-        'HM-B.ST',
-        'ATCO-A.ST',
-    ]
-    norway = [
-        'EQNR.OL',
-        'YAR.OL',
-        'DNB.OL',
-        'ORK.OL',
-    ]
-
-    crypto = [
-        'BTC-USD', 'ETH-USD', 'USDT-USD', 'BNB-USD', 'USDC-USD',
-        'XRP-USD', 'ADA-USD', 'DOGE-USD', 'DOT-USD', 'TRX-USD'
-    ]
-
-    # Compose final list: repo S&P (or fetched list) + cryptos + nordic curated
-    symbols = []
-    if sp500:
-        symbols.extend(sp500)
-    else:
-        print("Warning: S&P 500 list empty; proceeding with Nordics + crypto only", file=sys.stderr)
+            entries = json.loads(data_path.read_text(encoding='utf-8'))
+            return [(s['symbol'], s.get('name')) for s in entries if isinstance(s, dict) and s.get('symbol')]
+    except Exception as e:
+        print("Error reading symbols.json:", e, file=sys.stderr)
+    return []
 
-    symbols.extend(crypto)
-    symbols.extend(denmark)
-    symbols.extend(sweden)
-    symbols.extend(norway)
 
-    print(f"Total symbols to process: {len(symbols)}", file=sys.stderr)
+def collect_symbols(offline: bool) -> tuple[dict, int]:
+    """Return ({symbol: name or None}, number of duplicates dropped), in input order."""
+    # Prefer static symbols.json in the repo for reliability; fallback to live fetch
+    base = load_registry()
+    if not base and not offline:
+        base = [(s, None) for s in fetch_sp500_symbols()]
+    if not base:
+        print("Warning: S&P 500 list empty; proceeding with Nordics + crypto only", file=sys.stderr)
 
-    added = 0
-    updated = 0
-    start = time.time()
+    symbols, seen = {}, 0
+    for group in (base, CRYPTO.items(), DENMARK.items(), SWEDEN.items(), NORWAY.items()):
+        for sym, name in group:
+            sym = (sym or '').strip().upper()
+            if not sym:
+                continue
+            seen += 1
+            if sym not in symbols or (name and not symbols[sym]):
+                symbols[sym] = name
+    return symbols, seen - len(symbols)
+
+
+def _currency(sym: str) -> str:
+    for suffix, currency in CURRENCY_BY_SUFFIX.items():
+        if sym.endswith(suffix):
+            return currency
+    return 'USD'
+
+
+def _batches(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def seed_offline(db, symbols: dict, batch: int) -> tuple[int, int, list]:
+    inserted = updated = 0
+    for chunk in _batches(list(symbols.items()), batch):
+        rows = [{'symbol': sym, 'name': name or sym, 'currency': _currency(sym)} for sym, name in chunk]
+        ins, upd = upsert_stocks_bulk(db, rows)
+        db.commit()
+        inserted += ins
+        updated += upd
+    return inserted, updated, []
+
+
+def seed_live(db, symbols: dict, batch: int, workers: int) -> tuple[int, int, list]:
+    inserted = updated = 0
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='seed-fetch') as pool:
+        for n, chunk in enumerate(_batches(list(symbols), batch), 1):
+            rows = []
+            for info in pool.map(lambda s: get_stock_info(s, use_cache=False), chunk):
+                if info.get('error'):
+                    failed.append((info['symbol'], info.get('error_type') or info['error']))
+                    continue
+                name = info.get('name')
+                rows.append({
+                    'symbol': info['symbol'],
+                    # yfinance falls back to the ticker when it has no name; keep a better one
+                    'name': symbols.get(info['symbol']) if name in (None, info['symbol']) else name,
+                    'currency': info.get('currency') if info.get('currency') != 'N/A' else None,
+                    'current_price': info.get('price') or None,
+                })
+            ins, upd = upsert_stocks_bulk(db, rows)
+            db.commit()
+            inserted += ins
+            updated += upd
+            print(f"batch {n}: {len(rows)} upserted, {len(chunk) - len(rows)} failed", file=sys.stderr)
+    return inserted, updated, failed
+
+
+def main(dry_run: bool = False, offline: bool = False, batch: int = 100, workers: int = 16):
+    symbols, duplicates = collect_symbols(offline)
+    print(f"Total symbols to process: {len(symbols)} ({duplicates} duplicates dropped)", file=sys.stderr)
+    if dry_run:
+        for sym, name in symbols.items():
+            print(f"{sym}\t{name or ''}")
+        return
 
+    start = time.time()
     db = SessionLocal()
     try:
-        for i, sym in enumerate(symbols, 1):
-            sym = sym.strip()
-            if not sym:
-                continue
-            print(f"[{i}/{len(symbols)}] Processing {sym}...", file=sys.stderr)
-            if dry_run:
-                continue
-            try:
-                sp = ensure_stock_in_db(db, sym)
-                # ensure_stock_in_db does commit and refresh; we can't easily know added vs updated without probing
-                # We'll treat non-zero price rows as updated/added
-                if sp.current_price:
-                    updated += 1
-                else:
-                    added += 1
-            except Exception as e:
-                print(f"  Failed for {sym}: {e}", file=sys.stderr)
+        if offline:
+            inserted, updated, failed = seed_offline(db, symbols, batch)
+        else:
+            inserted, updated, failed = seed_live(db, symbols, batch, workers)
     finally:
         db.close()
 
     elapsed = time.time() - start
     print("-- Summary --")
     print(f"Symbols processed: {len(symbols)}")
-    print(f"Rows with non-zero price (approx): {updated}")
-    print(f"Rows with zero price (approx): {added}")
+    print(f"Inserted: {inserted}")
+    print(f"Updated: {updated}")
+    print(f"Failed: {len(failed)}")
+    for sym, err in failed:
+        print(f"  {sym}: {err}")
     print(f"Elapsed: {elapsed:.1f}s")
 
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--dry-run', action='store_true', help='Only print what would be done')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='Only print the de-duplicated symbol list')
+    parser.add_argument('--offline', action='store_true', help='Seed metadata only, without network calls')
+    parser.add_argument('--batch', type=int, default=100, help='symbols per fetch batch and transaction')
+    parser.add_argument('--workers', type=int, default=16, help='parallel quote fetches')
     args = parser.parse_args()
-    main(dry_run=args.dry_run)
+    main(dry_run=args.dry_run, offline=args.offline, batch=args.batch, workers=args.workers)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Verify user_portfolios (and ledger checkpoints) against the transaction ledger.
+
+Streams each symbol's transactions and portfolio rows instead of loading
+them, and checks symbols in parallel chunks (see app.services.consistency).
+Exits with status 1 when problems remain, so it can run as a nightly job.
+
+  --incremental  only positions traded since the last clean run
+  --repair       rebuild the positions found inconsistent (and drop bad checkpoints)
+  --json PATH    write the full report, including every finding, to PATH
+
+Run from project root:
+  python scripts/verify_portfolios.py
+  python scripts/verify_portfolios.py --incremental --repair
+  python scripts/verify_portfolios.py --symbols AAPL,MSFT --json report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services import consistency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incremental", action="store_true", help="only check positions traded since the last clean run")
+    parser.add_argument("--repair", action="store_true", help="rebuild inconsistent positions")
+    parser.add_argument("--symbols", default=None, help="comma-separated symbols to check (does not move the marker)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (0 = one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=20, help="symbols per work unit")
+    parser.add_argument("--show", type=int, default=20, help="findings to print")
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    start = time.perf_counter()
+    report = consistency.verify(incremental=args.incremental, repair=args.repair, workers=args.workers or None,
+                                chunk_size=args.chunk_size, symbols=symbols)
+    elapsed = time.perf_counter() - start
+
+    print(f"positions checked: {report.positions} ({report.transactions} transactions) in {elapsed:.1f}s")
+    print(f"skipped (traded during the run): {report.skipped_changed}")
+    print(f"problems: {report.problems} {report.counts or ''}")
+    if args.repair:
+        print(f"positions repaired: {report.repaired}")
+    for f in report.findings[:args.show]:
+        print(" ", json.dumps(f, default=str))
+    if len(report.findings) > args.show:
+        print(f"  ... {len(report.findings) - args.show} more (use --json)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"elapsed_s": elapsed, **report.as_dict()}, fh, indent=2, default=str)
+    sys.exit(1 if report.problems and not args.repair else 0)
+
+
+if __name__ == "__main__":
+    main()